@@ -4,13 +4,21 @@ import pandas as pd
 import numpy as np
 from math import sqrt
 
-from .utils import join_euro_standard_pops
-from .confidence_intervals import dobson_lower, dobson_upper
-from .validation import format_args, validate_data, check_kwargs, ci_col, metadata_cols, group_args
+from .utils import euro_standard_pop, join_euro_standard_pops, map_euro_standard_pops, group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import check_grouping
+from .streaming import is_chunked, sum_chunks, check_group_rows, GroupSums
+from . import core
+from .validation import format_args, validate_data, check_kwargs, ci_columns, col_values, metadata_columns, assign_columns, group_args
+from .instrumentation import instrumented
+from .frames import native_frames
 
 
+@instrumented
+@native_frames
 def ph_dsr(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata = True, 
-           confidence = 0.95, multiplier = 100000, euro_standard_pops = True, **kwargs):
+           confidence = 0.95, multiplier = 100000, euro_standard_pops = True, workers = None, incremental = None, 
+           grouping = None, **kwargs):
     
     """Calculates directly standardised rates with confidence limits using Byar's
     method (1) with Dobson method adjustment (2).
@@ -18,7 +26,13 @@ def ph_dsr(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata =
     Parameters
     ----------
     df: 
-        DataFrame containing the data to be standardised.
+        DataFrame containing the data to be standardised, or an iterable of DataFrame chunks
+        (e.g. from `pd.read_csv(chunksize=...)` or pyarrow record batches) which are validated
+        and summed within groups one chunk at a time. When chunked, a group's rows can be
+        split across chunks, and European Standard Populations are matched on the lower age
+        of each age band (0, 5, 10, ..., 90).
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str 
         Column name from data containing the observed number of events for
         each standardisation category (e.g. ageband) within each grouping set (e.g. area).
@@ -41,6 +55,15 @@ def ph_dsr(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata =
     confidence : float 
         Confidence interval(s) to use, either as a float, list of float values or None.
         Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
+    workers : int
+        Number of worker processes to sum the data within groups, with the input columns
+        placed once in shared memory rather than copied to each worker. Defaults to None (no parallelism).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
         
     Other Parameters
     ----------------
@@ -72,17 +95,55 @@ def ph_dsr(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata =
     if not isinstance(multiplier, int) or multiplier <= 0:
         raise ValueError("'Multiplier' must be a positive integer")
     
+    if is_chunked(df):
+        state = DSRState(num_col, denom_col, ref_denom_col, group_cols, metadata, multiplier, euro_standard_pops, workers, **kwargs)
+        return sum_chunks(df, state).finalize(confidence, incremental)
+    
+    confidence, group_cols = format_args(confidence, group_cols)
+    
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, True, grouping, dsr_results, num_col, denom_col, ref_denom_col,
+                                metadata, confidence, multiplier, euro_standard_pops, kwargs)
+    
     # Get ref_denom_col for validation checks from ESP data if True - do it before check_kwargs so can test if ref_denom_col is numeric there
     if euro_standard_pops:
-        df = join_euro_standard_pops(df, ref_denom_col, group_cols)
+        df = join_euro_standard_pops(df, ref_denom_col, group_cols, grouping)
         ref_denom_col = 'euro_standard_pops'
         
-    confidence, group_cols = format_args(confidence, group_cols)
-    ref_df, ref_join_left, ref_join_right = check_kwargs(df, kwargs, 'ref', ref_denom_col)
-    df = validate_data(df, num_col, group_cols, metadata, denom_col, ref_df = ref_df)
+    df = dsr_terms(df, num_col, denom_col, ref_denom_col, group_cols, metadata, euro_standard_pops, grouping = grouping, **kwargs)
 
     # Grouping by temporary column to reduce duplication in code
     df, group_cols = group_args(df, group_cols, True)
+    
+    df = group_sums(df, group_cols, [num_col, denom_col, 'wt_rate', ref_denom_col, 'sq_rate'], 
+                    skipna_cols = [num_col], workers = workers, grouping = grouping)
+    
+    return finalize_groups(incremental, group_cols, dsr_results, df, num_col, denom_col, ref_denom_col, group_cols, metadata, 
+                           confidence, multiplier)
+
+
+
+def dsr_terms(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata = None, 
+              euro_standard_pops = True, check_rows = True, grouping = None, **kwargs):
+    """Validates data and adds the weighted rate terms which are summed within groups to calculate DSRs.
+    
+    Args:
+        df: Pandas DataFrame, with the 'euro_standard_pops' column already added if euro_standard_pops is True.
+        num_col (str), denom_col (str), group_cols (list), metadata (bool), euro_standard_pops (bool): as in `ph_dsr`.
+        ref_denom_col (str): Column name of the standard populations.
+        check_rows (bool): Whether to check the number of rows per group, which can't be done on a chunk of data.
+        grouping (Grouping): Group codes factorised from the data, or None.
+        **kwargs: ref_df, ref_join_left and ref_join_right as in `ph_dsr`.
+        
+    Returns:
+        Validated copy of the Pandas DataFrame with 'wt_rate' and 'sq_rate' columns.
+    """
+    
+    ref_df, ref_join_left, ref_join_right = check_kwargs(df, kwargs, 'ref', ref_denom_col)
+    df = validate_data(df, num_col, group_cols, metadata, denom_col, ref_df = ref_df if check_rows else None, grouping = grouping)
 
     if ref_df is not None and euro_standard_pops == False:
         df = df.merge(ref_df, how = 'left', left_on = ref_join_left, right_on = ref_join_right).drop(ref_join_right, axis=1)
@@ -90,30 +151,146 @@ def ph_dsr(df, num_col, denom_col, ref_denom_col, group_cols = None, metadata =
     df['wt_rate'] = df[num_col].fillna(0) * df[ref_denom_col] / df[denom_col]
     df['sq_rate'] = df[num_col].fillna(0) * (df[ref_denom_col] / df[denom_col])**2
     
-    df = df.groupby(group_cols).agg({num_col: 'sum', 
-                                      denom_col: lambda x: x.sum(skipna=False), 
-                                      'wt_rate': lambda x: x.sum(skipna=False),
-                                      ref_denom_col: lambda x: x.sum(skipna=False), 
-                                      'sq_rate': lambda x: x.sum(skipna=False)}).reset_index()
+    return df
+
+
 
-    df['Value'] = df['wt_rate'] / df[ref_denom_col] * multiplier
-    df['vardsr'] = 1 / df[ref_denom_col]**2 * df['sq_rate']
+def dsr_results(df, num_col, denom_col, ref_denom_col, group_cols, metadata, confidence, multiplier):
+    """Calculates DSRs and confidence intervals from the weighted rate terms summed within groups.
     
-    if confidence is not None:
-        for c in confidence:
-            df[ci_col(c, 'lower')] = df.apply(lambda x: dobson_lower(x['Value'], x[num_col], x['vardsr'], c, multiplier), axis=1)
-            df[ci_col(c, 'upper')] = df.apply(lambda x: dobson_upper(x['Value'], x[num_col], x['vardsr'], c, multiplier), axis=1)
+    Args:
+        df: Pandas DataFrame of summed data, one row per group.
+        num_col (str), denom_col (str), metadata (bool), multiplier (int): as in `ph_dsr`.
+        ref_denom_col (str): Column name of the summed standard populations.
+        group_cols (list): List of column name(s) the data is grouped by.
+        confidence (list): Confidence interval(s) to use, or None.
+        
+    Returns:
+        Pandas DataFrame of calculated DSRs as returned by `ph_dsr`.
+    """
+
+    result = core.dsr_from_sums(col_values(df, num_col), col_values(df, denom_col), col_values(df, 'wt_rate'),
+                                col_values(df, 'sq_rate'), col_values(df, ref_denom_col), confidence, multiplier)
     
     # Tidy dataframe
-    df = df.drop(['vardsr', 'wt_rate', 'sq_rate', ref_denom_col], axis=1).rename(columns={num_col: 'Total Count', denom_col: 'Total Pop'})
-    df.loc[df['Total Count'] < 10, 'Value'] = np.nan
+    df = df.drop(['wt_rate', 'sq_rate', ref_denom_col], axis=1).rename(columns={num_col: 'Total Count', denom_col: 'Total Pop'})
+    columns = {'Value': result['value'], **ci_columns(result, confidence)}
     
     if metadata:
-        df = metadata_cols(df, f'DSR per {multiplier}', confidence, 'Dobson')
+        columns.update(metadata_columns(f'DSR per {multiplier}', confidence, 'Dobson'))
     
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
             
-    return df
+    return assign_columns(df, columns)
+
+
+
+def check_esp_groups(df, ref_denom_col, grouped = True):
+    """Checks each group standardised to the European Standard Population has every one of its 19
+    age bands exactly once, from the data summed within groups.
+    
+    Args:
+        df: Pandas DataFrame of summed data including the 'ph_pkg_rows' column, one row per group.
+        ref_denom_col (str): Column name of the summed European Standard Populations.
+        grouped (bool): Whether the data is grouped, for the error message.
+    """
+    
+    check_group_rows(df, 19, 'There must be 19 rows of data per group' if grouped \
+                     else 'Dataframe, if ungrouped, must have 19 rows for the 19 agebands')
+    
+    # 19 rows only sum to the whole population if no age band is repeated
+    if (df[ref_denom_col] != euro_standard_pop()['euro_standard_pops'].sum()).any():
+        raise ValueError('There are duplicate minimum ages, which is not accepted as each age band is matched on its minimum age')
+        
+        
+
+
+
+class DSRState(GroupSums):
+    """Weighted rate terms (`wt_rate`, `sq_rate`), counts and populations summed within groups, which
+    can be updated with more data, merged with the state of other data (e.g. calculated on another
+    machine) and finalised into exactly the DSRs `ph_dsr` would return for all of the data.
+    
+    A group's rows can be split across updates, so European Standard Populations are matched on the
+    lower age of each age band (0, 5, 10, ..., 90) and the number of rows per group is checked when
+    the state is finalised.
+    
+    Parameters
+    ----------
+    num_col : str 
+        Column name from data containing the observed number of events for
+        each standardisation category (e.g. ageband) within each grouping set (e.g. area).
+    denom_col : str
+        Column name from data containing the population for each standardisation 
+        category (e.g. age band).
+    ref_denom_col : str
+        The standard populations for each standardisation category (e.g. age band), as in `ph_dsr`.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by. Default to None.
+    metadata : bool 
+        Whether to include information on the statistic and confidence interval methods.
+    multiplier : int
+        The multiplier used to express the final values. Default 100,000.
+    euro_standard_pops : bool 
+        Whether to use the european standard populations.
+    workers : int
+        Number of worker processes to sum each update with. Defaults to None (no parallelism).
+    **kwargs
+        ref_df, ref_join_left and ref_join_right as in `ph_dsr`.
+    
+    """
+    
+    def __init__(self, num_col, denom_col, ref_denom_col, group_cols = None, metadata = True, 
+                 multiplier = 100000, euro_standard_pops = True, workers = None, **kwargs):
+        null, group_cols = format_args(None, group_cols)
+        
+        if not isinstance(multiplier, int) or multiplier <= 0:
+            raise ValueError("'Multiplier' must be a positive integer")
+        
+        self.age_col = ref_denom_col
+        self.ref_denom_col = 'euro_standard_pops' if euro_standard_pops else ref_denom_col
+        
+        super().__init__(group_cols, [num_col, denom_col, 'wt_rate', self.ref_denom_col, 'sq_rate'], 
+                         skipna_cols = [num_col], workers = workers)
+        self.num_col, self.denom_col = num_col, denom_col
+        self.metadata, self.multiplier = metadata, multiplier
+        self.euro_standard_pops, self.kwargs = euro_standard_pops, kwargs
+        self.params = {'num_col': num_col, 'denom_col': denom_col, 'ref_denom_col': ref_denom_col,
+                       'group_cols': group_cols, 'metadata': metadata, 'multiplier': multiplier,
+                       'euro_standard_pops': euro_standard_pops, 'workers': workers, **kwargs}
+    
+    def prepare(self, df):
+        if self.euro_standard_pops:
+            df = map_euro_standard_pops(df.copy(), self.age_col)
+        
+        # rows per group can only be checked once all the data is summed
+        return dsr_terms(df, self.num_col, self.denom_col, self.ref_denom_col, self.group_cols, self.metadata,
+                         self.euro_standard_pops, check_rows = False, **self.kwargs)
+    
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates DSRs with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float
+            Confidence interval(s) to use, either as a float, list of float values or None.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            DataFrame of calculated directly standardised rates and confidence intervals, as returned by `ph_dsr`.
+        """
+        confidence, null = format_args(confidence)
+        df = self.sums
+        
+        if self.euro_standard_pops:
+            check_esp_groups(df, self.ref_denom_col, self.group_cols is not None)
+        
+        elif 'ref_df' in self.kwargs:
+            check_group_rows(df, len(self.kwargs['ref_df']), 'ref_df length must equal same number of rows in each group within data')
         
-        
\ No newline at end of file
+        return finalize_groups(incremental, self.keys, dsr_results, df.drop(columns='ph_pkg_rows'), self.num_col, self.denom_col, 
+                               self.ref_denom_col, self.keys, self.metadata, confidence, self.multiplier)
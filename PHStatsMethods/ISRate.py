@@ -3,18 +3,31 @@
 import pandas as pd
 import numpy as np
 
-from .confidence_intervals import byars_lower, byars_upper
-from .validation import metadata_cols, ci_col, validate_data, format_args, check_kwargs, group_args
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, validate_data, format_args, check_kwargs, group_args
+from .utils import group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import check_grouping
+from .streaming import is_chunked, sum_chunks, check_group_rows, GroupSums
+from .instrumentation import instrumented
+from .frames import native_frames
 
+@instrumented
+@native_frames
 def ph_ISRate(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = None, 
-                     metadata = True, confidence = 0.95, multiplier = 100000, **kwargs):
+                     metadata = True, confidence = 0.95, multiplier = 100000, workers = None, incremental = None, 
+                     grouping = None, **kwargs):
     
     """Calculates indirectly standardized rates with confidence limits using Byar's or exact CI method.
 
     Parameters
     ----------
     df
-        DataFrame containing the data.
+        DataFrame containing the data, or an iterable of DataFrame chunks (e.g. from
+        `pd.read_csv(chunksize=...)` or pyarrow record batches) which are validated and
+        summed within groups one chunk at a time.
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str
         Field containing observed number of events.
     denom_col : str
@@ -31,7 +44,16 @@ def ph_ISRate(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = N
         Confidence levels, default 0.95.
     multiplier : int 
         The multiplier for the rate calculation, default 100000.
-        
+    workers : int
+        Number of worker processes to sum the data within groups, with the input columns
+        placed once in shared memory rather than copied to each worker. Defaults to None (no parallelism).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
+
         
     Other Parameters
     ----------------
@@ -68,47 +90,188 @@ def ph_ISRate(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = N
     """
     
     confidence, group_cols = format_args(confidence, group_cols)
-    ref_df, ref_join_left, ref_join_right = check_kwargs(df, kwargs, 'ref', ref_num_col, ref_denom_col)
+    
+    if is_chunked(df):
+        state = ISRateState(num_col, denom_col, ref_num_col, ref_denom_col, group_cols, metadata, multiplier, workers, **kwargs)
+        return sum_chunks(df, state).finalize(confidence, incremental)
+    
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, True, grouping, israte_results, num_col, denom_col, ref_num_col,
+                                ref_denom_col, metadata, confidence, multiplier, kwargs)
+    
     obs_df, obs_join_left, obs_join_right = check_kwargs(df, kwargs, 'obs', num_col)
-    df = validate_data(df, denom_col, group_cols, metadata, ref_df=ref_df)
+    df = isr_terms(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols, metadata, grouping = grouping, **kwargs)
     
     # Grouping by temporary column to reduce duplication in code
     df, group_cols = group_args(df, group_cols, True)
+    
+    sum_cols, skipna_cols = isr_sum_cols(num_col, ref_num_col, ref_denom_col, obs_df is not None)
+    df = group_sums(df, group_cols, sum_cols, skipna_cols, workers = workers, grouping = grouping)
+    
+    return finalize_groups(incremental, group_cols, israte_results, df, num_col, ref_num_col, ref_denom_col, group_cols,
+                           metadata, confidence, multiplier, obs_df, obs_join_left, obs_join_right)
+
+
+
+def isr_terms(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = None, metadata = None, 
+              check_rows = True, grouping = None, **kwargs):
+    """Validates data and adds the expected events ('exp_x') which are summed within groups to calculate
+    indirectly standardised rates and ratios.
+    
+    Args:
+        df: Pandas DataFrame.
+        num_col (str), denom_col (str), ref_num_col (str), ref_denom_col (str), group_cols (list), 
+            metadata (bool): as in `ph_ISRate`.
+        check_rows (bool): Whether to check the number of rows per group, which can't be done on a chunk of data.
+        grouping (Grouping): Group codes factorised from the data, or None.
+        **kwargs: ref_df, ref_join_left, ref_join_right, obs_df, obs_join_left and obs_join_right as in `ph_ISRate`.
+        
+    Returns:
+        Validated copy of the Pandas DataFrame with the 'exp_x' column.
+    """
+    
+    ref_df, ref_join_left, ref_join_right = check_kwargs(df, kwargs, 'ref', ref_num_col, ref_denom_col)
+    check_kwargs(df, kwargs, 'obs', num_col)
+    df = validate_data(df, denom_col, group_cols, metadata, ref_df = ref_df if check_rows else None, grouping = grouping)
 
     if ref_df is not None:
         df = df.merge(ref_df, how='left', left_on=ref_join_left, right_on=ref_join_right).drop(ref_join_right, axis=1)
     
     df['exp_x'] = df[ref_num_col].fillna(0) / df[ref_denom_col] * df[denom_col].fillna(0)
     
+    return df
+
+
+
+def isr_sum_cols(num_col, ref_num_col, ref_denom_col, obs):
+    """Columns summed within groups for indirectly standardised rates, and those where nulls are treated
+    as zero. Observed events are joined after summing if given in obs_df (obs = True)."""
+    
+    if obs:
+        return ['exp_x', ref_num_col, ref_denom_col], [ref_num_col]
+    
+    return [num_col, 'exp_x', ref_num_col, ref_denom_col], [num_col, ref_num_col]
+
+
+
+def israte_results(df, num_col, ref_num_col, ref_denom_col, group_cols, metadata, confidence, multiplier,
+                   obs_df = None, obs_join_left = None, obs_join_right = None):
+    """Calculates indirectly standardised rates and confidence intervals from expected events summed within groups.
+    
+    Args:
+        df: Pandas DataFrame of summed data, one row per group.
+        num_col (str), ref_num_col (str), ref_denom_col (str), metadata (bool), multiplier (int): as in `ph_ISRate`.
+        group_cols (list): List of column name(s) the data is grouped by.
+        confidence (list): Confidence interval(s) to use.
+        obs_df, obs_join_left (list), obs_join_right (list): Observed events to join, as returned by `check_kwargs`.
+        
+    Returns:
+        Pandas DataFrame of calculated IS Rates as returned by `ph_ISRate`.
+    """
+    
     if obs_df is not None:
-        df = df.groupby(group_cols).agg({'exp_x': lambda x: x.sum(skipna=False),
-                                         ref_num_col: 'sum',
-                                         ref_denom_col: lambda x: x.sum(skipna=False)}).reset_index()
         df = df.merge(obs_df, how = 'left', left_on = obs_join_left, right_on = obs_join_right)
-    
-    else:
-        df = df.groupby(group_cols).agg({num_col: 'sum',
-                                         'exp_x': lambda x: x.sum(skipna=False),
-                                         ref_num_col: 'sum',
-                                         ref_denom_col: lambda x: x.sum(skipna=False)}).reset_index()
         
-    df['ref_rate'] = df[ref_num_col] / df[ref_denom_col] * multiplier
+    result = core.israte_from_sums(col_values(df, num_col), col_values(df, 'exp_x'), col_values(df, ref_num_col),
+                                   col_values(df, ref_denom_col), confidence, multiplier)
     
     # Tidy dataframe
     df = df.rename(columns={num_col: 'Observed', 'exp_x': 'Expected'}).\
-        drop([ref_num_col, ref_denom_col], axis=1).reindex(columns=(group_cols + ['Observed', 'Expected', 'ref_rate']))
-    
-    df['Value'] = df['Observed'] / df['Expected'] * df['ref_rate']
+        drop([ref_num_col, ref_denom_col], axis=1).reindex(columns=(group_cols + ['Observed', 'Expected']))
     
-    for c in confidence:
-        df[ci_col(c, 'lower')] = df.apply(lambda x: byars_lower(x['Observed'], c), axis=1) / df['Expected'] * df['ref_rate']
-        df[ci_col(c, 'upper')] = df.apply(lambda x: byars_upper(x['Observed'], c), axis=1) / df['Expected'] * df['ref_rate']
+    columns = {'ref_rate': result['ref_rate'], 'Value': result['value'], **ci_columns(result, confidence)}
 
     if metadata:
         method = np.where(df['Observed'] < 10, 'Exact', 'Byars')
-        df = metadata_cols(df, f'indirectly standardised rate per {multiplier}', confidence, method)
+        columns.update(metadata_columns(f'indirectly standardised rate per {multiplier}', confidence, method))
     
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
 
-    return df
+    return assign_columns(df, columns)
+
+
+
+
+class ISRateState(GroupSums):
+    """Expected and observed events summed within groups, which can be updated with more data,
+    merged with the state of other data (e.g. calculated on another machine) and finalised into
+    exactly the indirectly standardised rates `ph_ISRate` would return for all of the data.
+    
+    Parameters
+    ----------
+    num_col : str
+        Field containing observed number of events.
+    denom_col : str
+        Field containing population at risk.
+    ref_num_col : str
+        Observed events in the reference population.
+    ref_denom_col : str
+        Population at risk in the reference population.
+    group_cols : str | list
+        Columns to group data by.
+    metadata : bool 
+        Include metadata columns.
+    multiplier : int 
+        The multiplier for the rate calculation, default 100000.
+    workers : int
+        Number of worker processes to sum each update with. Defaults to None (no parallelism).
+    **kwargs
+        ref_df, ref_join_left, ref_join_right, obs_df, obs_join_left and obs_join_right as in `ph_ISRate`.
+    
+    """
+    
+    def __init__(self, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = None, metadata = True, 
+                 multiplier = 100000, workers = None, **kwargs):
+        null, group_cols = format_args(None, group_cols)
+        
+        sum_cols, skipna_cols = self.sum_columns(num_col, ref_num_col, ref_denom_col, 'obs_df' in kwargs)
+        super().__init__(group_cols, sum_cols, skipna_cols, workers = workers)
+        self.num_col, self.denom_col = num_col, denom_col
+        self.ref_num_col, self.ref_denom_col = ref_num_col, ref_denom_col
+        self.metadata, self.multiplier, self.kwargs = metadata, multiplier, kwargs
+        self.params = {'num_col': num_col, 'denom_col': denom_col, 'ref_num_col': ref_num_col, 
+                       'ref_denom_col': ref_denom_col, 'group_cols': group_cols, 'metadata': metadata,
+                       'multiplier': multiplier, 'workers': workers, **kwargs}
+    
+    sum_columns = staticmethod(isr_sum_cols)
+    
+    def prepare(self, df):
+        # rows per group can only be checked once all the data is summed
+        return isr_terms(df, self.num_col, self.denom_col, self.ref_num_col, self.ref_denom_col, 
+                         self.group_cols, self.metadata, check_rows = False, **self.kwargs)
+    
+    def summed(self):
+        """Sums checked for the number of rows per group, and the observed events to join to them."""
+        df = self.sums
+        
+        if 'ref_df' in self.kwargs:
+            check_group_rows(df, len(self.kwargs['ref_df']), 'ref_df length must equal same number of rows in each group within data')
+        
+        df = df.drop(columns='ph_pkg_rows')
+        
+        return (df, *check_kwargs(df, self.kwargs, 'obs', self.num_col))
+    
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates indirectly standardised rates with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float | list 
+            Confidence levels, default 0.95.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            Dataframe containing calculated IS Rates, as returned by `ph_ISRate`.
+        """
+        confidence, null = format_args(confidence)
+        df, obs_df, obs_join_left, obs_join_right = self.summed()
+        
+        return finalize_groups(incremental, self.keys, israte_results, df, self.num_col, self.ref_num_col, self.ref_denom_col,
+                               self.keys, self.metadata, confidence, self.multiplier, obs_df, obs_join_left, obs_join_right)
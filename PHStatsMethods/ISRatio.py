@@ -3,12 +3,21 @@
 import pandas as pd
 import numpy as np
 
-from .confidence_intervals import byars_lower, byars_upper
-from .validation import metadata_cols, ci_col, validate_data, format_args, check_kwargs, group_args
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, format_args, check_kwargs, group_args
+from .utils import group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import check_grouping
+from .ISRate import isr_terms, ISRateState
+from .instrumentation import instrumented
+from .frames import native_frames
 
 
+@instrumented
+@native_frames
 def ph_ISRatio(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = None, 
-                      metadata = True, confidence = 0.95, refvalue = 1, **kwargs):
+                      metadata = True, confidence = 0.95, refvalue = 1, workers = None, incremental = None, 
+                      grouping = None, **kwargs):
     
     """Calculates standard mortality ratios (or indirectly standardised ratios) with
     confidence limits using Byar's (1) or exact (2) CI method.
@@ -17,6 +26,8 @@ def ph_ISRatio(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols =
     ----------
     df 
         DataFrame containing the data to calculate IS ratios for.
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str
         Field name from data containing the observed number of events for
         each standardisation category (e.g. ageband) within each grouping set (eg area). If observed_totals is not None,
@@ -36,7 +47,16 @@ def ph_ISRatio(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols =
         Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
     refvalue : int 
         The standardised reference ratio, default = 1
-        
+    workers : int
+        Number of worker processes to sum the data within groups, with the input columns
+        placed once in shared memory rather than copied to each worker. Defaults to None (no parallelism).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
+
     Other Parameters
     ----------------
     ref_df: 
@@ -72,41 +92,132 @@ def ph_ISRatio(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols =
 
     # validate data - TODO: check group by row lengths?
     confidence, group_cols = format_args(confidence, group_cols)
-    ref_df, ref_join_left, ref_join_right = check_kwargs(df, kwargs, 'ref', ref_num_col, ref_denom_col)
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, True, grouping, isratio_results, num_col, denom_col, ref_num_col,
+                                ref_denom_col, metadata, confidence, refvalue, kwargs)
+    
     obs_df, obs_join_left, obs_join_right = check_kwargs(df, kwargs, 'obs', num_col)
-    df = validate_data(df, denom_col, group_cols, metadata, ref_df = ref_df)
+    df = isr_terms(df, num_col, denom_col, ref_num_col, ref_denom_col, group_cols, metadata, grouping = grouping, **kwargs)
     
     # Grouping by temporary column to reduce duplication in code
     df, group_cols = group_args(df, group_cols, True)
+    
+    ## TODO: must be a groupby?
+    sum_cols, skipna_cols = isratio_sum_cols(num_col, ref_num_col, ref_denom_col, obs_df is not None)
+    df = group_sums(df, group_cols, sum_cols, skipna_cols, workers = workers, grouping = grouping)
+    
+    return finalize_groups(incremental, group_cols, isratio_results, df, num_col, group_cols, metadata, confidence, refvalue,
+                           obs_df, obs_join_left, obs_join_right)
+
+
 
-    if ref_df is not None:
-        df = df.merge(ref_df, how = 'left', left_on = ref_join_left, right_on = ref_join_right).drop(ref_join_right, axis=1)
+def isratio_sum_cols(num_col, ref_num_col, ref_denom_col, obs):
+    """Columns summed within groups for indirectly standardised ratios, and those where nulls are treated
+    as zero. Observed events are joined after summing if given in obs_df (obs = True)."""
     
-    df['exp_x'] = df[ref_num_col].fillna(0) / df[ref_denom_col] * df[denom_col].fillna(0)
+    if obs:
+        return ['exp_x'], []
+    
+    return ['exp_x', num_col], ['exp_x', num_col]
+
+
+
+def isratio_results(df, num_col, group_cols, metadata, confidence, refvalue, 
+                    obs_df = None, obs_join_left = None, obs_join_right = None):
+    """Calculates indirectly standardised ratios and confidence intervals from expected events summed within groups.
+    
+    Args:
+        df: Pandas DataFrame of summed data, one row per group.
+        num_col (str), metadata (bool), refvalue (int): as in `ph_ISRatio`.
+        group_cols (list): List of column name(s) the data is grouped by.
+        confidence (list): Confidence interval(s) to use.
+        obs_df, obs_join_left (list), obs_join_right (list): Observed events to join, as returned by `check_kwargs`.
+        
+    Returns:
+        Pandas DataFrame of calculated IS Ratios as returned by `ph_ISRatio`.
+    """
     
-    ## TODO: must be a groupby?
     if obs_df is not None:
-        df = df.groupby(group_cols)[['exp_x']].apply(lambda x: x.sum(skipna=False)).reset_index()
         df = df.merge(obs_df, how = 'left', left_on = obs_join_left, right_on = obs_join_right)
-    else:
-        df = df.groupby(group_cols)[['exp_x', num_col]].sum().reset_index()
         
     df = df.rename(columns={num_col: 'Observed', 'exp_x': 'Expected'}).reindex(columns=(group_cols + ['Observed', 'Expected']))
     
-    df['Value'] = df['Observed'] / df['Expected'] * refvalue
+    result = core.isratio_from_sums(col_values(df, 'Observed'), col_values(df, 'Expected'), confidence, refvalue)
     
-    for c in confidence:
-        df[ci_col(c, 'lower')] = df.apply(lambda x: byars_lower(x['Observed'], c), axis=1) / df['Expected'] * refvalue
-        df[ci_col(c, 'upper')] = df.apply(lambda x: byars_upper(x['Observed'], c), axis=1) / df['Expected'] * refvalue
+    columns = {'Value': result['value'], **ci_columns(result, confidence)}
 
     if metadata:
         method = np.where(df['Observed'] < 10, 'Exact', 'Byars')
-        df = metadata_cols(df, f'indirectly standardised ratio x {refvalue}', confidence, method)
+        columns.update(metadata_columns(f'indirectly standardised ratio x {refvalue}', confidence, method))
         
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
     
-    return df
+    return assign_columns(df, columns)
+
+
+
+class ISRatioState(ISRateState):
+    """Expected and observed events summed within groups, which can be updated with more data,
+    merged with the state of other data (e.g. calculated on another machine) and finalised into
+    exactly the indirectly standardised ratios `ph_ISRatio` would return for all of the data.
+    
+    Parameters
+    ----------
+    num_col : str
+        Field name from data containing the observed number of events for
+        each standardisation category (e.g. ageband) within each grouping set (eg area).
+    denom_col : str 
+        Field name from data containing the population for each standardisation 
+        category (e.g. age band).
+    ref_num_col : str 
+        The observed number of events in the reference population for
+        each standardisation category (eg age band); field name from df or ref_def.
+    ref_denom_col : str 
+        The reference population for each standardisation category (eg age band)
+    group_cols : str | list
+        A string or list of column name(s) to group the data by.
+    metadata : bool 
+        Include metadata columns.
+    refvalue : int 
+        The standardised reference ratio, default = 1
+    workers : int
+        Number of worker processes to sum each update with. Defaults to None (no parallelism).
+    **kwargs
+        ref_df, ref_join_left, ref_join_right, obs_df, obs_join_left and obs_join_right as in `ph_ISRatio`.
     
+    """
+    
+    sum_columns = staticmethod(isratio_sum_cols)
+    
+    def __init__(self, num_col, denom_col, ref_num_col, ref_denom_col, group_cols = None, metadata = True, 
+                 refvalue = 1, workers = None, **kwargs):
+        super().__init__(num_col, denom_col, ref_num_col, ref_denom_col, group_cols, metadata, workers = workers, **kwargs)
+        self.refvalue = refvalue
+        self.params = {'num_col': num_col, 'denom_col': denom_col, 'ref_num_col': ref_num_col, 
+                       'ref_denom_col': ref_denom_col, 'group_cols': self.group_cols, 'metadata': metadata,
+                       'refvalue': refvalue, 'workers': workers, **kwargs}
     
-    
\ No newline at end of file
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates indirectly standardised ratios with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float | list 
+            Confidence levels, default 0.95.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            Dataframe containing calculated IS Ratios, as returned by `ph_ISRatio`.
+        """
+        confidence, null = format_args(confidence)
+        df, obs_df, obs_join_left, obs_join_right = self.summed()
+        
+        return finalize_groups(incremental, self.keys, isratio_results, df, self.num_col, self.keys, self.metadata, confidence,
+                               self.refvalue, obs_df, obs_join_left, obs_join_right)
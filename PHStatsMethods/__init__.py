@@ -8,7 +8,7 @@ This is a Python package to support analysts in the execution of statistical
 methods approved for use in the production of Public Health indicators such as
 those presented via `Fingertips <https://fingertips.phe.org.uk/>`_. It
 provides functions for the generation of Proportions, Rates, DSRs, ISRs,
-Funnel plots and Means including confidence intervals for these statistics,
+Life expectancy, Funnel plots and Means including confidence intervals for these statistics,
 and a function for assigning data to quantiles.
 
 Any feedback would be appreciated and can be provided using the Issues
@@ -43,21 +43,59 @@ For more information on any function, you can use:
 
 """
 
-from .confidence_intervals import *
-from .DSR import ph_dsr
-from .funnels import calculate_funnel_limits, assign_funnel_significance, calculate_funnel_points
-from .ISRate import ph_ISRate
-from .ISRatio import ph_ISRatio
-from .means import ph_mean
-from .proportions import ph_proportion
-from .quantiles import ph_quantile
-from .rates import ph_rate
-from .utils import euro_standard_pop
+import importlib
+
+# Public names and the submodules defining them. Submodules (and pandas and scipy through
+# them) are only imported when one of their names is first used, so importing the package is cheap.
+_submodules = {**dict.fromkeys(["wilson_lower", "wilson_upper", "wilson", "exact_upper", "exact_lower", "exact",
+                                "byars_lower", "byars_upper", "byars", "dobson_lower", "dobson_upper",
+                                "student_t_dist"], "confidence_intervals"),
+               **dict.fromkeys(["ph_dsr", "DSRState"], "DSR"),
+               "ph_from_dataset": "datasets",
+               "ph_from_sql": "sql",
+               **dict.fromkeys(["calculate_funnel_limits", "assign_funnel_significance",
+                                "calculate_funnel_points"], "funnels"),
+               "assign_benchmark_significance": "comparisons",
+               "Batch": "batch",
+               **dict.fromkeys(["ResultCache", "DiskCache"], "cache"),
+               "Grouping": "grouping",
+               "Incremental": "incremental",
+               **dict.fromkeys(["instrument", "StageSummary", "MemoryProfile"], "instrumentation"),
+               **dict.fromkeys(["ph_ISRate", "ISRateState"], "ISRate"),
+               "ph_indicators": "indicators",
+               "ph_life_expectancy": "life_expectancy",
+               **dict.fromkeys(["ph_ISRatio", "ISRatioState"], "ISRatio"),
+               **dict.fromkeys(["ph_mean", "MeanState"], "means"),
+               **dict.fromkeys(["ph_proportion", "ProportionState"], "proportions"),
+               "ph_proportion_by_quantile": "deprivation",
+               "ph_quantile": "quantiles",
+               **dict.fromkeys(["ph_rate", "RateState"], "rates"),
+               "ph_rolling_periods": "rolling",
+               "ph_rollup": "rollup",
+               "ph_sii": "sii",
+               "euro_standard_pop": "utils"}
 
 __all__ = ["wilson_lower", "wilson_upper", "wilson",
            "exact_upper", "exact_lower", "exact",
            "byars_lower", "byars_upper", "byars", 
            "dobson_lower", "dobson_upper", "student_t_dist", 
            "calculate_funnel_limits", "assign_funnel_significance", "calculate_funnel_points",
-           "ph_dsr", "ph_ISRate", "ph_ISRatio", "ph_mean", "ph_proportion",
-           "ph_quantile", "ph_rate", "euro_standard_pop"]
+           "assign_benchmark_significance",
+           "ph_dsr", "ph_from_dataset", "ph_from_sql", "ph_indicators", "ph_ISRate", "ph_ISRatio", "ph_life_expectancy", "ph_mean", "ph_proportion",
+           "ph_proportion_by_quantile", "ph_quantile", "ph_rate", "ph_rolling_periods", "ph_rollup", "ph_sii", "euro_standard_pop",
+           "ProportionState", "RateState", "DSRState", "ISRateState", "ISRatioState", "MeanState",
+           "Incremental", "Grouping", "instrument", "StageSummary", "MemoryProfile", "ResultCache", "DiskCache", "Batch"]
+
+
+
+def __getattr__(name):
+    if name in _submodules:
+        value = getattr(importlib.import_module(f'.{_submodules[name]}', __name__), name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
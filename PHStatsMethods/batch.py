@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Batch:
+    """Many statistics calculated concurrently in a pool of threads, e.g. every indicator of a
+    dashboard or of a nightly run.
+
+    No statistic changes the DataFrames passed to it, so the same DataFrame can be shared by
+    any number of calls without copying it first. The time spent in NumPy, SciPy and pandas
+    releases the GIL, so the calls overlap. `Incremental` runs hold state, so each should only be
+    passed to one call in a batch. Each call runs in a copy of the context the batch is run in,
+    so listeners attached with `instrument` receive the stages of every call.
+
+    Attributes
+    ----------
+    calls : dict
+        Names of the calls added, and their (statistic, args, kwargs).
+
+    Examples
+    --------
+      >>> batch = Batch()
+      >>> batch.add('rates', ph_rate, df, 'numerator', 'denominator', 'area')
+      >>> batch.add('proportions', ph_proportion, df, 'numerator', 'denominator', 'area', multiplier = 100)
+      >>> batch.add('dsrs', ph_dsr, df_ages, 'count', 'pop', 'ageband', 'area')
+      >>> results = batch.run(threads = 4)
+      >>> results['rates']
+
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def add(self, name, func, *args, **kwargs):
+        """Adds a call of a statistic to the batch.
+
+        Parameters
+        ----------
+        name
+            Name of the result of the call, which must be unique within the batch.
+        func
+            Statistic to call, e.g. `ph_rate`.
+        *args, **kwargs
+            Arguments to call the statistic with.
+
+        Returns
+        -------
+        The batch, so calls can be chained.
+        """
+
+        if name in self.calls:
+            raise ValueError(f"'{name}' has already been added to the batch")
+
+        if not callable(func):
+            raise TypeError("'func' must be callable")
+
+        self.calls[name] = (func, args, kwargs)
+
+        return self
+
+    def run(self, threads = None, cache = None, errors = 'raise'):
+        """Calculates every statistic in the batch.
+
+        Parameters
+        ----------
+        threads : int
+            Number of threads to calculate the statistics in. Defaults to None (one per CPU).
+        cache : ResultCache | DiskCache
+            Cache to calculate the statistics through, so calls repeated since the cache was last
+            used aren't calculated again. Defaults to None (no cache).
+        errors : str
+            If 'raise' (the default), the first error, in the order the calls were added, is raised
+            once every call has finished. If 'return', the error is returned as the call's result.
+
+        Returns
+        -------
+        dict
+            The result of each call by name, in the order they were added.
+        """
+
+        if threads is not None and (not isinstance(threads, int) or threads <= 0):
+            raise ValueError("'threads' must be a positive integer")
+
+        if errors not in ['raise', 'return']:
+            raise ValueError("'errors' must be either 'raise' or 'return'")
+
+        threads = threads or os.cpu_count() or 1
+
+        with ThreadPoolExecutor(min(threads, max(len(self.calls), 1))) as pool:
+            futures = {name: pool.submit(contextvars.copy_context().run, call, cache, func, *args, **kwargs)
+                       for name, (func, args, kwargs) in self.calls.items()}
+
+        results = {}
+
+        for name, future in futures.items():
+            error = future.exception()
+
+            if error is not None and errors == 'raise':
+                raise error
+
+            results[name] = future.result() if error is None else error
+
+        return results
+
+
+
+def call(cache, func, *args, **kwargs):
+    """Calls a statistic, through a cache if one is given."""
+
+    return func(*args, **kwargs) if cache is None else cache(func, *args, **kwargs)
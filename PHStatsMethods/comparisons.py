@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from .validation import format_args, check_arguments, ci_col, col_values
+from .instrumentation import instrumented, stage
+
+
+# categories of the comparison with the comparator, by polarity, in the order of their codes
+# (0 where the value is significantly lower than the comparator, 1 similar and 2 higher)
+POLARITIES = {None: ['Lower', 'Similar', 'Higher'],
+              'high_is_good': ['Worse', 'Similar', 'Better'],
+              'low_is_good': ['Better', 'Similar', 'Worse']}
+
+
+@instrumented
+def assign_benchmark_significance(df, comparator, statistic, area_col = None, group_cols = None, confidence = 0.95,
+                                  polarity = None, value_col = 'Value'):
+    """Compares the value of every row of a result (e.g. of `ph_proportion`, `ph_rate` or `ph_dsr`)
+    with a comparator (e.g. England or the area's region), classifying each as significantly lower,
+    similar or higher at each confidence level. A row differs significantly from its comparator
+    where its confidence interval is wholly above or below the comparator's value.
+
+    Parameters
+    ----------
+    df
+        DataFrame of results, with the value and its confidence intervals (e.g. 'lower_95_ci' and
+        'upper_95_ci') in each row.
+    comparator : float | str | dict
+        The comparator of each row, either as a value to compare every row with, the name of a
+        column containing the area code of each row's comparator, or a dict (or Pandas Series)
+        mapping the area codes in area_col to the area codes of their comparators. Comparators
+        given as area codes are looked up in the rows of df with the same group_cols.
+    statistic : str
+        Type of statistic being compared: 'proportion', 'rate' or 'dsr'.
+    area_col : str
+        Name of column containing the area code of each row, required where comparators are
+        given as area codes. Defaults to None.
+    group_cols : str | list
+        A string or list of column name(s) (e.g. indicator and period) which rows must share
+        with their comparator. Defaults to None.
+    confidence : float
+        Confidence level(s) to compare at, either as a float or list of float values.
+        Defaults to 0.95.
+    polarity : str
+        None (the default) for the categories 'Lower', 'Similar' and 'Higher', or 'high_is_good'
+        or 'low_is_good' for the categories 'Worse', 'Similar' and 'Better'.
+    value_col : str
+        Name of column containing the values. Defaults to 'Value'.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Copy of df with the comparator's value ('comparator_value') and a categorical column of
+        the comparison at each confidence level (e.g. 'significance_95', 'significance_99_8'),
+        null where the row or its comparator has no value.
+
+    Examples
+    --------
+      >>> df = ph_proportion(data, 'numerator', 'denominator', ['year', 'area'], confidence = [0.95, 0.998])
+      >>> assign_benchmark_significance(df, 'region', 'proportion', area_col = 'area', group_cols = 'year',
+                                        confidence = [0.95, 0.998], polarity = 'high_is_good')
+
+    """
+
+    confidence, group_cols = format_args(confidence, group_cols)
+    check_comparison(df, comparator, statistic, area_col, group_cols, confidence, polarity, value_col)
+
+    with stage('comparator', rows = len(df)):
+        comparator_value = comparator_values(df, comparator, area_col, group_cols, value_col)
+
+    with stage('compare', rows = len(df)) as compare:
+        columns = {'comparator_value': comparator_value}
+        value = col_values(df, value_col)
+
+        for c in confidence:
+            lower, upper = col_values(df, ci_col(c, 'lower')), col_values(df, ci_col(c, 'upper'))
+
+            codes = np.where(lower > comparator_value, 2, np.where(upper < comparator_value, 0, 1))
+            codes = np.where(np.isnan(value) | np.isnan(lower) | np.isnan(upper) | np.isnan(comparator_value), -1, codes)
+
+            columns[f'significance_{ci_col(c)[:-3]}'] = pd.Categorical.from_codes(codes, POLARITIES[polarity])
+
+        df = compare.frame = df.assign(**columns)
+
+    return df
+
+
+
+def comparator_values(df, comparator, area_col, group_cols, value_col):
+    """Value of each row's comparator.
+
+    Args:
+        As in `assign_benchmark_significance`.
+
+    Returns:
+        NumPy array of the comparator values, null where a row has no comparator.
+    """
+
+    if isinstance(comparator, (int, float)) and not isinstance(comparator, bool):
+        return np.full(len(df), float(comparator))
+
+    codes = df[comparator] if isinstance(comparator, str) else df[area_col].map(comparator)
+    keys = [] if group_cols is None else group_cols
+
+    rows = pd.MultiIndex.from_frame(df[keys + [area_col]])
+
+    if rows.has_duplicates:
+        raise ValueError(f"There must be one row for each area in '{area_col}' within each group")
+
+    position = rows.get_indexer(pd.MultiIndex.from_arrays([df[col] for col in keys] + [codes]))
+
+    return np.where(position >= 0, col_values(df, value_col)[position], np.nan)
+
+
+
+def check_comparison(df, comparator, statistic, area_col, group_cols, confidence, polarity, value_col):
+    """Validates the arguments of `assign_benchmark_significance`.
+
+    Args:
+        As in `assign_benchmark_significance`.
+    """
+
+    if statistic not in ['proportion', 'rate', 'dsr']:
+        raise ValueError("'statistic' must be either 'proportion', 'rate' or 'dsr'")
+
+    if polarity not in POLARITIES:
+        raise ValueError("'polarity' must be either None, 'high_is_good' or 'low_is_good'")
+
+    if confidence is None:
+        raise ValueError('At least one confidence level must be given to compare at')
+
+    check_arguments(df, [value_col] + ([] if group_cols is None else group_cols))
+    check_arguments(df, [ci_col(c, ci_type) for c in confidence for ci_type in ['lower', 'upper']])
+
+    if not isinstance(comparator, (int, float)) or isinstance(comparator, bool):
+        if area_col is None:
+            raise TypeError("'area_col' must be given where comparators are given as area codes")
+
+        check_arguments(df, [area_col])
+
+        if isinstance(comparator, str):
+            check_arguments(df, [comparator])
+
+        elif not isinstance(comparator, (dict, pd.Series)):
+            raise TypeError("'comparator' must be a number, a column name or a dict of comparator areas")
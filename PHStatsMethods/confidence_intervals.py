@@ -3,8 +3,6 @@
 import numpy as np
 import warnings
 from math import sqrt
-from scipy.stats import chi2, norm
-from scipy import stats
 
 from .utils import get_calc_variables
 
@@ -122,6 +120,7 @@ def exact_upper(value, confidence=0.95):
     (1) Armitage P, Berry G. Statistical methods in medical research (4th edn). Oxford: Blackwell; 2002.
 
     """
+    from scipy.stats import chi2
     o = 2 * value + 2
     upper_ci = chi2.ppf(1 - ((1 - confidence) / 2), o) / 2
     return upper_ci
@@ -148,6 +147,7 @@ def exact_lower(value, confidence=0.95):
     (1) Armitage P, Berry G. Statistical methods in medical research (4th edn). Oxford: Blackwell; 2002.
         
     """
+    from scipy.stats import chi2
     o = 2 * value
     lower_ci = chi2.ppf((1 - confidence) / 2, o) / 2
     return lower_ci
@@ -203,6 +203,7 @@ def byars_lower(value, confidence=0.95):
     if value < 0:
         raise ValueError("'Value' must be a positive number")
     
+    from scipy.stats import norm
     z = norm.ppf(confidence + (1-confidence)/2)
     
     if value < 10:
@@ -236,6 +237,7 @@ def byars_upper(value, confidence=0.95):
     if value <= 0:
         raise ValueError("'Value' must be a positive number")
         
+    from scipy.stats import norm
     z = norm.ppf(confidence + (1-confidence)/2)
     
     if value < 10:
@@ -311,6 +313,7 @@ def student_t_dist(value_count, st_dev, confidence=0.95):
         Student-t distribution value. 
         
     """
+    from scipy import stats
     return abs(stats.t.ppf((1-confidence)/2, value_count - 1)) * st_dev / value_count**.5
 
 
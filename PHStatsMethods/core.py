@@ -0,0 +1,829 @@
+# -*- coding: utf-8 -*-
+"""
+NumPy core of the statistics, beneath the DataFrame functions.
+
+Each statistic is a function of NumPy arrays and optional integer group codes (one per
+element, from 0 to ngroups - 1, or -1 for elements which aren't in any group). Values are
+summed within groups and the statistic and its confidence intervals are calculated for
+each group, without building any DataFrames, so they can be called cheaply on small
+inputs (e.g. from a service). The `ph_*` functions validate DataFrames, sum them within
+groups and call the `*_from_sums` functions here.
+
+Each statistic returns a dictionary of arrays with one element per group: the summed
+inputs, 'value', and 'lower' and 'upper' confidence intervals as 2-D arrays with one row
+per confidence level.
+
+    >>> from PHStatsMethods import core
+    >>> core.rate(np.array([30, 20, 65]), np.array([4000, 5000, 7500]), codes = np.array([0, 0, 1]))
+
+"""
+
+import numpy as np
+
+
+# The quantile functions of scipy.stats distributions, called through scipy.special to avoid
+# the argument checking overhead of the distribution objects for small inputs. scipy is only
+# imported when they are first called, so importing the package doesn't load it.
+
+def norm_ppf(q):
+    from scipy.special import ndtri
+    return ndtri(q)
+
+
+def chi2_ppf(q, df):
+    from scipy.special import gammaincinv
+    return 2 * gammaincinv(np.asarray(df, dtype=float) / 2, q)
+
+
+def t_ppf(q, df):
+    from scipy.special import stdtrit
+    return stdtrit(df, q)
+
+
+
+def as_confidence(confidence):
+    """Returns confidence level(s) as a list; None gives no confidence intervals."""
+
+    if confidence is None:
+        return []
+
+    return list(confidence) if np.ndim(confidence) > 0 else [confidence]
+
+
+
+def as_float(values):
+    return np.asarray(values, dtype=float)
+
+
+
+def group_sum(values, codes = None, ngroups = None, skipna = False):
+    """Sums values within groups.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to sum.
+    codes : numpy.ndarray
+        Integer group code of each value, -1 for values without a group. Defaults to None,
+        which sums all of the values as a single group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    skipna : bool
+        Whether nulls are treated as zero (True) or make the sum of their group null (False).
+
+    Returns
+    -------
+    numpy.ndarray
+        Sum of each group.
+    """
+
+    values = as_float(values)
+
+    if codes is None:
+        codes = np.zeros(len(values), dtype=np.int64)
+
+    codes = np.asarray(codes, dtype=np.int64)
+    ngroups = int(codes.max()) + 1 if ngroups is None else ngroups
+
+    keep = codes >= 0
+    if not keep.all():
+        codes, values = codes[keep], values[keep]
+
+    missing = np.isnan(values)
+    sums = np.bincount(codes, weights=np.where(missing, 0, values), minlength=ngroups)
+
+    if not skipna:
+        sums[np.bincount(codes, weights=missing, minlength=ngroups) > 0] = np.nan
+
+    return sums
+
+
+
+def group_count(values, codes = None, ngroups = None):
+    """Counts the values which aren't null within groups."""
+
+    return group_sum(~np.isnan(as_float(values)), codes, ngroups)
+
+
+
+###### CONFIDENCE INTERVALS ###################################################
+
+
+def wilson_bounds(count, denominator, confidence = 0.95):
+    """Vectorised Wilson Score confidence intervals, as `wilson_lower` and `wilson_upper`.
+
+    Returns
+    -------
+    Tuple
+        Arrays of lower and upper confidence intervals.
+    """
+
+    count, denominator = as_float(count), as_float(denominator)
+    norm_cum_dist = norm_ppf((100 + (100 - (100 * (1 - confidence)))) / 200)
+    spread = norm_cum_dist * np.sqrt(norm_cum_dist ** 2 + 4 * count * (1 - (count / denominator)))
+
+    lower = (2 * count + norm_cum_dist ** 2 - spread) / 2 / (denominator + norm_cum_dist ** 2)
+    upper = (2 * count + norm_cum_dist ** 2 + spread) / 2 / (denominator + norm_cum_dist ** 2)
+
+    return lower, upper
+
+
+
+def exact_bounds(value, confidence = 0.95):
+    """Vectorised exact (Poisson) confidence intervals, as `exact_lower` and `exact_upper`.
+
+    Returns
+    -------
+    Tuple
+        Arrays of lower and upper confidence intervals.
+    """
+
+    value = as_float(value)
+
+    lower = chi2_ppf((1 - confidence) / 2, 2 * value) / 2
+    upper = chi2_ppf(1 - ((1 - confidence) / 2), 2 * value + 2) / 2
+
+    return lower, upper
+
+
+
+def byars_bounds(value, confidence = 0.95):
+    """Vectorised Byar's confidence intervals, using the exact method for values below 10,
+    as `byars_lower` and `byars_upper`.
+
+    Returns
+    -------
+    Tuple
+        Arrays of lower and upper confidence intervals.
+    """
+
+    value = np.atleast_1d(as_float(value))
+
+    if (value <= 0).any():
+        raise ValueError("'Value' must be a positive number")
+
+    z = norm_ppf(confidence + (1 - confidence) / 2)
+
+    lower = value * (1 - 1 / (9 * value) - z / (3 * np.sqrt(value))) ** 3
+    upper = (value + 1) * (1 - 1 / (9 * (value + 1)) + z / (3 * np.sqrt(value + 1))) ** 3
+
+    # the exact method is only evaluated where it's used
+    small = value < 10
+    if small.any():
+        lower[small], upper[small] = exact_bounds(value[small], confidence)
+
+    return lower, upper
+
+
+
+def dobson_bounds(value, total_count, var, multiplier, confidence = 0.95):
+    """Vectorised Dobson confidence intervals, as `dobson_lower` and `dobson_upper`; null where
+    the total count is below 10.
+
+    Returns
+    -------
+    Tuple
+        Arrays of lower and upper confidence intervals.
+    """
+
+    value, total_count, var = as_float(value), as_float(total_count), as_float(var)
+    valid = total_count >= 10
+
+    lower, upper = np.full(len(value), np.nan), np.full(len(value), np.nan)
+
+    if valid.any():
+        byars_lower, byars_upper = byars_bounds(total_count[valid], confidence)
+        spread = np.sqrt(var[valid] / total_count[valid])
+        lower[valid] = value[valid] + spread * (byars_lower - total_count[valid]) * multiplier
+        upper[valid] = value[valid] + spread * (byars_upper - total_count[valid]) * multiplier
+
+    return lower, upper
+
+
+
+# Confidence intervals which are costly to evaluate (Byar's and exact intervals, which invert the
+# chi-square distribution) are only calculated for the unique inputs and scattered back to every
+# element, when there are at least UNIQUE_MIN_SIZE elements and no more than UNIQUE_MAX_RATIO of them
+# are unique, as with counts of events, which repeat heavily. Set UNIQUE_MAX_RATIO to 0 to turn this off.
+UNIQUE_MIN_SIZE = 1000
+UNIQUE_MAX_RATIO = 0.5
+
+
+def unique_inputs(arrays):
+    """Unique tuples of the elements of arrays, with the inverse indices to scatter results on them back
+    to every element, or the arrays and None where there are too few repeats to be worth it.
+
+    Args:
+        arrays (list): Arrays of the same length.
+
+    Returns:
+        Tuple of the list of arrays of unique tuples (or the arrays) and the inverse indices (or None).
+    """
+
+    n = len(arrays[0])
+
+    if n < UNIQUE_MIN_SIZE or UNIQUE_MAX_RATIO <= 0:
+        return arrays, None
+
+    # sort the tuples, so each new unique tuple starts where any element differs from the one before
+    # (NaNs never compare equal, so each is kept as its own tuple)
+    order = np.lexsort(arrays[::-1])
+    ordered = [a[order] for a in arrays]
+
+    starts = np.empty(n, dtype=bool)
+    starts[0] = True
+    starts[1:] = np.logical_or.reduce([a[1:] != a[:-1] for a in ordered])
+
+    if starts.sum() > n * UNIQUE_MAX_RATIO:
+        return arrays, None
+
+    inverse = np.empty(n, dtype=np.intp)
+    inverse[order] = np.cumsum(starts) - 1
+
+    return [a[starts] for a in ordered], inverse
+
+
+
+def bounds(func, confidence, *args, unique = False, **kwargs):
+    """Stacks the (lower, upper) confidence intervals of func on the arrays in args for each confidence
+    level. With unique, func is only evaluated on the unique tuples of args where they repeat enough."""
+
+    levels = as_confidence(confidence)
+    n = len(args[0])
+    args, inverse = unique_inputs([as_float(a) for a in args]) if unique and levels else (args, None)
+
+    cis = [func(*args, **kwargs, confidence = c) for c in levels]
+
+    if inverse is not None:
+        cis = [(ci[0][inverse], ci[1][inverse]) for ci in cis]
+
+    lower = np.array([ci[0] for ci in cis]).reshape(len(levels), n)
+    upper = np.array([ci[1] for ci in cis]).reshape(len(levels), n)
+
+    return lower, upper
+
+
+
+###### STATISTICS #############################################################
+
+
+def proportion(num, denom, codes = None, ngroups = None, confidence = 0.95, multiplier = 1):
+    """Proportions with Wilson Score confidence intervals.
+
+    Parameters
+    ----------
+    num, denom : numpy.ndarray
+        Numerators and denominators.
+    codes : numpy.ndarray
+        Integer group codes to sum within. Defaults to None, where each element is its own group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    confidence : float | list
+        Confidence level(s), or None.
+    multiplier : int
+        Multiplier used to express the proportions (e.g. 100 for percentages).
+
+    Returns
+    -------
+    dict
+        'num', 'denom', 'value', 'lower' and 'upper' arrays.
+    """
+
+    if codes is not None:
+        num, denom = group_sum(num, codes, ngroups), group_sum(denom, codes, ngroups)
+
+    return proportion_from_sums(num, denom, confidence, multiplier)
+
+
+
+def proportion_from_sums(num, denom, confidence = 0.95, multiplier = 1):
+    """Proportions with Wilson Score confidence intervals from numerators and denominators summed within groups."""
+
+    num, denom = as_float(num), as_float(denom)
+    lower, upper = bounds(wilson_bounds, confidence, num, denom)
+
+    return {'num': num, 'denom': denom, 'value': (num / denom) * multiplier,
+            'lower': lower * multiplier, 'upper': upper * multiplier}
+
+
+
+def rate(num, denom, codes = None, ngroups = None, confidence = 0.95, multiplier = 100000):
+    """Crude rates with Byar's (or exact, for numerators below 10) confidence intervals.
+
+    Parameters
+    ----------
+    num, denom : numpy.ndarray
+        Numerators and denominators.
+    codes : numpy.ndarray
+        Integer group codes to sum within. Defaults to None, where each element is its own group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    confidence : float | list
+        Confidence level(s), or None.
+    multiplier : int
+        Multiplier used to express the rates (e.g. 100000 for rates per 100,000).
+
+    Returns
+    -------
+    dict
+        'num', 'denom', 'value', 'lower' and 'upper' arrays.
+    """
+
+    if codes is not None:
+        num, denom = group_sum(num, codes, ngroups), group_sum(denom, codes, ngroups)
+
+    return rate_from_sums(num, denom, confidence, multiplier)
+
+
+
+def rate_from_sums(num, denom, confidence = 0.95, multiplier = 100000):
+    """Crude rates with confidence intervals from numerators and denominators summed within groups."""
+
+    num, denom = as_float(num), as_float(denom)
+    lower, upper = bounds(byars_bounds, confidence, num, unique = True)
+
+    return {'num': num, 'denom': denom, 'value': num / denom * multiplier,
+            'lower': lower / denom * multiplier, 'upper': upper / denom * multiplier}
+
+
+
+def dsr(num, denom, ref_denom, codes = None, ngroups = None, confidence = 0.95, multiplier = 100000):
+    """Directly standardised rates with Dobson confidence intervals; null where the total count is below 10.
+
+    Parameters
+    ----------
+    num, denom : numpy.ndarray
+        Observed events and populations of each standardisation category (e.g. age band).
+    ref_denom : numpy.ndarray
+        Standard populations of each standardisation category.
+    codes : numpy.ndarray
+        Integer group codes to sum within. Defaults to None, where all elements are one group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    confidence : float | list
+        Confidence level(s), or None.
+    multiplier : int
+        Multiplier used to express the rates.
+
+    Returns
+    -------
+    dict
+        'num', 'denom', 'value', 'lower' and 'upper' arrays.
+    """
+
+    num, denom, ref_denom = as_float(num), as_float(denom), as_float(ref_denom)
+    count = np.nan_to_num(num)
+
+    return dsr_from_sums(group_sum(num, codes, ngroups, skipna = True), group_sum(denom, codes, ngroups),
+                         group_sum(count * ref_denom / denom, codes, ngroups),
+                         group_sum(count * (ref_denom / denom)**2, codes, ngroups),
+                         group_sum(ref_denom, codes, ngroups), confidence, multiplier)
+
+
+
+def dsr_from_sums(num, denom, wt_rate, sq_rate, ref_denom, confidence = 0.95, multiplier = 100000):
+    """Directly standardised rates with confidence intervals from the weighted rate terms summed within groups."""
+
+    num, ref_denom = as_float(num), as_float(ref_denom)
+
+    value = as_float(wt_rate) / ref_denom * multiplier
+    vardsr = 1 / ref_denom**2 * as_float(sq_rate)
+    lower, upper = bounds(dobson_bounds, confidence, value, num, vardsr, multiplier = multiplier)
+
+    return {'num': num, 'denom': as_float(denom), 'value': np.where(num < 10, np.nan, value),
+            'lower': lower, 'upper': upper}
+
+
+
+def expected(denom, ref_num, ref_denom):
+    """Expected events of each standardisation category from reference rates."""
+
+    return np.nan_to_num(as_float(ref_num)) / as_float(ref_denom) * np.nan_to_num(as_float(denom))
+
+
+
+def israte(num, denom, ref_num, ref_denom, codes = None, ngroups = None, confidence = 0.95, multiplier = 100000):
+    """Indirectly standardised rates with Byar's (or exact) confidence intervals.
+
+    Parameters
+    ----------
+    num : numpy.ndarray
+        Observed events of each standardisation category, or observed totals of each group
+        (with one element per group) if the observed events aren't broken down.
+    denom : numpy.ndarray
+        Populations of each standardisation category.
+    ref_num, ref_denom : numpy.ndarray
+        Reference events and populations of each standardisation category.
+    codes : numpy.ndarray
+        Integer group codes to sum within. Defaults to None, where all elements are one group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    confidence : float | list
+        Confidence level(s), or None.
+    multiplier : int
+        Multiplier used to express the rates.
+
+    Returns
+    -------
+    dict
+        'observed', 'expected', 'ref_rate', 'value', 'lower' and 'upper' arrays.
+    """
+
+    exp_x = group_sum(expected(denom, ref_num, ref_denom), codes, ngroups)
+    observed = as_float(num) if len(num) == len(exp_x) and len(num) != len(denom) \
+        else group_sum(num, codes, ngroups, skipna = True)
+
+    return israte_from_sums(observed, exp_x, group_sum(ref_num, codes, ngroups, skipna = True),
+                            group_sum(ref_denom, codes, ngroups), confidence, multiplier)
+
+
+
+def israte_from_sums(observed, expected, ref_num, ref_denom, confidence = 0.95, multiplier = 100000):
+    """Indirectly standardised rates with confidence intervals from observed and expected events summed within groups."""
+
+    observed, expected = as_float(observed), as_float(expected)
+    ref_rate = as_float(ref_num) / as_float(ref_denom) * multiplier
+    lower, upper = bounds(byars_bounds, confidence, observed, unique = True)
+
+    return {'observed': observed, 'expected': expected, 'ref_rate': ref_rate,
+            'value': observed / expected * ref_rate,
+            'lower': lower / expected * ref_rate, 'upper': upper / expected * ref_rate}
+
+
+
+def isratio(num, denom, ref_num, ref_denom, codes = None, ngroups = None, confidence = 0.95, refvalue = 1):
+    """Indirectly standardised ratios with Byar's (or exact) confidence intervals.
+
+    Parameters are as in `israte`, with refvalue the value the ratios are expressed relative to.
+
+    Returns
+    -------
+    dict
+        'observed', 'expected', 'value', 'lower' and 'upper' arrays.
+    """
+
+    exp_x = group_sum(expected(denom, ref_num, ref_denom), codes, ngroups, skipna = True)
+    observed = as_float(num) if len(num) == len(exp_x) and len(num) != len(denom) \
+        else group_sum(num, codes, ngroups, skipna = True)
+
+    return isratio_from_sums(observed, exp_x, confidence, refvalue)
+
+
+
+def isratio_from_sums(observed, expected, confidence = 0.95, refvalue = 1):
+    """Indirectly standardised ratios with confidence intervals from observed and expected events summed within groups."""
+
+    observed, expected = as_float(observed), as_float(expected)
+    lower, upper = bounds(byars_bounds, confidence, observed, unique = True)
+
+    return {'observed': observed, 'expected': expected, 'value': observed / expected * refvalue,
+            'lower': lower / expected * refvalue, 'upper': upper / expected * refvalue}
+
+
+
+def mean(values, codes = None, ngroups = None, confidence = 0.95):
+    """Means with Student's t-distribution confidence intervals; null where any value in a group is null.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to average.
+    codes : numpy.ndarray
+        Integer group codes. Defaults to None, where all elements are one group.
+    ngroups : int
+        Number of groups. Defaults to one more than the largest code.
+    confidence : float | list
+        Confidence level(s), or None.
+
+    Returns
+    -------
+    dict
+        'sum', 'count', 'stdev', 'value', 'lower' and 'upper' arrays.
+    """
+
+    values = as_float(values)
+
+    if codes is None:
+        codes = np.zeros(len(values), dtype=np.int64)
+
+    codes = np.asarray(codes, dtype=np.int64)
+    ngroups = int(codes.max()) + 1 if ngroups is None else ngroups
+
+    total = group_sum(values, codes, ngroups)
+    count = group_count(values, codes, ngroups)
+
+    # sum of squared deviations from each group mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        group_mean = np.append(total / count, np.nan)[codes]
+        m2 = group_sum((values - group_mean)**2, codes, ngroups)
+        stdev = np.sqrt(m2 / np.where(count > 1, count - 1, np.nan))
+
+    return mean_from_sums(total, count, stdev, confidence)
+
+
+
+def mean_from_sums(total, count, stdev, confidence = 0.95):
+    """Means with confidence intervals from sums, counts and standard deviations within groups."""
+
+    total, count, stdev = as_float(total), as_float(count), as_float(stdev)
+    value = total / count
+
+    levels = as_confidence(confidence)
+    student_t = np.array([np.abs(t_ppf((1 - c) / 2, count - 1)) * stdev / count**.5 for c in levels]).reshape(len(levels), len(value))
+
+    return {'sum': total, 'count': count, 'stdev': stdev, 'value': value,
+            'lower': value - student_t, 'upper': value + student_t}
+
+
+
+def quantile(values, codes = None, nquantiles = 10, invert = True):
+    """Assigns values to quantiles within groups, from their rank within the group.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to rank.
+    codes : numpy.ndarray
+        Integer group codes. Defaults to None, where all elements are one group.
+    nquantiles : int
+        Number of quantiles to separate each group into.
+    invert : bool
+        Whether the quantiles are inversely (True) or directly (False) related to the values.
+
+    Returns
+    -------
+    dict
+        'quantile', 'rank' (minimum rank of ties) and 'num_rows' (values in the group) arrays,
+        with one element per value; null for null values and values without a group.
+    """
+
+    values = as_float(values)
+    codes = np.zeros(len(values), dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+
+    valid = ~np.isnan(values) & (codes >= 0)
+    idx = np.flatnonzero(valid)
+    key = -values[idx] if invert else values[idx]
+    order = np.lexsort((key, codes[idx]))
+    sorted_codes, sorted_key = codes[idx][order], key[order]
+
+    # the first position of each group, and of each run of tied values, in the sorted values
+    position = np.arange(len(order))
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    new_run = new_group.copy()
+    new_run[1:] |= sorted_key[1:] != sorted_key[:-1]
+
+    group_start = np.maximum.accumulate(np.where(new_group, position, 0))
+    run_start = np.maximum.accumulate(np.where(new_run, position, 0))
+
+    rank = np.full(len(values), np.nan)
+    rank[idx[order]] = run_start - group_start + 1
+
+    ngroups = int(codes.max()) + 1 if len(codes) > 0 else 0
+    counts = np.bincount(codes[idx], minlength=ngroups)
+    num_rows = np.where(codes >= 0, np.append(counts, 0)[codes], np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        quantiles = np.where(num_rows < nquantiles, np.nan,
+                             np.floor((nquantiles + 1) - np.ceil(((num_rows + 1) - rank) / (num_rows / nquantiles))))
+
+    # rank 1 may occasionally become quantile 0, instead of quantile 1
+    quantiles[quantiles == 0] = 1
+
+    return {'quantile': quantiles, 'rank': rank, 'num_rows': num_rows}
+
+
+
+###### LIFE TABLES ############################################################
+
+
+def life_table(deaths, pops, start_ages, confidence = 0.95):
+    """Abridged life tables with Chiang II confidence intervals, for many groups at once.
+
+    Parameters
+    ----------
+    deaths, pops : numpy.ndarray
+        Deaths and populations as 2-D arrays of one row per group and one column per age band.
+    start_ages : numpy.ndarray
+        Ascending start age of each age band, beginning at 0. The last band is open ended.
+    confidence : float | list
+        Confidence level(s), or None.
+
+    Returns
+    -------
+    dict
+        'value' (life expectancy at the start of each age band) and 'se' (its standard error)
+        arrays of the same shape as deaths, and 'lower' and 'upper' arrays with one of these
+        per confidence level. Null for groups where a life table can't be built (e.g. with no
+        deaths in the last age band).
+
+    Notes
+    -----
+    Chiang's method (1), with the fraction of the last year lived by those dying in the first year of
+    life taken as 0.1 and half of the age band otherwise, and the variance of the final age band as
+    in Silcocks et al (2).
+
+    References
+    ----------
+    (1) Chiang CL. The Life Table and its Construction. In: Introduction to Stochastic Processes in
+        Biostatistics. New York: John Wiley & Sons; 1968. Pg 189 to 214.
+    (2) Silcocks PBS, Jenner DA, Reza R. Life expectancy as a summary of mortality in a population:
+        statistical considerations and suitability for use by health authorities.
+        J Epidemiol Community Health 2001; 55: 38-43.
+    """
+
+    deaths, pops = np.atleast_2d(as_float(deaths)), np.atleast_2d(as_float(pops))
+    start_ages = as_float(start_ages)
+
+    # width of each age band (the last is open ended), and the fraction of it lived by those dying in it
+    width = np.diff(start_ages)
+    fraction = np.where((start_ages[:-1] == 0) & (width == 1), 0.1, 0.5)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = deaths / pops
+
+        # probability of dying in each age band, and those alive at its start of 100,000 born
+        q = width * rate[:, :-1] / (1 + width * (1 - fraction) * rate[:, :-1])
+        q = np.concatenate([q, np.ones((len(q), 1))], axis=1)
+        alive = 100000 * np.cumprod(np.concatenate([np.ones((len(q), 1)), 1 - q[:, :-1]], axis=1), axis=1)
+        died = alive * q
+
+        # years lived in each age band, years lived beyond its start, and life expectancy
+        years = np.concatenate([width * (alive[:, 1:] + fraction * died[:, :-1]),
+                                alive[:, -1:] / rate[:, -1:]], axis=1)
+        remaining = np.cumsum(years[:, ::-1], axis=1)[:, ::-1]
+        value = remaining / alive
+
+        # Chiang's variance of the probability of dying, weighted by the years remaining at the start of each age band
+        var_q = np.where(deaths[:, :-1] == 0, 0, q[:, :-1] ** 2 * (1 - q[:, :-1]) / deaths[:, :-1])
+        weighted = np.concatenate([alive[:, :-1] ** 2 * ((1 - fraction) * width + value[:, 1:]) ** 2 * var_q,
+                                   alive[:, -1:] ** 2 / (deaths[:, -1:] * rate[:, -1:] ** 2)], axis=1)
+        se = np.sqrt(np.cumsum(weighted[:, ::-1], axis=1)[:, ::-1] / alive ** 2)
+
+    invalid = ~np.isfinite(value).all(axis=1) | ~np.isfinite(se).all(axis=1)
+    value[invalid], se[invalid] = np.nan, np.nan
+
+    levels = as_confidence(confidence)
+    z = norm_ppf(np.array([c + (1 - c) / 2 for c in levels])).reshape(-1, 1, 1)
+
+    return {'value': value, 'se': se, 'lower': value - z * se, 'upper': value + z * se}
+
+
+
+###### SLOPE INDEX OF INEQUALITY ##############################################
+
+
+def sii_weights(pops):
+    """Weights giving the intercept and slope of the population weighted regression of values on the
+    midpoint of each quantile's cumulative share of the population, the Slope Index of Inequality.
+
+    Parameters
+    ----------
+    pops : numpy.ndarray
+        Populations as a 2-D array of one row per group and one column per quantile, in order,
+        with zeros after the last quantile of groups with fewer quantiles.
+
+    Returns
+    -------
+    Tuple
+        Arrays of the same shape as pops, whose products with the values summed along each row
+        are the intercept (the fitted value at rank 0) and slope (the SII) of each group.
+    """
+
+    share = np.atleast_2d(as_float(pops))
+    share = share / share.sum(axis=1, keepdims=True)
+    midpoint = np.cumsum(share, axis=1) - share / 2
+
+    # the population weighted mean of the midpoints is 0.5, whatever the populations
+    centred = np.where(share > 0, midpoint - 0.5, 0)
+    slope = share * centred / (share * centred ** 2).sum(axis=1, keepdims=True)
+
+    return share - 0.5 * slope, slope
+
+
+
+def inverse_transform(values, transform = None):
+    """Returns values from the log (transform = 'log') or logit (transform = 'logit') scale, or unchanged."""
+
+    if transform == 'log':
+        return np.exp(values)
+
+    if transform == 'logit':
+        return 1 / (1 + np.exp(-values))
+
+    return values
+
+
+
+def sii_simulation(values, se, intercept_weights, slope_weights, repetitions, seed, transform = None):
+    """Simulated SIIs and RIIs of each group, from values drawn from normal distributions around the
+    values with their standard errors, all drawn together as a (groups x repetitions x quantiles) array.
+
+    Parameters
+    ----------
+    values, se : numpy.ndarray
+        Values (on the log or logit scale if transformed) and their standard errors, as 2-D arrays
+        of one row per group and one column per quantile.
+    intercept_weights, slope_weights : numpy.ndarray
+        Weights from `sii_weights`.
+    repetitions : int
+        Number of simulations.
+    seed : numpy.random.SeedSequence
+        Seed of the simulations.
+    transform : str
+        'log' or 'logit' if values have been transformed. Defaults to None.
+
+    Returns
+    -------
+    Tuple
+        Simulated SIIs and RIIs, each as a (groups x repetitions) array.
+    """
+
+    draws = np.random.default_rng(seed).standard_normal((len(values), repetitions, values.shape[1]))
+    draws = values[:, None, :] + se[:, None, :] * draws
+
+    intercept = np.einsum('grq,gq->gr', draws, intercept_weights)
+    slope = np.einsum('grq,gq->gr', draws, slope_weights)
+
+    bottom, top = inverse_transform(intercept, transform), inverse_transform(intercept + slope, transform)
+
+    return top - bottom, top / bottom
+
+
+
+###### FUNNELS ################################################################
+
+
+def funnel_proportion_limit(population, average, p, side, multiplier = 1):
+    """Vectorised proportion funnel plot limits for populations around an average proportion,
+    as `sigma_adjustment`.
+
+    Parameters
+    ----------
+    population : numpy.ndarray
+        Populations to calculate the limits at.
+    average : float
+        Average proportion of all areas in the funnel plot.
+    p : float
+        Probability of the limit (normally 0.975 or 0.999).
+    side : str
+        'low' or 'high'.
+    multiplier : int
+        Multiplier used to express the limits.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+
+    population = as_float(population)
+    z = norm_ppf(p)
+
+    first_part = average * (population / z**2 + 1)
+    adj = np.sqrt((-8 * average * (population / z**2 + 1))**2 - 64 * (1 / z**2 + 1 / population) * average *
+                  (population * (average * (population / z**2 + 2) - 1) + z**2 * (average - 1)))
+    last_part = (1 / z**2 + 1 / population)
+
+    limit = (first_part - adj / 8) / last_part if side == 'low' else (first_part + adj / 8) / last_part
+
+    return (limit / population) * multiplier
+
+
+
+def funnel_ratio_limit(obs, expected, p, side):
+    """Vectorised ratio funnel plot test statistics for observed and expected events, as
+    `funnel_ratio_significance`.
+
+    Parameters
+    ----------
+    obs, expected : numpy.ndarray
+        Observed and expected events.
+    p : float
+        Probability of the limit (e.g. 0.95 or 0.998).
+    side : str
+        'low' or 'high'.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+
+    obs, expected = as_float(obs), as_float(expected)
+    z = norm_ppf(0.5 + p / 2)
+    obs_adjusted = obs if side == 'low' else obs + 1
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = 1 - 1 / (9 * obs_adjusted)
+        y = 3 * np.sqrt(obs_adjusted)
+
+        if side == 'low':
+            small = chi2_ppf(1 - (0.5 + p / 2), 2 * obs) / 2
+            large = obs_adjusted * (x - z / y)**3
+        else:
+            small = chi2_ppf(0.5 + p / 2, 2 * obs + 2) / 2
+            large = obs_adjusted * (x + z / y)**3
+
+    statistic = np.where(obs < 10, small, large)
+    statistic = np.where((obs_adjusted == 0) | ((obs == 0) & (side == 'low')), 0, statistic)
+
+    return statistic / expected
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+from .frames import named_columns
+from .instrumentation import instrumented, stage
+
+
+# statistics which sum the record batches of a dataset one at a time; the data of other
+# statistics is read into a single (filtered) table
+STREAMED = ['ph_rate', 'ph_proportion', 'ph_dsr', 'ph_ISRate']
+
+
+@instrumented
+def ph_from_dataset(source, func, *args, filters = None, columns = None, output = None, partition_cols = None,
+                    batch_size = 131072, **kwargs):
+    """Calculates a statistic from a Parquet dataset (e.g. record-level data partitioned by year
+    and indicator), reading only the columns and partitions it needs.
+
+    The dataset is scanned with pyarrow, with the filters and columns pushed down so partitions
+    and row groups which can't match are skipped. For `ph_rate`, `ph_proportion`, `ph_dsr` and
+    `ph_ISRate` the record batches are summed within groups one at a time, so the dataset is
+    never held in memory; other statistics are given the filtered columns as one table (an Arrow
+    table for statistics taking Arrow data, otherwise a Pandas DataFrame).
+
+    Parameters
+    ----------
+    source
+        Path (or list of paths) of the Parquet dataset, or a pyarrow Dataset.
+    func
+        Statistic to calculate, e.g. `ph_rate`, `ph_proportion`, `ph_dsr`, `ph_ISRate`, `ph_ISRatio`
+        or `ph_quantile`.
+    *args
+        Arguments to call the statistic with after the data, e.g. the numerator and denominator columns.
+    filters
+        Rows to read, as a pyarrow compute Expression or in the list of tuples form of
+        `pyarrow.parquet.filters_to_expression` (e.g. [('year', '>=', 2020), ('indicator', '=', 'A')]).
+        Defaults to None, where every row is read.
+    columns : list
+        Columns of the dataset to read. Defaults to None, where the columns named in the arguments
+        of the statistic (e.g. num_col, denom_col and group_cols) are read.
+    output : str
+        Path to write the results to as a Parquet dataset. Defaults to None, where nothing is written.
+    partition_cols : list
+        Column name(s) of the results to partition the output by (e.g. ['year']). Defaults to None.
+    batch_size : int
+        Maximum number of rows in each record batch read. Defaults to 131072.
+    **kwargs
+        Keyword arguments to call the statistic with (e.g. group_cols and confidence).
+
+    Returns
+    -------
+    Pandas DataFrame
+        The result of the statistic.
+
+    Notes
+    -----
+    Hive-partitioned datasets (e.g. 'year=2020/indicator=A/part-0.parquet') are read with the
+    partition keys as columns, which can be used as group columns and in filters.
+
+    Examples
+    --------
+      >>> ph_from_dataset('data/deaths', ph_rate, 'deaths', 'pop', group_cols = ['year', 'area'],
+                          filters = [('year', '>=', 2020)])
+      >>> ph_from_dataset('data/deaths', ph_dsr, 'deaths', 'pop', 'ageband', group_cols = ['year', 'area'],
+                          output = 'results/dsr', partition_cols = ['year'])
+
+    """
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    dataset = open_dataset(source)
+    columns = dataset_columns(dataset, args, kwargs) if columns is None else columns
+
+    if filters is not None and not isinstance(filters, pc.Expression):
+        filters = pq.filters_to_expression(filters)
+
+    if not isinstance(batch_size, int) or batch_size <= 0:
+        raise ValueError("'batch_size' must be a positive integer")
+
+    scanner = dataset.scanner(columns = columns, filter = filters, batch_size = batch_size)
+
+    if func.__name__ in STREAMED:
+        result = func(scanner.to_batches(), *args, **kwargs)
+    else:
+        with stage('read_dataset') as read:
+            table = scanner.to_table()
+            read.rows = table.num_rows
+
+            if not getattr(func, 'native_frames', False):
+                table = table.to_pandas()
+
+        result = func(table, *args, **kwargs)
+
+    if isinstance(result, pa.Table):
+        result = result.to_pandas()
+
+    if output is not None:
+        with stage('write_dataset', rows = len(result)):
+            pq.write_to_dataset(pa.Table.from_pandas(result, preserve_index = False), output,
+                                partition_cols = partition_cols)
+
+    return result
+
+
+
+def open_dataset(source):
+    """Opens a Parquet dataset, with hive partitioning.
+
+    Args:
+        source: Path or list of paths of the dataset, or a pyarrow Dataset which is returned as it is.
+
+    Returns:
+        pyarrow Dataset.
+    """
+
+    import pyarrow.dataset as ds
+
+    if isinstance(source, ds.Dataset):
+        return source
+
+    return ds.dataset(source, format = 'parquet', partitioning = 'hive')
+
+
+
+def dataset_columns(dataset, args, kwargs):
+    """Columns of a dataset named in the arguments of a statistic.
+
+    Args:
+        dataset: pyarrow Dataset.
+        args (tuple), kwargs (dict): Arguments the statistic is called with, after the data.
+
+    Returns:
+        List of column names, in the order of the dataset.
+    """
+
+    columns = named_columns(dataset.schema.names, list(args) + list(kwargs.values()))
+
+    if len(columns) == 0:
+        raise ValueError('None of the arguments of the statistic name a column of the dataset')
+
+    return columns
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import warnings
+import numpy as np
+
+from . import core
+from .validation import format_args, check_arguments, col_values
+from .grouping import Grouping
+from .proportions import ph_proportion
+from .instrumentation import instrumented, stage
+
+
+@instrumented
+def ph_proportion_by_quantile(df, num_col, denom_col, quantile_col, group_cols = None, score_col = None,
+                              quantile_group_cols = None, nquantiles = 10, invert = True, metadata = True,
+                              confidence = 0.95, multiplier = 1, workers = None):
+    """Calculates proportions with confidence limits using the Wilson Score method for each quantile
+    (e.g. deprivation decile) of many indicators, periods and areas at once.
+
+    Rows can be assigned to quantiles from a score (e.g. the IMD score of each small area), as by
+    `ph_quantile`, before numerators and denominators are summed within each group and quantile,
+    so a long table of every indicator and period is calculated in one grouped pass rather than
+    with a call of `ph_proportion` for each.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data to calculate proportions for, e.g. one row per small area
+        for each indicator and period.
+    num_col : str
+        Name of column containing observed number of cases in the sample
+        (the numerator of the population).
+    denom_col : str
+        Name of column containing number of cases in sample
+        (the denominator of the population).
+    quantile_col : str
+        Name of column containing the quantile of each row, or of the column to assign
+        quantiles to if score_col is given.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by (e.g. indicator, period and area),
+        with a proportion for each quantile of each group. Defaults to None.
+    score_col : str
+        Name of column containing the numeric values to rank rows by and assign quantiles from.
+        Defaults to None, where quantile_col already holds the quantiles.
+    quantile_group_cols : str | list
+        A string or list of column name(s) to assign separate sets of quantiles within
+        (e.g. indicator and period). Defaults to None.
+    nquantiles : int
+        The number of quantiles to separate each set of rows into, if score_col is given.
+    invert : bool
+        Whether the quantiles should be directly (False) or inversely (True) related
+        to the score, if score_col is given.
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+    confidence : float
+        Confidence interval(s) to use, either as a float, list of float values or None.
+        Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
+    multiplier : int
+        Multiplier used to express the final values (e.g. 100 = percentage).
+    workers : int
+        Number of worker processes to sum the data within groups. Defaults to None (no parallelism).
+
+    Returns
+    -------
+    Pandas DataFrame
+        DataFrame of calculated proportion statistics with confidence intervals, with one row
+        for each quantile of each group. Rows without a quantile are left out.
+
+    Notes
+    -----
+    Quantiles are assigned as in `ph_quantile`, and proportions are calculated as in `ph_proportion`.
+
+    Examples
+    --------
+      >>> ph_proportion_by_quantile(df, 'Count', 'Measured', 'Decile', ['Period', 'SchoolYear', 'AreaCode'],
+                                    multiplier = 100)
+      >>> ph_proportion_by_quantile(df, 'obese', 'measured', 'decile', ['indicator', 'period'],
+                                    score_col = 'imd_score', quantile_group_cols = ['indicator', 'period'])
+
+    """
+
+    null, group_cols = format_args(None, group_cols)
+    null, quantile_group_cols = format_args(None, quantile_group_cols)
+
+    if not isinstance(quantile_col, str):
+        raise TypeError('Column names must be a quoted string')
+
+    if group_cols is not None and quantile_col in group_cols:
+        raise ValueError(f"'{quantile_col}' must not be one of the group_cols")
+
+    if score_col is not None:
+        df = assign_quantiles(df, score_col, quantile_col, quantile_group_cols, nquantiles, invert)
+
+    return ph_proportion(df, num_col, denom_col, ([] if group_cols is None else group_cols) + [quantile_col],
+                         metadata, confidence, multiplier, workers)
+
+
+
+def assign_quantiles(df, score_col, quantile_col, quantile_group_cols, nquantiles, invert):
+    """Assigns rows to quantiles from their rank within their group, as in `ph_quantile`.
+
+    Args:
+        df: Pandas DataFrame.
+        score_col (str), quantile_col (str), quantile_group_cols (list), nquantiles (int), invert (bool):
+            as in `ph_proportion_by_quantile`.
+
+    Returns:
+        Shallow copy of the Pandas DataFrame with the quantile column added.
+    """
+
+    if not isinstance(nquantiles, int) or nquantiles < 2:
+        raise ValueError("'nquantiles' must be an integer of at least 2")
+
+    if not isinstance(invert, bool):
+        raise TypeError("Pass 'invert' as a boolean")
+
+    check_arguments(df, [score_col] if quantile_group_cols is None else [score_col] + quantile_group_cols)
+
+    if quantile_col in df.columns:
+        raise ValueError(f"'{quantile_col}' is already a column, and can't be assigned from '{score_col}'")
+
+    codes = None if quantile_group_cols is None else Grouping(df, quantile_group_cols).codes
+
+    with stage('quantiles', rows = len(df)):
+        result = core.quantile(col_values(df, score_col), codes, nquantiles, invert)
+
+    if np.isnan(result['quantile']).any():
+        warnings.warn("One or more groups had too few small areas with values to allow quantiles to be assigned",
+                      UserWarning)
+
+    return df.assign(**{quantile_col: result['quantile']})
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import functools
+import pandas as pd
+
+from .validation import format_args, _private_frame
+from .instrumentation import stage
+
+
+def frame_kind(df):
+    """Which kind of columnar frame data is, without importing pyarrow or polars.
+
+    Args:
+        df: Data passed to a statistic.
+
+    Returns:
+        'arrow' for a pyarrow Table or RecordBatch, 'polars' for a Polars DataFrame, or None otherwise.
+    """
+
+    module = type(df).__module__.split('.')[0]
+
+    if module == 'pyarrow' and hasattr(df, 'schema') and hasattr(df, 'column'):
+        return 'arrow'
+
+    if module == 'polars' and hasattr(df, 'to_arrow') and hasattr(df, 'columns'):
+        return 'polars'
+
+    return None
+
+
+
+def arrow_values(column, encode = False):
+    """Converts an Arrow column to values for a Pandas DataFrame, without copying where possible.
+
+    Args:
+        column: pyarrow Array or ChunkedArray.
+        encode (bool): Whether strings are dictionary-encoded (as group keys are).
+
+    Returns:
+        NumPy array, Pandas Categorical or Pandas Series.
+    """
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if isinstance(column, pa.ChunkedArray):
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+    if getattr(pa.types, 'is_string_view', lambda t: False)(column.type):
+        column = column.cast(pa.large_string())
+
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        # the Arrow buffer is used as it is unless nulls must be converted to NaN
+        return column.to_numpy(zero_copy_only = column.null_count == 0)
+
+    if encode and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        column = column.dictionary_encode()
+
+    if pa.types.is_dictionary(column.type):
+        codes = pc.fill_null(column.indices, -1).to_numpy(zero_copy_only = False)
+        categories = column.dictionary.to_pandas()
+
+        # categories in sorted order, so groups are in the same order as for the keys themselves
+        return pd.Categorical.from_codes(codes, categories).reorder_categories(categories.sort_values())
+
+    return column.to_pandas()
+
+
+
+def named_columns(names, values):
+    """Column names among the arguments of a statistic, e.g. its num_col, denom_col and group_cols.
+
+    Args:
+        names (list): Column names of the data.
+        values: Values of the arguments, where lists and dicts (e.g. of keyword arguments) are searched too.
+
+    Returns:
+        List of the column names named in the arguments, in the order of names.
+    """
+
+    named = set()
+
+    def search(value):
+        if isinstance(value, str):
+            named.add(value)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                search(v)
+        elif isinstance(value, dict):
+            for v in value.values():
+                search(v)
+
+    search(list(values))
+
+    return [name for name in names if name in named]
+
+
+
+def to_pandas(df, group_cols = None, columns = None):
+    """Converts a pyarrow Table or Polars DataFrame to a Pandas DataFrame for the statistics.
+
+    Numeric columns share the Arrow buffers where they have no nulls, and group keys which are
+    strings are dictionary-encoded as Pandas Categoricals rather than converted to Python strings.
+
+    Args:
+        df: pyarrow Table or RecordBatch, or Polars DataFrame.
+        group_cols (list): Column name(s) the data is grouped by, or None.
+        columns (list): Column name(s) to convert, or None to convert every column.
+
+    Returns:
+        Pandas DataFrame.
+    """
+
+    if frame_kind(df) == 'polars':
+        # numeric columns of Polars frames are exported to Arrow without copying
+        df = df.to_arrow()
+
+    group_cols = [] if group_cols is None else group_cols
+    columns = df.schema.names if columns is None else columns
+
+    return pd.DataFrame({name: arrow_values(df.column(name), name in group_cols) for name in columns}, copy = False)
+
+
+
+def from_pandas(result, kind, schema):
+    """Converts the result of a statistic back to the kind of frame the data was given as.
+
+    Args:
+        result: Pandas DataFrame of results.
+        kind (str): 'arrow' or 'polars', as returned by `frame_kind`.
+        schema: pyarrow Schema of the data, to restore the types of the group keys.
+
+    Returns:
+        pyarrow Table or Polars DataFrame.
+    """
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(result, preserve_index = False).replace_schema_metadata()
+
+    # group keys dictionary-encoded on the way in are returned with the types they were given as
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type) and field.name in schema.names:
+            original = schema.field(field.name).type
+
+            if not pa.types.is_dictionary(original):
+                if getattr(pa.types, 'is_string_view', lambda t: False)(original):
+                    original = pa.large_string()
+
+                table = table.set_column(i, field.name, table.column(i).cast(original))
+
+    if kind == 'polars':
+        import polars as pl
+        return pl.from_arrow(table)
+
+    return table
+
+
+
+def native_frames(func):
+    """Decorates a statistic so its data can be given as a pyarrow Table or Polars DataFrame,
+    returning its results as the same kind of frame. Pandas DataFrames are passed through as they are.
+    """
+
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        kind = frame_kind(bound.arguments.get('df'))
+
+        if kind is None:
+            return func(*args, **kwargs)
+
+        null, group_cols = format_args(None, bound.arguments.get('group_cols'))
+
+        with stage('from_frame', rows = len(bound.arguments['df'])) as convert:
+            table = bound.arguments['df'].to_arrow() if kind == 'polars' else bound.arguments['df']
+
+            # only the columns named in the arguments are converted, and the converted frame isn't copied again
+            columns = named_columns(table.schema.names, [value for key, value in bound.arguments.items() if key != 'df'])
+            bound.arguments['df'] = convert.frame = to_pandas(table, group_cols, columns)
+
+        token = _private_frame.set(bound.arguments['df'])
+
+        try:
+            result = func(*bound.args, **bound.kwargs)
+        finally:
+            _private_frame.reset(token)
+
+        if not isinstance(result, pd.DataFrame):
+            return result
+
+        with stage('to_frame', rows = len(result)):
+            return from_pandas(result, kind, table.schema)
+
+    # marks statistics which take Arrow and Polars frames, kept by decorators using functools.wraps
+    wrapper.native_frames = True
+
+    return wrapper
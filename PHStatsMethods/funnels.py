@@ -4,10 +4,13 @@ import pandas as pd
 import numpy as np
 from math import floor, ceil
 
-from .validation import metadata_cols, validate_data
-from .utils_funnel import signif_floor, signif_ceiling, sigma_adjustment, poisson_funnel, funnel_ratio_significance
+from . import core
+from .validation import metadata_cols, validate_data, col_values
+from .utils_funnel import signif_floor, signif_ceiling, poisson_funnel
+from .instrumentation import instrumented
 
 
+@instrumented
 def calculate_funnel_limits(df, num_col, statistic, multiplier, denom_col = None, metadata = True, 
                             rate = None, rate_type = None, ratio_type = None, years_of_data = None):
     """Calculates control limits adopting a consistent method as per the Fingertips Technical Guidance
@@ -122,11 +125,14 @@ def calculate_funnel_limits(df, num_col, statistic, multiplier, denom_col = None
     
     # there doesnt seem any advantage doing the grouping then ungrouping in the R?
     if statistic == 'proportion':
-        t['lower_2s_limit'] = t[col].apply(lambda x: max([0, sigma_adjustment(0.975, x, av, 'low', multiplier)]))
-        t['upper_2s_limit'] = t[col].apply(lambda x: min([100, sigma_adjustment(0.975, x, av, 'high', multiplier)]))
+        population = col_values(t, col)
         
-        t['lower_3s_limit'] = t[col].apply(lambda x: max([0, sigma_adjustment(0.999, x, av, 'low', multiplier)]))
-        t['upper_3s_limit'] = t[col].apply(lambda x: min([100, sigma_adjustment(0.999, x, av, 'high', multiplier)]))
+        # fmax and fmin ignore nulls, as max and min of a list do
+        t['lower_2s_limit'] = np.fmax(0, core.funnel_proportion_limit(population, av, 0.975, 'low', multiplier))
+        t['upper_2s_limit'] = np.fmin(100, core.funnel_proportion_limit(population, av, 0.975, 'high', multiplier))
+        
+        t['lower_3s_limit'] = np.fmax(0, core.funnel_proportion_limit(population, av, 0.999, 'low', multiplier))
+        t['upper_3s_limit'] = np.fmin(100, core.funnel_proportion_limit(population, av, 0.999, 'high', multiplier))
         
         t['baseline'] = av * multiplier
     
@@ -179,6 +185,7 @@ def calculate_funnel_limits(df, num_col, statistic, multiplier, denom_col = None
         
 
 
+@instrumented
 def assign_funnel_significance(df, num_col, statistic, denom_col = None, rate = None, rate_type = None, multiplier = None):
     """Identifies whether each value in a dataset falls outside of 95 and/or 99.8 percent control limits based on the 
     aggregated average value across the whole dataset as an indicator of statistically significant difference.
@@ -249,17 +256,21 @@ def assign_funnel_significance(df, num_col, statistic, denom_col = None, rate =
             
         av = df[num_col].sum() / df[denom_col].sum() # don't need skipna here as validation ensures no nulls
         
-        df['significance'] = np.where(df[num_col] / df[denom_col] < df[denom_col].apply(lambda x: sigma_adjustment(0.999, x, av, 'low', 1)), 'Low (0.001)',
-                             np.where(df[num_col] / df[denom_col] < df[denom_col].apply(lambda x: sigma_adjustment(0.975, x, av, 'low', 1)), 'Low (0.025)',
-                             np.where(df[num_col] / df[denom_col] > df[denom_col].apply(lambda x: sigma_adjustment(0.999, x, av, 'high', 1)), 'High (0.001)',
-                             np.where(df[num_col] / df[denom_col] > df[denom_col].apply(lambda x: sigma_adjustment(0.975, x, av, 'high', 1)), 'High (0.025)',
+        prop, denom = df[num_col] / df[denom_col], col_values(df, denom_col)
+        
+        df['significance'] = np.where(prop < core.funnel_proportion_limit(denom, av, 0.999, 'low'), 'Low (0.001)',
+                             np.where(prop < core.funnel_proportion_limit(denom, av, 0.975, 'low'), 'Low (0.025)',
+                             np.where(prop > core.funnel_proportion_limit(denom, av, 0.999, 'high'), 'High (0.001)',
+                             np.where(prop > core.funnel_proportion_limit(denom, av, 0.975, 'high'), 'High (0.025)',
                                       'Not significant'))))
     
     elif statistic == 'ratio':
-        df['significance'] = np.where(1 < df.apply(lambda x: funnel_ratio_significance(x[num_col], x[denom_col], 0.998, 'low'), axis=1), 'High (0.001)',
-                             np.where(1 < df.apply(lambda x: funnel_ratio_significance(x[num_col], x[denom_col], 0.95, 'low'), axis=1), 'High (0.025)',
-                             np.where(1 > df.apply(lambda x: funnel_ratio_significance(x[num_col], x[denom_col], 0.998, 'high'), axis=1), 'Low (0.001)',
-                             np.where(1 > df.apply(lambda x: funnel_ratio_significance(x[num_col], x[denom_col], 0.95, 'high'), axis=1), 'Low (0.025)',
+        obs, expected = col_values(df, num_col), col_values(df, denom_col)
+        
+        df['significance'] = np.where(1 < core.funnel_ratio_limit(obs, expected, 0.998, 'low'), 'High (0.001)',
+                             np.where(1 < core.funnel_ratio_limit(obs, expected, 0.95, 'low'), 'High (0.025)',
+                             np.where(1 > core.funnel_ratio_limit(obs, expected, 0.998, 'high'), 'Low (0.001)',
+                             np.where(1 > core.funnel_ratio_limit(obs, expected, 0.95, 'high'), 'Low (0.025)',
                                       'Not significant'))))
         
     elif statistic == 'rate':
@@ -273,10 +284,12 @@ def assign_funnel_significance(df, num_col, statistic, denom_col = None, rate =
             
         weighted_av = df[num_col].sum() / df['denom_derived'].sum() # this already ignores nulls
         
-        df['significance'] = np.where(weighted_av < df.apply(lambda x: funnel_ratio_significance(x[num_col], x['denom_derived'], 0.998, 'low'), axis=1), 'High (0.001)',
-                             np.where(weighted_av < df.apply(lambda x: funnel_ratio_significance(x[num_col], x['denom_derived'], 0.95, 'low'), axis=1), 'High (0.025)',
-                             np.where(weighted_av > df.apply(lambda x: funnel_ratio_significance(x[num_col], x['denom_derived'], 0.998, 'high'), axis=1), 'Low (0.001)',
-                             np.where(weighted_av > df.apply(lambda x: funnel_ratio_significance(x[num_col], x['denom_derived'], 0.95, 'high'), axis=1), 'Low (0.025)',
+        obs, denom = col_values(df, num_col), col_values(df, 'denom_derived')
+        
+        df['significance'] = np.where(weighted_av < core.funnel_ratio_limit(obs, denom, 0.998, 'low'), 'High (0.001)',
+                             np.where(weighted_av < core.funnel_ratio_limit(obs, denom, 0.95, 'low'), 'High (0.025)',
+                             np.where(weighted_av > core.funnel_ratio_limit(obs, denom, 0.998, 'high'), 'Low (0.001)',
+                             np.where(weighted_av > core.funnel_ratio_limit(obs, denom, 0.95, 'high'), 'Low (0.025)',
                                       'Not significant'))))
         df = df.drop('denom_derived', axis=1)
         
@@ -287,6 +300,7 @@ def assign_funnel_significance(df, num_col, statistic, denom_col = None, rate =
         
 
 
+@instrumented
 def calculate_funnel_points(df, num_col, rate, rate_type, denom_col = None,
                             multiplier = 100000, years_of_data = 1):
     """For rate-based funnels: Derive rate and annual population values for charting based. Process removes rates where the 
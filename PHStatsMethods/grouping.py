@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from .validation import format_args, check_arguments
+from .parallel import shared_group_sums
+
+
+class Grouping:
+    """Group keys of a DataFrame factorised once into integer codes, which can be passed to the
+    `grouping` argument of each statistic calculated on that data with the same `group_cols`.
+    Grouping, summing and checking the number of rows per group then use the integer codes rather
+    than hashing the group columns again in every call.
+
+    The rows must stay in the same order between preparing the grouping and using it.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data to group.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by.
+
+    Attributes
+    ----------
+    codes : numpy.ndarray
+        Integer group code for each row, in the sorted order of the group keys, or -1 where a
+        group key is null (these rows are left out of the groups, as in `pandas.groupby`).
+    keys : Pandas DataFrame
+        The sorted group keys, one row per group.
+    counts : numpy.ndarray
+        Number of rows in each group.
+
+    Examples
+    --------
+      >>> grouping = Grouping(df, ['area', 'year'])
+      >>> rates = ph_rate(df, 'numerator', 'denominator', ['area', 'year'], grouping = grouping)
+      >>> props = ph_proportion(df, 'numerator', 'denominator', ['area', 'year'], grouping = grouping)
+
+    """
+
+    def __init__(self, df, group_cols):
+        null, group_cols = format_args(None, group_cols)
+
+        if group_cols is None:
+            raise TypeError('group_cols cannot be None for a Grouping')
+
+        check_arguments(df, group_cols)
+
+        grouped = df.groupby(group_cols, observed=True, sort=True)
+        size = grouped.size()
+
+        self.group_cols = group_cols
+        self.codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        self.keys = size.index.to_frame(index=False)
+        self.counts = size.to_numpy()
+        self.n_rows = len(df)
+
+    @property
+    def ngroups(self):
+        return len(self.keys)
+
+    @property
+    def grouper(self):
+        """Group codes which can be passed to `pandas.groupby` in place of the group columns."""
+
+        if (self.codes < 0).any():
+            return np.where(self.codes < 0, np.nan, self.codes)
+
+        return self.codes
+
+    def sums(self, df, sum_cols, skipna_cols = None, workers = None):
+        """Sums columns within each group from the integer group codes, as returned by `group_sums`.
+
+        Args:
+            df: Pandas DataFrame, in the same row order as the data the grouping was prepared for.
+            sum_cols (list): List of column name(s) to sum within each group.
+            skipna_cols (list): Column name(s) in sum_cols where nulls are treated as zero.
+            workers (int): Number of worker processes, or None to sum in this process.
+
+        Returns:
+            Pandas DataFrame of the group keys and the summed sum_cols, one row per group.
+        """
+
+        skipna_cols = [] if skipna_cols is None else skipna_cols
+        values = [df[col].to_numpy() for col in sum_cols]
+
+        if workers is not None and workers > 1:
+            sums, nulls = shared_group_sums(self.codes, values, self.ngroups, workers)
+        else:
+            keep = self.codes >= 0
+            codes = self.codes if keep.all() else self.codes[keep]
+            sums = np.zeros((len(values), self.ngroups))
+            nulls = np.zeros((len(values), self.ngroups))
+
+            for i, v in enumerate(values):
+                v = v.astype(float, copy=False) if keep.all() else v[keep].astype(float, copy=False)
+                missing = np.isnan(v)
+                sums[i] = np.bincount(codes, weights=np.where(missing, 0, v), minlength=self.ngroups)
+                nulls[i] = np.bincount(codes, weights=missing, minlength=self.ngroups)
+
+        df_sums = self.keys.copy()
+
+        for i, col in enumerate(sum_cols):
+            col_sums = sums[i]
+
+            if col not in skipna_cols:
+                col_sums = np.where(nulls[i] > 0, np.nan, col_sums)
+
+            # keep integer columns as integers, as the pandas sum does
+            if pd.api.types.is_integer_dtype(df[col]):
+                col_sums = col_sums.astype(df[col].dtype)
+
+            df_sums[col] = col_sums
+
+        return df_sums
+
+
+
+def check_grouping(grouping, df, group_cols):
+    """Checks a Grouping was prepared for data with the same number of rows and group columns.
+
+    Args:
+        grouping: Grouping passed to a statistic.
+        df: Pandas DataFrame the grouping is used with.
+        group_cols (list): List of column name(s) to group the data by, or None.
+    """
+
+    if not isinstance(grouping, Grouping):
+        raise TypeError("'grouping' must be a Grouping object")
+
+    if group_cols != grouping.group_cols:
+        raise ValueError("'grouping' was prepared with different group_cols")
+
+    if len(df) != grouping.n_rows:
+        raise ValueError("'grouping' was prepared for data with a different number of rows")
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from .streaming import pack_frames, unpack_frames
+from .grouping import Grouping
+from .instrumentation import stage
+
+
+def signature(func, args):
+    """Hashes a results function and its arguments, with DataFrames hashed by their contents.
+
+    Args:
+        func: Function calculating the statistic from summed data.
+        args (tuple): Arguments passed to func after the summed data.
+
+    Returns:
+        str
+    """
+
+    sha = hashlib.sha1(func.__qualname__.encode())
+
+    for arg in args:
+        if isinstance(arg, dict):
+            sha.update(signature(func, sorted(arg.items(), key=lambda item: item[0])).encode())
+        elif isinstance(arg, tuple):
+            sha.update(signature(func, arg).encode())
+        elif isinstance(arg, pd.DataFrame):
+            sha.update(repr(list(arg.columns)).encode())
+            sha.update(hash_pandas_object(arg, index=False).to_numpy().tobytes())
+        else:
+            sha.update(repr(arg).encode())
+
+    return sha.hexdigest()
+
+
+
+class Incremental:
+    """Holds the result of a previous run of a statistic, alongside a content hash of each group's
+    inputs, so that a later run only validates, sums and recalculates the groups whose inputs have
+    changed and splices them into the previous result.
+
+    Pass the same object to the `incremental` argument of `ph_proportion`, `ph_rate`, `ph_dsr`,
+    `ph_ISRate`, `ph_ISRatio` or `ph_mean` on each run. The raw rows of each group are hashed before
+    the data is validated and summed, so a run scales with the number of changed groups rather than
+    the size of the data. Data given in chunks is summed first, and the sums of each group are hashed.
+    The first run calculates every group. If the statistic or any of its arguments change, every
+    group is recalculated again.
+
+    Attributes
+    ----------
+    recalculated : int
+        Number of groups recalculated by the last run.
+    reused : int
+        Number of groups taken from the previous result by the last run.
+
+    Examples
+    --------
+      >>> refresh = Incremental()
+      >>> ph_rate(df_january, 'numerator', 'denominator', 'area', incremental = refresh)
+      >>> ph_rate(df_february, 'numerator', 'denominator', 'area', incremental = refresh)
+      >>> refresh.recalculated
+      212
+
+    """
+
+    def __init__(self):
+        self.signature = None
+        self.keys = np.array([], dtype=np.uint64)
+        self.hashes = np.array([], dtype=np.uint64)
+        self.result = None
+        self.recalculated = 0
+        self.reused = 0
+        self.selected = None
+
+    def select(self, df, group_cols, single_grp, grouping, func, *args):
+        """Hashes the raw rows of each group and keeps only the rows of groups which have changed
+        since the previous run, to be validated and summed before they are passed to `apply`.
+
+        Args:
+            df: Pandas DataFrame of the data, before it is validated or summed.
+            group_cols (list): List of column name(s) to group the data by, or None.
+            single_grp (bool): As in `group_args`, whether ungrouped data forms a single group (True)
+                or each row is its own group (False).
+            grouping (Grouping): Group codes already factorised from group_cols, or None.
+            func: Function calculating the statistic from summed data, one row per group.
+            *args: Arguments passed to func after the summed data, or the arguments it is calculated from.
+
+        Returns:
+            The rows of the changed groups, and the grouping if every row is kept (otherwise None).
+        """
+
+        sig = signature(func, ('rows',) + args)
+
+        if group_cols is None:
+            codes = np.zeros(len(df), dtype=np.int64) if single_grp else np.arange(len(df))
+            keys = np.arange(codes.max(initial=-1) + 1, dtype=np.uint64)
+        else:
+            grouping = Grouping(df, group_cols) if grouping is None else grouping
+            codes = grouping.codes
+            keys = hash_pandas_object(grouping.keys, index=False).to_numpy()
+
+        # the hash of a group is the sum of the hashes of its rows, which overflows harmlessly
+        grouped = codes >= 0
+        hashes = np.zeros(len(keys), dtype=np.uint64)
+        np.add.at(hashes, codes[grouped], hash_pandas_object(df, index=False).to_numpy()[grouped])
+
+        previous = np.full(len(keys), -1) if sig != self.signature else pd.Index(self.keys).get_indexer(keys)
+        changed = previous == -1
+        changed[~changed] = self.hashes[previous[~changed]] != hashes[~changed]
+
+        self.selected = sig, keys, hashes, previous, changed
+
+        if changed.all():
+            return df, grouping
+
+        # rows with a null group key are in no group, but are still validated
+        return df[~grouped | changed[np.where(grouped, codes, 0)]], None
+
+    def apply(self, group_cols, func, df, *args):
+        """Calculates the statistic for groups which have changed since the previous run.
+
+        Args:
+            group_cols (list): List of column name(s) the data is grouped by.
+            func: Function calculating the statistic from summed data, one row per group.
+            df: Pandas DataFrame of summed data, one row per group, only for the changed groups
+                if the rows were chosen by `select`.
+            *args: Arguments passed to func after the summed data.
+
+        Returns:
+            Pandas DataFrame as returned by func for all of the data.
+        """
+
+        if self.selected is not None:
+            sig, keys, hashes, previous, changed = self.selected
+            self.selected = None
+
+            if len(df) != changed.sum():
+                raise ValueError('The summed data does not have one row per changed group')
+        else:
+            sig = signature(func, args)
+            keys = hash_pandas_object(df[group_cols], index=False).to_numpy()
+            hashes = hash_pandas_object(df, index=False).to_numpy()
+
+            if sig != self.signature:
+                previous = np.full(len(df), -1)
+            else:
+                previous = pd.Index(self.keys).get_indexer(keys)
+
+            changed = previous == -1
+            changed[~changed] = self.hashes[previous[~changed]] != hashes[~changed]
+            df = df[changed].reset_index(drop=True)
+
+        if changed.all():
+            result = func(df, *args)
+        else:
+            parts = [self.result.iloc[previous[~changed]].set_axis(np.flatnonzero(~changed))]
+
+            if changed.any():
+                part = func(df.reset_index(drop=True), *args)
+                parts.append(part.set_axis(np.flatnonzero(changed)))
+
+            result = pd.concat(parts).sort_index().reset_index(drop=True) if len(parts) > 1 \
+                else parts[0].reset_index(drop=True)
+
+        self.signature, self.keys, self.hashes, self.result = sig, keys, hashes, result
+        self.recalculated, self.reused = int(changed.sum()), int((~changed).sum())
+
+        return result.copy()
+
+    def to_bytes(self):
+        """Serialises the previous run, so it can be stored until the next refresh.
+
+        Returns:
+            bytes
+        """
+
+        if self.result is None:
+            raise ValueError('No results have been calculated')
+
+        hashes = pd.DataFrame({'keys': self.keys, 'hashes': self.hashes})
+
+        return pack_frames({'signature': self.signature}, {'hashes': hashes, 'result': self.result})
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Restores a previous run serialised with `to_bytes`.
+
+        Args:
+            data (bytes): Serialised run.
+
+        Returns:
+            Incremental
+        """
+
+        meta, frames = unpack_frames(data)
+
+        if 'signature' not in meta:
+            raise ValueError('Data is not a serialised Incremental run')
+
+        incremental = cls()
+        incremental.signature = meta['signature']
+        incremental.keys = frames['hashes']['keys'].to_numpy()
+        incremental.hashes = frames['hashes']['hashes'].to_numpy()
+        incremental.result = frames['result']
+
+        return incremental
+
+
+
+def changed_rows(incremental, df, group_cols, single_grp, grouping, func, *args):
+    """Keeps only the rows of groups whose data has changed, if an Incremental run is given.
+
+    Args:
+        incremental: Incremental holding the previous run, or None to keep every row.
+        df: Pandas DataFrame of the data, before it is validated or summed.
+        group_cols (list), single_grp (bool), grouping (Grouping), func, *args: as in `Incremental.select`.
+
+    Returns:
+        The rows to validate and sum, and the grouping to use for them.
+    """
+
+    if incremental is None:
+        return df, grouping
+
+    if not isinstance(incremental, Incremental):
+        raise TypeError("'incremental' must be an Incremental object")
+
+    with stage('changed_rows', rows = len(df)) as changed:
+        df, grouping = incremental.select(df, group_cols, single_grp, grouping, func, *args)
+        changed.frame = df
+
+    return df, grouping
+
+
+
+def finalize_groups(incremental, group_cols, func, df, *args):
+    """Calculates a statistic from summed data, only for changed groups if an Incremental run is given.
+
+    Args:
+        incremental: Incremental holding the previous run, or None to calculate every group.
+        group_cols (list): List of column name(s) the data is grouped by.
+        func: Function calculating the statistic from summed data, one row per group.
+        df: Pandas DataFrame of summed data, one row per group.
+        *args: Arguments passed to func after the summed data.
+
+    Returns:
+        Pandas DataFrame as returned by func.
+    """
+
+    if incremental is not None and not isinstance(incremental, Incremental):
+        raise TypeError("'incremental' must be an Incremental object")
+
+    with stage('results', groups = len(df)) as results:
+        df = results.frame = func(df, *args) if incremental is None else incremental.apply(group_cols, func, df, *args)
+
+    return df
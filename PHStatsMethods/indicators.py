@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from . import core
+from .validation import metadata_columns, ci_col, assign_columns, col_values, format_args, validate_data
+from .utils import map_euro_standard_pops
+from .grouping import Grouping
+from .DSR import check_esp_groups
+from .instrumentation import instrumented, stage
+
+
+# statistics which can be given in the specs, with their default multipliers
+STATISTICS = {'proportion': 1, 'rate': 100000, 'dsr': 100000}
+
+
+@instrumented
+def ph_indicators(df, indicator_col, specs, num_col, denom_col, group_cols = None, age_col = None, metadata = True,
+                  workers = None):
+    """Calculates proportions, crude rates and directly standardised rates with confidence limits for
+    many indicators stacked in one long table, each with its own statistic, multiplier, confidence
+    and standard population.
+
+    The table is validated and its group keys factorised once, the numerators and denominators of
+    every indicator and group are summed together, and each statistic is then calculated for all of
+    its indicators at once, rather than with a call of `ph_proportion`, `ph_rate` or `ph_dsr` for each.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data of every indicator, with one row per indicator and group
+        (or per standardisation category of each group, for DSRs).
+    indicator_col : str
+        Name of column containing the indicator of each row.
+    specs : dict
+        The statistic of each indicator in indicator_col, as a dict of dicts with the keys:
+
+        - 'statistic': 'proportion', 'rate' or 'dsr'.
+        - 'multiplier': Multiplier used to express the values, as in `ph_proportion`, `ph_rate` or
+          `ph_dsr`. Defaults to 1 for proportions and 100000 for rates and DSRs.
+        - 'confidence': Confidence interval(s) to use, either as a float, list of float values or None.
+          Defaults to 0.95.
+        - 'reference': For DSRs, the name of the column containing the standard population of each
+          standardisation category. Defaults to None, where the European Standard Population is
+          matched on the lower age of each age band in age_col (0, 5, 10, ..., 90).
+    num_col : str
+        Name of column containing the numerator (observed number of events) of each row.
+    denom_col : str
+        Name of column containing the denominator (population) of each row.
+    group_cols : str | list
+        A string or list of column name(s) to group the data of each indicator by. Defaults to None.
+    age_col : str
+        Name of column containing the age bands, for DSRs standardised to the European
+        Standard Population. Defaults to None.
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+    workers : int
+        Number of worker processes to sum the data within groups. Defaults to None (no parallelism).
+
+    Returns
+    -------
+    Pandas DataFrame
+        DataFrame of the indicator and group keys, summed numerators and denominators, values
+        and confidence intervals of every indicator, with lower and upper columns for each
+        confidence interval used by any indicator (null for indicators which didn't use it).
+
+    Notes
+    -----
+    Values and confidence intervals are as returned by `ph_proportion` (Wilson), `ph_rate` (Byar's,
+    or exact for numerators below 10) and `ph_dsr` (Dobson).
+
+    Examples
+    --------
+      >>> specs = {'obesity': {'statistic': 'proportion', 'multiplier': 100},
+                   'admissions': {'statistic': 'rate', 'confidence': [0.95, 0.998]},
+                   'mortality': {'statistic': 'dsr'}}
+      >>> ph_indicators(df, 'indicator_id', specs, 'numerator', 'denominator', ['area', 'year'], age_col = 'ageband')
+
+    """
+
+    null, group_cols = format_args(None, group_cols)
+    key_cols = [indicator_col] + ([] if group_cols is None else group_cols)
+    specs = check_specs(specs)
+
+    df = validate_data(df, num_col, key_cols, metadata, denom_col)
+
+    # the spec of each row, from its indicator
+    with stage('specs', rows = len(df)):
+        row_specs = specs.index.get_indexer(df[indicator_col])
+
+        if (row_specs < 0).any():
+            missing = df[indicator_col][row_specs < 0].unique()
+            raise ValueError('No spec was given for indicator(s): ' + ', '.join([str(i) for i in missing]))
+
+        statistic = specs['statistic'].to_numpy()[row_specs]
+
+        if (df[num_col] > df[denom_col])[statistic == 'proportion'].any():
+            raise ValueError('Numerators must be less than or equal to the denominator for a proportion statistic')
+
+        terms = dsr_terms(df, num_col, denom_col, age_col, specs, row_specs, statistic == 'dsr')
+
+    grouping = Grouping(df, key_cols)
+    sums = grouping.sums(terms, [num_col, denom_col, 'ph_pkg_nulls', 'ph_pkg_wt_rate', 'ph_pkg_sq_rate',
+                                 'ph_pkg_ref_denom'], skipna_cols = [num_col], workers = workers)
+    group_specs = specs.index.get_indexer(sums[indicator_col])
+
+    # groups of DSRs standardised to the European Standard Population are checked as in `ph_dsr`
+    esp = (specs['statistic'].to_numpy()[group_specs] == 'dsr') & specs['reference'].isna().to_numpy()[group_specs]
+
+    if esp.any():
+        check_esp_groups(sums[esp].assign(ph_pkg_rows = grouping.counts[esp]), 'ph_pkg_ref_denom')
+
+    with stage('results', groups = grouping.ngroups) as results:
+        # numerators are null where any are null, other than for DSRs
+        nulls = (col_values(sums, 'ph_pkg_nulls') > 0) & (specs['statistic'].to_numpy()[group_specs] != 'dsr')
+        if nulls.any():
+            sums[num_col] = sums[num_col].astype(float).mask(nulls)
+
+        columns = indicator_results(sums, num_col, denom_col, specs, group_specs, metadata)
+        sums = sums.drop(columns = ['ph_pkg_nulls', 'ph_pkg_wt_rate', 'ph_pkg_sq_rate', 'ph_pkg_ref_denom'])
+
+        df = results.frame = assign_columns(sums, columns)
+
+    return df
+
+
+
+def check_specs(specs):
+    """Validates the specs of each indicator, filling in defaults.
+
+    Args:
+        specs (dict): as in `ph_indicators`.
+
+    Returns:
+        Pandas DataFrame of the statistic, multiplier, confidence (as a tuple) and reference of each indicator.
+    """
+
+    if not isinstance(specs, dict) or len(specs) == 0:
+        raise TypeError("'specs' must be a dict of the spec of each indicator")
+
+    rows = {}
+
+    for indicator, spec in specs.items():
+        if not isinstance(spec, dict):
+            raise TypeError(f"The spec of indicator '{indicator}' must be a dict")
+
+        unknown = set(spec) - {'statistic', 'multiplier', 'confidence', 'reference'}
+        if unknown:
+            raise ValueError(f"Unknown key(s) in the spec of indicator '{indicator}': " + ', '.join(sorted(unknown)))
+
+        statistic = spec.get('statistic')
+        if statistic not in STATISTICS:
+            raise ValueError(f"The statistic of indicator '{indicator}' must be one of: " + ', '.join(STATISTICS))
+
+        multiplier = spec.get('multiplier', STATISTICS[statistic])
+        if not isinstance(multiplier, int) or multiplier <= 0:
+            raise ValueError("'Multiplier' must be a positive integer")
+
+        if spec.get('reference') is not None and statistic != 'dsr':
+            raise ValueError(f"A reference can only be given for DSRs, not indicator '{indicator}'")
+
+        confidence, null = format_args(spec.get('confidence', 0.95))
+        rows[indicator] = (statistic, multiplier, tuple(confidence or ()), spec.get('reference'))
+
+    return pd.DataFrame.from_dict(rows, orient = 'index', columns = ['statistic', 'multiplier', 'confidence', 'reference'])
+
+
+
+def dsr_terms(df, num_col, denom_col, age_col, specs, row_specs, dsr):
+    """Weighted rate terms of each row which are summed within groups to calculate DSRs, as in
+    `DSR.dsr_terms`; zero for rows of other statistics.
+
+    Args:
+        df: Validated Pandas DataFrame.
+        num_col (str), denom_col (str), age_col (str), specs (DataFrame): as in `ph_indicators`.
+        row_specs: NumPy array of the position of each row's indicator in specs.
+        dsr: NumPy array of whether each row is of a DSR.
+
+    Returns:
+        Shallow copy of the Pandas DataFrame with the 'ph_pkg_nulls', 'ph_pkg_wt_rate',
+        'ph_pkg_sq_rate' and 'ph_pkg_ref_denom' columns added.
+    """
+
+    ref_denom = np.zeros(len(df))
+    references = specs['reference'].to_numpy()[row_specs]
+
+    if (dsr & pd.isna(references)).any():
+        if age_col is None:
+            raise ValueError("'age_col' must be given for DSRs standardised to the European Standard Population")
+
+        rows = dsr & pd.isna(references)
+        ref_denom[rows] = col_values(map_euro_standard_pops(df.loc[rows, [age_col]], age_col), 'euro_standard_pops')
+
+    for reference in pd.unique(references[dsr & pd.notna(references)]):
+        if reference not in df.columns:
+            raise ValueError(f"'{reference}' is not a column header")
+
+        rows = dsr & (references == reference)
+        ref_denom[rows] = col_values(df, reference)[rows]
+
+    num, denom = col_values(df, num_col), col_values(df, denom_col)
+    count = np.nan_to_num(num)
+
+    return df.assign(ph_pkg_nulls = np.isnan(num), ph_pkg_wt_rate = count * ref_denom / denom,
+                     ph_pkg_sq_rate = count * (ref_denom / denom)**2, ph_pkg_ref_denom = ref_denom)
+
+
+
+def indicator_results(sums, num_col, denom_col, specs, group_specs, metadata):
+    """Values and confidence intervals of each group, calculated for all the groups with the same
+    statistic and multiplier at once.
+
+    Args:
+        sums: Pandas DataFrame of summed data, one row per indicator and group.
+        num_col (str), denom_col (str), specs (DataFrame), metadata (bool): as in `ph_indicators`.
+        group_specs: NumPy array of the position of each group's indicator in specs.
+
+    Returns:
+        dict of column names and arrays.
+    """
+
+    # confidence intervals used by any of the indicators in the data
+    levels = sorted(set(c for confidence in specs['confidence'].iloc[np.unique(group_specs)] for c in confidence))
+    confidence = levels or None
+
+    value = np.full(len(sums), np.nan)
+    lower, upper = np.full((len(levels), len(sums)), np.nan), np.full((len(levels), len(sums)), np.nan)
+    statistic_names, methods = np.empty(len(sums), dtype=object), np.empty(len(sums), dtype=object)
+
+    num, denom = col_values(sums, num_col), col_values(sums, denom_col)
+    kinds, multipliers = specs['statistic'].to_numpy()[group_specs], specs['multiplier'].to_numpy()[group_specs]
+
+    for kind, multiplier in pd.DataFrame({'kind': kinds, 'multiplier': multipliers}).drop_duplicates().itertuples(index=False):
+        rows = (kinds == kind) & (multipliers == multiplier)
+
+        if kind == 'proportion':
+            result = core.proportion_from_sums(num[rows], denom[rows], confidence, multiplier)
+            statistic_names[rows] = 'Percentage' if multiplier == 100 else f'Proportion of {multiplier}'
+            methods[rows] = 'Wilson'
+        elif kind == 'rate':
+            result = core.rate_from_sums(num[rows], denom[rows], confidence, multiplier)
+            statistic_names[rows] = f'Rate per {multiplier}'
+            methods[rows] = np.where(num[rows] < 10, 'Exact', 'Byars')
+        else:
+            result = core.dsr_from_sums(num[rows], denom[rows], col_values(sums, 'ph_pkg_wt_rate')[rows],
+                                        col_values(sums, 'ph_pkg_sq_rate')[rows],
+                                        col_values(sums, 'ph_pkg_ref_denom')[rows], confidence, multiplier)
+            statistic_names[rows] = f'DSR per {multiplier}'
+            methods[rows] = 'Dobson'
+
+        value[rows] = result['value']
+        if levels:
+            lower[:, rows], upper[:, rows] = result['lower'], result['upper']
+
+    columns = {'Value': value}
+
+    for i, c in enumerate(levels):
+        # confidence intervals only for the indicators which asked for them
+        used = np.array([c in confidence for confidence in specs['confidence']])[group_specs]
+        columns[ci_col(c, 'lower')] = np.where(used, lower[i], np.nan)
+        columns[ci_col(c, 'upper')] = np.where(used, upper[i], np.nan)
+
+    if metadata:
+        confidence_names = np.array([metadata_columns('', list(c) or None).get('Confidence') for c in specs['confidence']],
+                                    dtype=object)
+        columns.update({'Statistic': statistic_names, 'Confidence': confidence_names[group_specs], 'Method': methods})
+
+    return columns
+
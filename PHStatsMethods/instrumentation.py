@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing and memory accounting of the stages within each statistic.
+
+Listeners are called with a StageEvent as each named stage of a `ph_*` or funnel function
+finishes (e.g. 'validate', 'esp_join', 'group_sums', 'results', 'metadata'), and once for the
+whole call ('total'). Nested stages are reported separately, so a stage's times include those of
+the stages within it. With no listener attached, each stage costs a single check.
+
+Listeners are attached to the current context (like `decimal.localcontext`), so they only receive
+the stages of statistics called in the same thread or asyncio task, or in a copy of its context
+(as `Batch.run` makes for each of its threads). CPU times are those of the thread.
+
+    >>> with instrument() as summary:
+    ...     ph_dsr(df, 'count', 'pop', 'ageband', 'area')
+    >>> print(summary.report())
+
+While a MemoryProfile is attached, stages also record the peak and retained memory allocated
+within them (traced with tracemalloc, which slows the statistics down) and the deep memory usage
+of the DataFrame each stage returns.
+
+    >>> with instrument(MemoryProfile()) as profile:
+    ...     ph_dsr(df, 'count', 'pop', 'ageband', 'area')
+    >>> print(profile.report())
+
+"""
+
+import time
+import functools
+import threading
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+
+StageEvent = namedtuple('StageEvent', ['function', 'stage', 'wall', 'cpu', 'rows', 'groups',
+                                       'peak_bytes', 'retained_bytes', 'frame_bytes'],
+                        defaults=(None, None, None))
+StageEvent.__doc__ = """A finished stage of a statistic: the function called, the stage name, wall and
+thread CPU time in seconds, and the rows and groups it handled (None where they don't apply). While memory
+is profiled, also the peak bytes allocated above the start of the stage, the bytes still allocated
+at its end, and the deep memory usage of the DataFrame it returned."""
+
+_listeners = ContextVar('ph_pkg_listeners', default=())
+_function = ContextVar('ph_pkg_function', default=None)
+
+# listeners profiling memory, whether tracemalloc was started for them, and the stages open in each thread
+_memory = {'listeners': 0, 'started': False}
+_open_stages = threading.local()
+
+
+
+def add_listener(listener):
+    """Calls listener with a StageEvent as each stage of a statistic finishes in the current context."""
+
+    if not callable(listener):
+        raise TypeError("'listener' must be callable")
+
+    if getattr(listener, 'memory', False):
+        if _memory['listeners'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory['started'] = True
+
+        _memory['listeners'] += 1
+
+    _listeners.set(_listeners.get() + (listener,))
+
+
+def remove_listener(listener):
+    """Stops calling a listener added with `add_listener`."""
+
+    listeners = list(_listeners.get())
+    listeners.remove(listener)
+    _listeners.set(tuple(listeners))
+
+    if getattr(listener, 'memory', False):
+        _memory['listeners'] -= 1
+
+        if _memory['listeners'] == 0 and _memory['started']:
+            tracemalloc.stop()
+            _memory['started'] = False
+
+
+
+class _NullStage:
+    """Stage used when no listener is attached, which records nothing. It's shared by every
+    statistic, so anything set on it is ignored."""
+
+    __slots__ = ()
+    rows = groups = frame = None
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+
+class _Stage:
+    """Times a stage of a statistic and passes a StageEvent to the listeners when it finishes.
+    The DataFrame returned by the stage can be set as its frame, to measure while memory is profiled."""
+
+    def __init__(self, name, rows = None, groups = None):
+        self.name, self.rows, self.groups, self.frame = name, rows, groups, None
+        self.memory = _memory['listeners'] > 0 and tracemalloc.is_tracing()
+
+    def __enter__(self):
+        if self.memory:
+            self.enter_memory()
+
+        self.wall, self.cpu = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall, cpu = time.perf_counter() - self.wall, time.thread_time() - self.cpu
+        memory = self.exit_memory() if self.memory else ()
+
+        event = StageEvent(_function.get(), self.name, wall, cpu, self.rows, self.groups, *memory)
+
+        for listener in _listeners.get():
+            listener(event)
+
+        return False
+
+    def enter_memory(self):
+        stack = _open_stages.__dict__.setdefault('stack', [])
+        current, peak = tracemalloc.get_traced_memory()
+
+        # the peak is reset for each stage, so keep the peak reached so far by the enclosing stage
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+
+        tracemalloc.reset_peak()
+        self.start, self.peak = current, current
+        stack.append(self)
+
+    def exit_memory(self):
+        stack = _open_stages.stack
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        stack.remove(self)
+
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        frame = self.frame.memory_usage(deep=True).sum() if isinstance(self.frame, pd.DataFrame) else None
+
+        return self.peak - self.start, current - self.start, frame
+
+
+
+def stage(name, rows = None, groups = None):
+    """Context manager timing a named stage of a statistic. The rows and groups handled can be
+    given here, or set as attributes of the returned stage before it finishes.
+
+    Args:
+        name (str): Name of the stage.
+        rows (int): Number of rows the stage handles, or None.
+        groups (int): Number of groups the stage handles, or None.
+    """
+
+    if not _listeners.get():
+        return _null_stage
+
+    return _Stage(name, rows, groups)
+
+
+
+def instrumented(func):
+    """Decorates a statistic so its stages are reported under its name, with a 'total' stage for the call."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _listeners.get():
+            return func(*args, **kwargs)
+
+        df = args[0] if args else kwargs.get('df')
+        token = _function.set(func.__name__)
+
+        try:
+            with stage('total', rows = len(df) if isinstance(df, pd.DataFrame) else None) as total:
+                result = func(*args, **kwargs)
+                total.groups = len(result) if isinstance(result, pd.DataFrame) else None
+                total.frame = result
+        finally:
+            _function.reset(token)
+
+        return result
+
+    return wrapper
+
+
+
+class StageSummary:
+    """Listener collecting the stage events of statistics and summarising them by function and stage.
+
+    Attributes
+    ----------
+    events : list
+        StageEvents received, in the order the stages finished.
+
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def summary(self):
+        """Calls, total wall and CPU time, and rows and groups handled for each function and stage.
+
+        Returns
+        -------
+        Pandas DataFrame
+        """
+
+        df = pd.DataFrame(self.events, columns=StageEvent._fields)
+        df['function'] = df['function'].fillna('')
+
+        df = df.groupby(['function', 'stage'], sort=False) \
+               .agg(calls=('wall', 'size'), wall=('wall', 'sum'), cpu=('cpu', 'sum'),
+                    rows=('rows', lambda x: x.sum(min_count=1)),
+                    groups=('groups', lambda x: x.sum(min_count=1))).reset_index()
+
+        return df.astype({'rows': 'Int64', 'groups': 'Int64'})
+
+    def report(self):
+        """The summary as a table, with the share of each function's total time spent in each stage.
+
+        Returns
+        -------
+        str
+        """
+
+        df = self.summary()
+        totals = df[df['stage'] == 'total'].set_index('function')['wall']
+        df['share'] = (df['wall'] / df['function'].map(totals) * 100).round(1)
+
+        return df.to_string(index=False, float_format=lambda x: f'{x:.4f}')
+
+
+
+class MemoryProfile(StageSummary):
+    """Listener collecting the stage events of statistics with their memory use, which is traced
+    with tracemalloc while the profile is attached. Memory is traced across the whole process, so
+    stages running at the same time in other threads are included.
+
+    Attributes
+    ----------
+    events : list
+        StageEvents received, in the order the stages finished.
+
+    Examples
+    --------
+      >>> with instrument(MemoryProfile()) as profile:
+      ...     ph_dsr(df, 'count', 'pop', 'ageband', 'area')
+      >>> profile.summary()
+
+    """
+
+    memory = True
+
+    def summary(self):
+        """Calls, total wall and CPU time, rows and groups handled, and the largest peak, retained
+        and returned DataFrame memory in MiB for each function and stage.
+
+        Returns
+        -------
+        Pandas DataFrame
+        """
+
+        df = super().summary()
+        events = pd.DataFrame(self.events, columns=StageEvent._fields)
+        events['function'] = events['function'].fillna('')
+
+        memory_cols = ['peak_bytes', 'retained_bytes', 'frame_bytes']
+        events[memory_cols] = events[memory_cols].astype(float)
+        memory = events.groupby(['function', 'stage'], sort=False)[memory_cols].max() / 2**20
+
+        memory.columns = ['peak_mib', 'retained_mib', 'frame_mib']
+
+        return df.merge(memory.reset_index(), how='left', on=['function', 'stage'])
+
+
+
+@contextmanager
+def instrument(listener = None):
+    """Attaches a listener to the stages of statistics called within the context.
+
+    Parameters
+    ----------
+    listener
+        Callable receiving each StageEvent. Defaults to None, which attaches a new StageSummary.
+
+    Yields
+    ------
+    The attached listener.
+    """
+
+    listener = StageSummary() if listener is None else listener
+    add_listener(listener)
+
+    try:
+        yield listener
+    finally:
+        remove_listener(listener)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import re
+import warnings
+import numpy as np
+import pandas as pd
+
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, format_args, validate_data
+from .grouping import Grouping
+from .instrumentation import instrumented, stage
+
+
+@instrumented
+def ph_life_expectancy(df, deaths_col, pop_col, age_col, group_cols = None, le_age = 'all', metadata = True,
+                       confidence = 0.95):
+    """Calculates life expectancy with confidence limits from an abridged life table using Chiang's method.
+
+    The life tables of every group are built together, as arrays of one row per group and one
+    column per age band, so life expectancy can be calculated for many thousands of groups at once.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the deaths and population of each age band, with one row for
+        each age band in each group.
+    deaths_col : str
+        Name of column containing the number of deaths in each age band.
+    pop_col : str
+        Name of column containing the population of each age band.
+    age_col : str
+        Name of column containing the start age of each age band, as a number or as a label
+        beginning with it (e.g. '0', '1-4', '5-9', ..., '90+'). The first age band must start
+        at 0, and the last is open ended.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by, with one life table per group.
+        Defaults to None.
+    le_age : int | list
+        Start age(s) of the age bands to return life expectancy for, or 'all'.
+        Defaults to 'all'.
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+    confidence : float
+        Confidence interval(s) to use, either as a float, list of float values or None.
+        Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
+
+    Returns
+    -------
+    Pandas DataFrame
+        DataFrame of life expectancy at the start of each age band (or of those in le_age) for
+        each group, with confidence intervals.
+
+    Notes
+    -----
+    Life expectancy isn't calculated for groups with a total population below 5,000, with more
+    deaths than population in any age band or with no deaths in the last age band, as it is
+    unreliable. These groups are returned with null values and a warning.
+
+    The fraction of the last year lived by those dying in the first year of life is taken as 0.1
+    where the first age band is under 1 year, and as half of the age band otherwise. Confidence
+    intervals use Chiang's variance (1), with the variance of the last age band as in Silcocks et al (2).
+
+    References
+    ----------
+    (1) Chiang CL. The Life Table and its Construction. In: Introduction to Stochastic Processes in
+        Biostatistics. New York: John Wiley & Sons; 1968. Pg 189 to 214.
+    (2) Silcocks PBS, Jenner DA, Reza R. Life expectancy as a summary of mortality in a population:
+        statistical considerations and suitability for use by health authorities.
+        J Epidemiol Community Health 2001; 55: 38-43.
+
+    Examples
+    --------
+      >>> df = pd.DataFrame({'area': ['Area1'] * 20,
+                             'ageband': [0, 1] + list(range(5, 95, 5)),
+                             'pops': [7060, 35059, 46974, 48489, 43219, 38561, 46009, 57208, 61435, 55601,
+                                      50209, 56416, 46411, 39820, 37978, 37039, 23372, 11543, 5355, 2318],
+                             'deaths': [17, 9, 4, 7, 19, 17, 35, 46, 82, 134,
+                                        206, 304, 411, 624, 931, 1158, 1473, 1397, 1083, 763]})
+      >>> ph_life_expectancy(df, 'deaths', 'pops', 'ageband', 'area', le_age = [0, 65])
+
+    """
+
+    confidence, group_cols = format_args(confidence, group_cols)
+
+    df = validate_data(df, deaths_col, group_cols, metadata, pop_col)
+    check_arguments_le(df, age_col, le_age)
+
+    # group codes, dropping rows without a group as in pandas.groupby
+    if group_cols is not None:
+        grouping = Grouping(df, group_cols)
+        keep = grouping.codes >= 0
+        codes, keys = grouping.codes[keep], grouping.keys
+        df = df[keep]
+    else:
+        codes, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=range(1))
+
+    start_ages = start_age(df[age_col])
+    ages, bands = np.unique(start_ages, return_inverse=True)
+    ngroups, nbands = len(keys), len(ages)
+
+    if ages[0] != 0:
+        raise ValueError('The first age band must start at 0')
+
+    if (np.bincount(codes * nbands + bands, minlength=ngroups * nbands) != 1).any():
+        raise ValueError('There must be one row for each age band in each group')
+
+    # deaths and populations of each group (rows) and age band (columns)
+    deaths, pops = np.empty((ngroups, nbands)), np.empty((ngroups, nbands))
+    deaths[codes, bands], pops[codes, bands] = col_values(df, deaths_col), col_values(df, pop_col)
+
+    with stage('life_table', rows = len(df), groups = ngroups):
+        result = core.life_table(deaths, pops, ages, confidence)
+
+    unreliable = (pops.sum(axis=1) < 5000) | (deaths > pops).any(axis=1) | np.isnan(deaths).any(axis=1)
+    missing = unreliable | np.isnan(result['value'][:, 0])
+
+    for key in ['value', 'se', 'lower', 'upper']:
+        result[key][..., missing, :] = np.nan
+
+    if missing.any():
+        warnings.warn('Life expectancy was not calculated for one or more groups with a total population below 5,000, '
+                      'more deaths than population in an age band or no deaths in the last age band', UserWarning)
+
+    # life expectancy at each age in le_age, one row per group and age
+    selected = np.arange(nbands) if isinstance(le_age, str) else np.searchsorted(ages, np.atleast_1d(le_age))
+    labels = df[age_col].groupby(bands).first().to_numpy()
+
+    with stage('results', groups = ngroups) as results:
+        rows = {'value': result['value'][:, selected].reshape(-1),
+                'lower': result['lower'][:, :, selected].reshape(len(result['lower']), -1),
+                'upper': result['upper'][:, :, selected].reshape(len(result['upper']), -1)}
+
+        out = keys.iloc[np.repeat(np.arange(ngroups), len(selected))].reset_index(drop=True)
+        out[age_col] = np.tile(labels[selected], ngroups)
+
+        columns = {'Value': rows['value'], **ci_columns(rows, confidence)}
+
+        if metadata:
+            columns.update(metadata_columns('Life expectancy', confidence, 'Chiang, using Silcocks et al for confidence limits'))
+
+        out = results.frame = assign_columns(out, columns)
+
+    return out
+
+
+
+def start_age(ages):
+    """Start age of each age band, from numbers or from labels beginning with the start age (e.g. '5-9', '90+').
+
+    Args:
+        ages: Pandas Series of start ages or age band labels.
+
+    Returns:
+        NumPy array of start ages.
+    """
+
+    if pd.api.types.is_numeric_dtype(ages):
+        return ages.to_numpy(dtype=float)
+
+    # labels repeat in every group, so only the unique labels are parsed
+    codes, labels = pd.factorize(ages)
+    starts = [re.findall(r'(\d+)', str(label)) for label in labels]
+
+    if not all(starts):
+        raise ValueError(f"'{ages.name}' must contain the start age of each age band")
+
+    return np.array([float(start[0]) for start in starts])[codes]
+
+
+
+def check_arguments_le(df, age_col, le_age):
+    """Validates the age band column and ages to return life expectancy for.
+
+    Args:
+        df: Pandas DataFrame.
+        age_col (str), le_age (int | list): as in `ph_life_expectancy`.
+    """
+
+    if not isinstance(age_col, str):
+        raise TypeError('Column names must be a quoted string')
+
+    if age_col not in df.columns:
+        raise ValueError(f"'{age_col}' is not a column header")
+
+    if df[age_col].isna().any():
+        raise ValueError(f"'{age_col}' must not contain nulls")
+
+    if isinstance(le_age, str):
+        if le_age != 'all':
+            raise ValueError("'le_age' must be 'all' or the start age(s) of age bands")
+        return
+
+    ages = set(start_age(df[age_col]))
+
+    for age in np.atleast_1d(le_age):
+        if not isinstance(age, (int, np.integer)) or age not in ages:
+            raise ValueError("'le_age' must be 'all' or the start age(s) of age bands")
@@ -3,10 +3,18 @@
 import numpy as np
 import pandas as pd
 
-from .confidence_intervals import student_t_dist
-from .validation import metadata_cols, ci_col, validate_data, format_args
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, validate_data, format_args
+from .utils import group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import Grouping, check_grouping
+from .streaming import GroupSums
+from .instrumentation import instrumented
+from .frames import native_frames
 
-def ph_mean(df, num_col, group_cols, metadata = True, confidence = 0.95):
+@instrumented
+@native_frames
+def ph_mean(df, num_col, group_cols, metadata = True, confidence = 0.95, incremental = None, grouping = None):
     
     """Calculates means with confidence limits using Student-t distribution.
 
@@ -14,6 +22,8 @@ def ph_mean(df, num_col, group_cols, metadata = True, confidence = 0.95):
     ----------
     df
         DataFrame containing the data to calculate proportions for.
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str
         Name of column containing observed number of cases in the sample
         (the numerator of the population).
@@ -24,6 +34,12 @@ def ph_mean(df, num_col, group_cols, metadata = True, confidence = 0.95):
     confidence : float
         Confidence interval(s) to use, either as a float, list of float values or None.
         Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
 
     Returns
     -------
@@ -34,29 +50,135 @@ def ph_mean(df, num_col, group_cols, metadata = True, confidence = 0.95):
     
     # Check data and arguments
     confidence, group_cols = format_args(confidence, group_cols)
-    df = validate_data(df, num_col, group_cols, metadata)
     
     if group_cols is None:
         raise TypeError('group_cols cannot be None for a mean statistic')
+    
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, True, grouping, mean_results, num_col, group_cols,
+                                metadata, confidence)
+    df = validate_data(df, num_col, group_cols, metadata)
+
+    # get grouped statistics from the integer group codes, in the sorted order of the group keys
+    if grouping is None:
+        grouping = Grouping(df, group_cols)
+    
+    result = core.mean(col_values(df, num_col), grouping.codes, grouping.ngroups, None)
+    
+    # keep integer sums as integers, as the pandas sum does
+    sums = result['sum'].astype(df[num_col].dtype) if pd.api.types.is_integer_dtype(df[num_col]) else result['sum']
+    
+    df = grouping.keys.copy()
+    df['value_sum'] = sums
+    df['value_count'] = result['count'].astype(np.int64)
+    df['stdev'] = result['stdev']
+    
+    return finalize_groups(incremental, group_cols, mean_results, df, group_cols, metadata, confidence)
+
+
 
-    # get grouped statistics
-    df = df.groupby(group_cols)[num_col].agg([lambda x: x.sum(skipna=False), 
-                                              lambda x: x.count(), 
-                                              lambda x: x.std(skipna=False)]).reset_index()
+def mean_results(df, group_cols, metadata, confidence):
+    """Calculates means and confidence intervals from sums, counts and standard deviations within groups.
     
-    df = df.rename(columns={df.columns[-3]: 'value_sum', df.columns[-2]: 'value_count', df.columns[-1]: 'stdev'})
+    Args:
+        df: Pandas DataFrame with 'value_sum', 'value_count' and 'stdev' columns, one row per group.
+        group_cols (list): List of column name(s) the data is grouped by.
+        metadata (bool): as in `ph_mean`.
+        confidence (list): Confidence interval(s) to use.
+        
+    Returns:
+        Pandas DataFrame of calculated means as returned by `ph_mean`.
+    """
     
-    df['Value'] = df['value_sum'] / df['value_count']
+    result = core.mean_from_sums(col_values(df, 'value_sum'), col_values(df, 'value_count'), col_values(df, 'stdev'), confidence)
     
-    for c in confidence:
-        student_t = student_t_dist(df['value_count'], df['stdev'], c)
-        df[ci_col(c, 'lower')] = df['Value'] - student_t
-        df[ci_col(c, 'upper')] = df['Value'] + student_t
+    columns = {'Value': result['value'], **ci_columns(result, confidence)}
 
     if metadata:
-        df = metadata_cols(df, 'Mean', confidence, "Student's t-distribution")
+        columns.update(metadata_columns('Mean', confidence, "Student's t-distribution"))
         
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
     
-    return df
\ No newline at end of file
+    return assign_columns(df, columns)
+
+
+
+class MeanState(GroupSums):
+    """Counts, sums and sums of squared deviations from the mean (M2) within groups, which can be
+    updated with more data, merged with the state of other data (e.g. calculated on another machine)
+    and finalised into exactly the means `ph_mean` would return for all of the data. States are
+    merged using Chan et al.'s (1) pairwise update of M2, so no data needs to be revisited.
+    
+    Parameters
+    ----------
+    num_col : str
+        Name of column containing observed number of cases in the sample
+        (the numerator of the population).
+    group_cols : str | list
+        A string or list of column name(s) to group the data by. 
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+        
+    References
+    ----------
+    (1) Chan TF, Golub GH, LeVeque RJ. Updating formulae and a pairwise algorithm for computing 
+        sample variances. Stanford University; 1979. STAN-CS-79-773.
+    
+    """
+    
+    def __init__(self, num_col, group_cols, metadata = True):
+        null, group_cols = format_args(None, group_cols)
+        
+        if group_cols is None:
+            raise TypeError('group_cols cannot be None for a mean statistic')
+        
+        super().__init__(group_cols, ['value_count', 'value_sum', 'M2'], skipna_cols = ['value_count'])
+        self.num_col, self.metadata = num_col, metadata
+        self.params = {'num_col': num_col, 'group_cols': group_cols, 'metadata': metadata}
+    
+    def prepare(self, df):
+        df = validate_data(df, self.num_col, self.group_cols, self.metadata)
+        values = df[self.num_col]
+        
+        df['value_count'] = values.notna().astype(int)
+        df['value_sum'] = values
+        df['M2'] = (values - df.groupby(self.group_cols, observed=True, sort=True)[self.num_col].transform('mean'))**2
+        
+        return df
+    
+    def combine(self, partials):
+        df = pd.concat(partials, ignore_index=True)
+        grouped = df.groupby(self.keys, observed=True, sort=True)
+        
+        # M2 of combined groups adds the spread of each partial's mean around the combined mean
+        mean = grouped['value_sum'].transform('sum') / grouped['value_count'].transform('sum')
+        df['M2'] = df['M2'] + df['value_count'] * (df['value_sum'] / df['value_count'] - mean)**2
+        
+        return group_sums(df, self.keys, self.sum_cols, self.skipna_cols)
+    
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates means with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float
+            Confidence interval(s) to use, either as a float, list of float values or None.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            DataFrame of calculated mean statistics with confidence intervals, as returned by `ph_mean`.
+        """
+        confidence, null = format_args(confidence)
+        df = self.sums
+        
+        stdev = np.sqrt(df['M2'] / (df['value_count'] - 1).where(df['value_count'] > 1))
+        df = df[self.keys + ['value_sum', 'value_count']].assign(stdev = stdev)
+        
+        return finalize_groups(incremental, self.keys, mean_results, df, self.keys, self.metadata, confidence)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+
+@contextmanager
+def shared_arrays(arrays):
+    """Copies arrays once into shared memory blocks so worker processes can read them without pickling.
+
+    Parameters
+    ----------
+    arrays : dict
+        Dictionary of names to NumPy arrays.
+
+    Yields
+    ------
+    dict
+        Dictionary of names to (shared memory name, dtype, shape) specifications, which
+        can be passed to worker processes and opened with `attach_array`.
+    """
+
+    blocks = []
+    specs = {}
+
+    try:
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            specs[key] = (shm.name, arr.dtype.str, arr.shape)
+
+        yield specs
+
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+
+def attach_array(spec):
+    """Opens a zero-copy view of an array created by `shared_arrays`.
+
+    Parameters
+    ----------
+    spec : tuple
+        (shared memory name, dtype, shape) specification of the array.
+
+    Returns
+    -------
+    Tuple
+        The SharedMemory block (which must be closed once the view is no longer used) and the array view.
+    """
+    name, dtype, shape = spec
+    shm = shared_memory.SharedMemory(name=name)
+
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+
+def partial_group_sums(specs, start, stop, ngroups):
+    """Worker task summing a slice of the shared columns within groups.
+
+    Parameters
+    ----------
+    specs : dict
+        Specifications from `shared_arrays`, containing 'codes' (integer group codes, -1 for
+        rows without a group) and one entry per column to sum.
+    start, stop : int
+        Row slice for this worker.
+    ngroups : int
+        Total number of groups.
+
+    Returns
+    -------
+    Tuple
+        Arrays of (column x group) sums with nulls treated as zero, and (column x group) counts of nulls.
+    """
+
+    blocks = []
+    codes = values = keep = missing = None
+
+    try:
+        shm, codes = attach_array(specs['codes'])
+        blocks.append(shm)
+        codes = codes[start:stop]
+        keep = codes >= 0
+        
+        # only copy the slice when some rows have no group
+        if not keep.all():
+            codes = codes[keep]
+
+        value_keys = [key for key in specs if key != 'codes']
+        sums = np.zeros((len(value_keys), ngroups))
+        nulls = np.zeros((len(value_keys), ngroups))
+
+        for i, key in enumerate(value_keys):
+            shm, values = attach_array(specs[key])
+            blocks.append(shm)
+            values = values[start:stop] if len(codes) == stop - start else values[start:stop][keep]
+            values = values.astype(float, copy=False)
+            missing = np.isnan(values)
+            sums[i] = np.bincount(codes, weights=np.where(missing, 0, values), minlength=ngroups)
+            nulls[i] = np.bincount(codes, weights=missing, minlength=ngroups)
+
+    finally:
+        # views must be released before the blocks can be closed, including when an error is raised
+        codes = values = keep = missing = None
+
+        for shm in blocks:
+            shm.close()
+
+    return sums, nulls
+
+
+
+def shared_group_sums(codes, values, ngroups, workers):
+    """Sums arrays within groups across a process pool, sharing the inputs through shared memory.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        Integer group code for each row, -1 for rows without a group.
+    values : list
+        List of numeric arrays, the same length as codes, to sum.
+    ngroups : int
+        Total number of groups.
+    workers : int
+        Number of worker processes.
+
+    Returns
+    -------
+    Tuple
+        Arrays of (column x group) sums with nulls treated as zero, and (column x group) counts of nulls.
+    """
+
+    arrays = {'codes': np.asarray(codes, dtype=np.int64)}
+    arrays.update({f'col{i}': np.asarray(v) for i, v in enumerate(values)})
+
+    bounds = np.linspace(0, len(codes), workers + 1).astype(int)
+
+    with shared_arrays(arrays) as specs, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(partial_group_sums, specs, start, stop, ngroups)
+                   for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        results = [f.result() for f in futures]
+
+    sums = np.zeros((len(values), ngroups))
+    nulls = np.zeros((len(values), ngroups))
+
+    for s, n in results:
+        sums += s
+        nulls += n
+
+    return sums, nulls
+
+
+
+def parallel_group_sums(df, group_cols, sum_cols, skipna_cols = None, workers = 2):
+    """Parallel equivalent of `group_sums`: the group codes and columns to sum are placed once in
+    shared memory and each worker returns only its per-group sums.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data to sum.
+    group_cols : list
+        List of column name(s) to group the data by.
+    sum_cols : list
+        List of column name(s) to sum within each group.
+    skipna_cols : list
+        Column name(s) in sum_cols where nulls are treated as zero. Defaults to None.
+    workers : int
+        Number of worker processes.
+
+    Returns
+    -------
+    Pandas DataFrame
+        DataFrame of group_cols and the summed sum_cols, one row per group.
+    """
+
+    from .grouping import Grouping
+
+    return Grouping(df, group_cols).sums(df, sum_cols, skipna_cols, workers)
@@ -2,17 +2,30 @@
 
 import pandas as pd
 
-from .confidence_intervals import wilson_lower, wilson_upper
-from .validation import metadata_cols, ci_col, format_args, validate_data, group_args
-
-
-def ph_proportion(df, num_col, denom_col, group_cols = None, metadata = True, confidence = 0.95, multiplier = 1):
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, common_dtype, format_args, validate_data, group_args
+from .utils import group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import check_grouping
+from .streaming import is_chunked, sum_chunks, GroupSums
+from .instrumentation import instrumented
+from .frames import native_frames
+
+
+@instrumented
+@native_frames
+def ph_proportion(df, num_col, denom_col, group_cols = None, metadata = True, confidence = 0.95, multiplier = 1, workers = None, 
+                  incremental = None, grouping = None):
     """Calculates proportions with confidence limits using Wilson Score method.
 
     Parameters
     ----------
     df
-        DataFrame containing the data to calculate proportions for.
+        DataFrame containing the data to calculate proportions for, or an iterable of DataFrame chunks
+        (e.g. from `pd.read_csv(chunksize=...)` or pyarrow record batches) which are validated
+        and summed within groups one chunk at a time.
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str
         Name of column containing observed number of cases in the sample
         (the numerator of the population).
@@ -29,6 +42,15 @@ def ph_proportion(df, num_col, denom_col, group_cols = None, metadata = True, co
         Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
     multiplier : int
         Multiplier used to express the final values (e.g. 100 = percentage).
+    workers : int
+        Number of worker processes to sum the data within groups, with the input columns
+        placed once in shared memory rather than copied to each worker. Defaults to None (no parallelism).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
 
     Returns
     -------
@@ -68,35 +90,148 @@ def ph_proportion(df, num_col, denom_col, group_cols = None, metadata = True, co
 
     # Check data and arguments
     confidence, group_cols = format_args(confidence, group_cols)
-    df = validate_data(df, num_col, group_cols, metadata, denom_col)
         
     if not isinstance(multiplier, int) or multiplier <= 0:
         raise ValueError("'Multiplier' must be a positive integer")
-      
-    if (df[num_col] > df[denom_col]).any():
-        raise ValueError('Numerators must be less than or equal to the denominator for a proportion statistic')   
     
+    # Sum Numerator and Denominator columns, ensure NAs are included. 
+    if is_chunked(df):
+        state = sum_chunks(df, ProportionState(num_col, denom_col, group_cols, metadata, multiplier, workers))
+        return state.finalize(confidence, incremental)
+    
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, False, grouping, proportion_results, num_col, denom_col,
+                                metadata, confidence, multiplier)
+    
+    df = check_proportions(df, num_col, denom_col, group_cols, metadata)
+
     # Grouping by temporary column to reduce duplication in code
     df, group_cols = group_args(df, group_cols, False)
+    
+    df = group_sums(df, group_cols, [num_col, denom_col], workers = workers, grouping = grouping)
+    
+    return finalize_groups(incremental, group_cols, proportion_results, df, num_col, denom_col, group_cols, metadata, 
+                           confidence, multiplier)
+
+
+
+def check_proportions(df, num_col, denom_col, group_cols = None, metadata = None):
+    """Validates data for a proportion statistic.
+    
+    Args:
+        df: Pandas DataFrame.
+        num_col (str), denom_col (str), group_cols (list), metadata (bool): as in `ph_proportion`.
+        
+    Returns:
+        Validated copy of the Pandas DataFrame.
+    """
+    
+    df = validate_data(df, num_col, group_cols, metadata, denom_col)
+      
+    if (df[num_col] > df[denom_col]).any():
+        raise ValueError('Numerators must be less than or equal to the denominator for a proportion statistic')
+    
+    return df
+
 
-    # Sum Numerator and Denominator columns, ensure NAs are included. 
-    df = df.groupby(group_cols)[[num_col, denom_col]].apply(lambda x: x.sum(skipna=False)).reset_index()
+
+def proportion_results(df, num_col, denom_col, group_cols, metadata, confidence, multiplier):
+    """Calculates proportions and confidence intervals from numerators and denominators summed within groups.
+    
+    Args:
+        df: Pandas DataFrame of summed data, one row per group.
+        num_col (str), denom_col (str), metadata (bool), multiplier (int): as in `ph_proportion`.
+        group_cols (list): List of column name(s) the data is grouped by.
+        confidence (list): Confidence interval(s) to use, or None.
+        
+    Returns:
+        Pandas DataFrame of calculated proportions as returned by `ph_proportion`.
+    """
 
     ### Calculate statistic
-    df['Value'] = (df[num_col] / df[denom_col]) * multiplier
-
-    if confidence is not None:
-        for c in confidence:
-            df[ci_col(c, 'lower')] = df.apply(lambda y: wilson_lower(y[num_col], y[denom_col], c),
-                                                axis=1) * multiplier
-            df[ci_col(c, 'upper')] = df.apply(lambda y: wilson_upper(y[num_col], y[denom_col], c),
-                                                axis=1) * multiplier
-            
+    result = core.proportion_from_sums(col_values(df, num_col), col_values(df, denom_col), confidence, multiplier)
+
+    columns = {'Value': result['value'], **ci_columns(result, confidence)}
+
     if metadata:
         statistic = 'Percentage' if multiplier == 100 else f'Proportion of {multiplier}'
-        df = metadata_cols(df, statistic, confidence, 'Wilson')
+        columns.update(metadata_columns(statistic, confidence, 'Wilson'))
         
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
         
-    return df
+    return assign_columns(common_dtype(df, [num_col, denom_col]), columns)
+
+
+
+
+class ProportionState(GroupSums):
+    """Numerators and denominators summed within groups, which can be updated with more data,
+    merged with the state of other data (e.g. calculated on another machine) and finalised into
+    exactly the proportions `ph_proportion` would return for all of the data.
+    
+    Parameters
+    ----------
+    num_col : str
+        Name of column containing observed number of cases in the sample
+        (the numerator of the population).
+    denom_col : str
+        Name of column containing number of cases in sample 
+        (the denominator of the population).
+    group_cols : str | list
+        A string or list of column name(s) to group the data by. 
+        Defaults to None.
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+    multiplier : int
+        Multiplier used to express the final values (e.g. 100 = percentage).
+    workers : int
+        Number of worker processes to sum each update with. Defaults to None (no parallelism).
+        
+    Examples
+    --------
+      >>> state = ProportionState('numerator', 'denominator', 'area', multiplier = 100)
+      >>> for chunk in pd.read_csv('data.csv', chunksize = 1000000):
+      ...     state.update(chunk)
+      >>> state.merge(ProportionState.from_bytes(other_bytes)).finalize(confidence = 0.95)
+    
+    """
+    
+    def __init__(self, num_col, denom_col, group_cols = None, metadata = True, multiplier = 1, workers = None):
+        null, group_cols = format_args(None, group_cols)
+        
+        if not isinstance(multiplier, int) or multiplier <= 0:
+            raise ValueError("'Multiplier' must be a positive integer")
+        
+        super().__init__(group_cols, [num_col, denom_col], single_grp = False, workers = workers)
+        self.num_col, self.denom_col = num_col, denom_col
+        self.metadata, self.multiplier = metadata, multiplier
+        self.params = {'num_col': num_col, 'denom_col': denom_col, 'group_cols': group_cols,
+                       'metadata': metadata, 'multiplier': multiplier, 'workers': workers}
+    
+    def prepare(self, df):
+        return check_proportions(df, self.num_col, self.denom_col, self.group_cols, self.metadata)
+    
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates proportions with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float
+            Confidence interval(s) to use, either as a float, list of float values or None.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            DataFrame of calculated proportion statistics, as returned by `ph_proportion`.
+        """
+        confidence, null = format_args(confidence)
+        df = self.sums.drop(columns='ph_pkg_rows')
+        
+        return finalize_groups(incremental, self.keys, proportion_results, df, self.num_col, self.denom_col, self.keys, 
+                               self.metadata, confidence, self.multiplier)
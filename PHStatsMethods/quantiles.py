@@ -4,9 +4,13 @@ import pandas as pd
 import numpy as np
 import warnings
 
-from .validation import format_args, check_arguments, group_args
+from . import core
+from .validation import format_args, check_arguments, col_values, group_args
+from .grouping import check_grouping
+from .instrumentation import instrumented, stage
 
-def ph_quantile(df, values, group_cols = None, nquantiles = 10, invert = True, type = "full"):
+@instrumented
+def ph_quantile(df, values, group_cols = None, nquantiles = 10, invert = True, type = "full", grouping = None):
     """Assigns data to quantiles based on numeric data rankings.
 
     Parameters
@@ -27,6 +31,9 @@ def ph_quantile(df, values, group_cols = None, nquantiles = 10, invert = True, t
     type : str 
         Defines whether to include metadata columns in output to reference the arguments 
         passed; can be "standard" or "full".
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
 
     Returns
     -------
@@ -69,21 +76,21 @@ def ph_quantile(df, values, group_cols = None, nquantiles = 10, invert = True, t
     
     check_arguments(df, [values] if group_cols is None else [values] + group_cols)
     
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
     # Additional columns in output
     df['nquantiles'] = nquantiles
 
-    # Calculate Quantiles  
-    df['num_rows'] = df.groupby(group_cols)[values].transform(lambda x: x.count()) # Number of rows in each group
-    df['rank'] = df.groupby(group_cols)[values].rank(ascending = not invert, method='min') # Rank each value in each group
-
-
-    # Assign a quantile based on rank and number of rows in each group 
-    df['quantile'] = np.where(df['num_rows'] < nquantiles,
-                              np.nan,
-                              np.floor((nquantiles + 1) - np.ceil(((df['num_rows'] + 1) - df['rank']) / (df['num_rows'] / nquantiles))))
-
-    # The above maths means that rank 1 may occasionally become quantile 0, instead of quantile 1
-    df.loc[df['quantile'] == 0, 'quantile'] = 1
+    # Calculate Quantiles from the rank of each value in its group
+    codes = df.groupby(group_cols, observed=True, sort=True).ngroup().fillna(-1).to_numpy(dtype=np.int64) if grouping is None else grouping.codes
+    with stage('quantiles', rows = len(df)):
+        result = core.quantile(col_values(df, values), codes, nquantiles, invert)
+    
+    # Number of rows in each group, kept as integers where every row has a group
+    df['num_rows'] = result['num_rows'] if (codes < 0).any() else result['num_rows'].astype(np.int64)
+    df['rank'] = result['rank']
+    df['quantile'] = result['quantile']
 
     if invert is True:
         df['qinverted'] = "lowest quantile represents highest values"
@@ -2,17 +2,30 @@
 
 import pandas as pd
 import numpy as np
-from .confidence_intervals import byars_lower, byars_upper
-from .validation import metadata_cols, ci_col, validate_data, format_args, group_args
+from . import core
+from .validation import metadata_columns, ci_columns, assign_columns, col_values, common_dtype, validate_data, format_args, group_args
+from .utils import group_sums
+from .incremental import changed_rows, finalize_groups
+from .grouping import check_grouping
+from .streaming import is_chunked, sum_chunks, GroupSums
+from .instrumentation import instrumented
+from .frames import native_frames
 
 
-def ph_rate(df, num_col, denom_col, group_cols = None, metadata = True, confidence = 0.95, multiplier = 100000):
+@instrumented
+@native_frames
+def ph_rate(df, num_col, denom_col, group_cols = None, metadata = True, confidence = 0.95, multiplier = 100000, workers = None, 
+            incremental = None, grouping = None):
     """Calculates rates uwith confidence limits using byars or exact method.
     
     Parameters
     ----------
     df
-        Dataframe containing the data to calculate rates for.
+        Dataframe containing the data to calculate rates for, or an iterable of DataFrame chunks
+        (e.g. from `pd.read_csv(chunksize=...)` or pyarrow record batches) which are validated
+        and summed within groups one chunk at a time.
+        A pyarrow Table or Polars DataFrame is used without converting it through Pandas objects,
+        and the results are returned as the same kind of frame.
     num_col : str
         Name of the column containing the observed number of cases in the sample(numerator).
     denom_col : str
@@ -27,6 +40,15 @@ def ph_rate(df, num_col, denom_col, group_cols = None, metadata = True, confiden
         Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
     multiplier : int 
         Multiplier for calculation, default is 100000 for rates per 100,000
+    workers : int
+        Number of worker processes to sum the data within groups, with the input columns
+        placed once in shared memory rather than copied to each worker. Defaults to None (no parallelism).
+    incremental : Incremental
+        Holds the previous run, so only the rows of groups whose data has changed since are
+        validated, summed, recalculated and spliced into the previous result. Defaults to None (every group is calculated).
+    grouping : Grouping
+        Group keys already factorised from the data with `Grouping(df, group_cols)`, so they aren't
+        hashed again when the same data is passed to several statistics. Defaults to None.
     
     Returns
     -------
@@ -49,31 +71,124 @@ def ph_rate(df, num_col, denom_col, group_cols = None, metadata = True, confiden
     
     # Check data and arguments
     confidence, group_cols = format_args(confidence, group_cols)
-    df = validate_data(df, num_col, group_cols, metadata, denom_col)
     
     if not isinstance(multiplier, int) or multiplier <= 0:
         raise ValueError("'Multiplier' must be a positive integer")
     
+    if is_chunked(df):
+        state = sum_chunks(df, RateState(num_col, denom_col, group_cols, metadata, multiplier, workers))
+        return state.finalize(confidence, incremental)
+    
+    if grouping is not None:
+        check_grouping(grouping, df, group_cols)
+    
+    # only the rows of groups which have changed since an incremental run are validated and summed
+    df, grouping = changed_rows(incremental, df, group_cols, False, grouping, rate_results, num_col, denom_col,
+                                metadata, confidence, multiplier)
+    
+    df = validate_data(df, num_col, group_cols, metadata, denom_col)
+
     # Grouping by temporary column to reduce duplication in code
     df, group_cols = group_args(df, group_cols, False)
 
-    df = df.groupby(group_cols)[[num_col, denom_col]].apply(lambda x: x.sum(skipna=False)).reset_index()
+    df = group_sums(df, group_cols, [num_col, denom_col], workers = workers, grouping = grouping)
+    
+    return finalize_groups(incremental, group_cols, rate_results, df, num_col, denom_col, group_cols, metadata, 
+                           confidence, multiplier)
+
+
+
+def rate_results(df, num_col, denom_col, group_cols, metadata, confidence, multiplier):
+    """Calculates rates and confidence intervals from numerators and denominators summed within groups.
+    
+    Args:
+        df: Pandas DataFrame of summed data, one row per group.
+        num_col (str), denom_col (str), metadata (bool), multiplier (int): as in `ph_rate`.
+        group_cols (list): List of column name(s) the data is grouped by.
+        confidence (list): Confidence interval(s) to use, or None.
         
-    #calculate value column
-    df['Value'] = df[num_col] / df[denom_col] * multiplier
-    
-   #calculate confidence intervals
-    if confidence is not None:
-        for c in confidence:
-            df[ci_col(c, 'lower')] = df.apply(lambda y: byars_lower(y[num_col], c), axis=1) / df[denom_col] * multiplier
-            df[ci_col(c, 'upper')] = df.apply(lambda y: byars_upper(y[num_col], c), axis=1) / df[denom_col] * multiplier
+    Returns:
+        Pandas DataFrame of calculated rates as returned by `ph_rate`.
+    """
+        
+    #calculate value and confidence intervals
+    result = core.rate_from_sums(col_values(df, num_col), col_values(df, denom_col), confidence, multiplier)
+    
+    columns = {'Value': result['value'], **ci_columns(result, confidence)}
           
     # Generate statistic and method columns
     if metadata:
-        method = np.where(df[num_col] < 10, 'Exact', 'Byars')
-        df = metadata_cols(df, f'Rate per {multiplier}', confidence, method)
+        method = np.where(result['num'] < 10, 'Exact', 'Byars')
+        columns.update(metadata_columns(f'Rate per {multiplier}', confidence, method))
         
     if group_cols == ['ph_pkg_group']:
         df = df.drop(columns='ph_pkg_group') 
     
-    return df 
+    return assign_columns(common_dtype(df, [num_col, denom_col]), columns)
+
+
+
+class RateState(GroupSums):
+    """Numerators and denominators summed within groups, which can be updated with more data,
+    merged with the state of other data (e.g. calculated on another machine) and finalised into
+    exactly the rates `ph_rate` would return for all of the data.
+    
+    Parameters
+    ----------
+    num_col : str
+        Name of the column containing the observed number of cases in the sample(numerator).
+    denom_col : str
+        Name of the column containing the number of cases in the sample(denominator).
+    group_cols : str | list
+        A string or list of column name(s) to group the data by. 
+        Defaults to None.
+    metadata : bool 
+        Whether to include information on the statistic and confidence interval methods.
+    multiplier : int 
+        Multiplier for calculation, default is 100000 for rates per 100,000
+    workers : int
+        Number of worker processes to sum each update with. Defaults to None (no parallelism).
+        
+    Examples
+    --------
+      >>> north = RateState('numerator', 'denominator', 'area').update(df_north)
+      >>> south = RateState.from_bytes(south_bytes)
+      >>> north.merge(south).finalize(confidence = [0.95, 0.998])
+    
+    """
+    
+    def __init__(self, num_col, denom_col, group_cols = None, metadata = True, multiplier = 100000, workers = None):
+        null, group_cols = format_args(None, group_cols)
+        
+        if not isinstance(multiplier, int) or multiplier <= 0:
+            raise ValueError("'Multiplier' must be a positive integer")
+        
+        super().__init__(group_cols, [num_col, denom_col], single_grp = False, workers = workers)
+        self.num_col, self.denom_col = num_col, denom_col
+        self.metadata, self.multiplier = metadata, multiplier
+        self.params = {'num_col': num_col, 'denom_col': denom_col, 'group_cols': group_cols,
+                       'metadata': metadata, 'multiplier': multiplier, 'workers': workers}
+    
+    def prepare(self, df):
+        return validate_data(df, self.num_col, self.group_cols, self.metadata, self.denom_col)
+    
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates rates with confidence limits from the summed data.
+        
+        Parameters
+        ----------
+        confidence : float
+            Confidence interval(s) to use, either as a float, list of float values or None.
+        incremental : Incremental
+            Holds the previous run, so only groups whose summed inputs have changed are recalculated.
+            
+        Returns
+        -------
+        Pandas DataFrame
+            DataFrame with calculated rates and confidence intervals, as returned by `ph_rate`.
+        """
+        confidence, null = format_args(confidence)
+        df = self.sums.drop(columns='ph_pkg_rows')
+        
+        return finalize_groups(incremental, self.keys, rate_results, df, self.num_col, self.denom_col, self.keys, self.metadata, 
+                               confidence, self.multiplier)
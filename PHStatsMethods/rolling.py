@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from .validation import format_args, check_arguments, col_values
+from .utils import group_sums
+from .grouping import Grouping
+from .instrumentation import instrumented, stage
+
+
+@instrumented
+def ph_rolling_periods(df, func, *args, sum_cols, period_col, periods = 3, group_cols = None, strata_cols = None,
+                       **kwargs):
+    """Calculates a statistic pooled over rolling windows of consecutive periods (e.g. 3 or 5 year
+    pooled rates), for every window in one call of the statistic.
+
+    The additive inputs (e.g. numerators and denominators) of each period are summed, and the
+    sums of every window are formed from cumulative sums over the periods, so the cost doesn't
+    grow with the length of the windows. The sums of every window are then passed together to
+    the statistic, grouped by the last period of the window.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data of each period.
+    func
+        Statistic to calculate, e.g. `ph_rate`, `ph_proportion`, `ph_dsr`, `ph_ISRate` or `ph_ISRatio`,
+        whose value only depends on the sums of sum_cols within each group and stratum.
+    *args
+        Arguments to call the statistic with after the data, e.g. the numerator and denominator columns.
+    sum_cols : list
+        Column name(s) of the additive inputs to pool over each window (e.g. numerators and denominators).
+    period_col : str
+        Name of column containing the period of each row, as whole numbers (e.g. years).
+    periods : int
+        Number of consecutive periods in each window. Defaults to 3.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by (e.g. area). Defaults to None.
+    strata_cols : str | list
+        A string or list of column name(s) kept apart when pooling, for statistics standardised
+        across strata (e.g. the age band, and the reference events and populations of each age band,
+        for `ph_dsr`, `ph_ISRate` and `ph_ISRatio`). Defaults to None.
+    **kwargs
+        Keyword arguments to call the statistic with, other than group_cols.
+
+    Returns
+    -------
+    Pandas DataFrame
+        The result of the statistic for every window, grouped by group_cols and period_col,
+        where period_col is the last period of the window.
+
+    Notes
+    -----
+    A window is only calculated where every one of its periods is in the data for a group and
+    stratum. Nulls in sum_cols are kept as nulls in the sums of every window containing them.
+
+    Examples
+    --------
+      >>> ph_rolling_periods(df, ph_rate, 'deaths', 'pop', sum_cols = ['deaths', 'pop'], period_col = 'year',
+                             periods = 3, group_cols = 'area')
+      >>> ph_rolling_periods(df_ages, ph_dsr, 'deaths', 'pop', 'ageband', sum_cols = ['deaths', 'pop'],
+                             period_col = 'year', periods = 5, group_cols = 'area', strata_cols = 'ageband')
+
+    """
+
+    null, group_cols = format_args(None, group_cols)
+    null, strata_cols = format_args(None, strata_cols)
+    null, sum_cols = format_args(None, sum_cols)
+
+    check_rolling(df, sum_cols, period_col, periods, group_cols, strata_cols)
+    keys = ([] if group_cols is None else group_cols) + ([] if strata_cols is None else strata_cols)
+
+    with stage('rolling_periods', rows = len(df)) as rolling:
+        # one row per series (group and stratum) and period, sorted by period within each series
+        grouping = Grouping(df, keys + [period_col])
+        sums = group_sums(df, keys + [period_col], sum_cols, grouping = grouping)
+        sums = window_sums(sums, keys, sum_cols, period_col, periods)
+
+        rolling.groups, rolling.frame = len(sums), sums
+
+    return func(sums, *args, group_cols = ([] if group_cols is None else group_cols) + [period_col], **kwargs)
+
+
+
+def window_sums(sums, keys, sum_cols, period_col, periods):
+    """Sums of each window of consecutive periods, from cumulative sums within each series.
+
+    Args:
+        sums: Pandas DataFrame of the sums of each series and period, sorted by period within series.
+        keys (list): Column name(s) of each series (the group and strata columns).
+        sum_cols (list), period_col (str), periods (int): as in `ph_rolling_periods`.
+
+    Returns:
+        Pandas DataFrame of the sums of each complete window, with the last period of the window.
+    """
+
+    period = sums[period_col].to_numpy(dtype=np.int64)
+    series = sums.groupby(keys, sort=False).ngroup().to_numpy() if keys else np.zeros(len(sums), dtype=np.int64)
+
+    # position of the first row of each window, searching on the series and period together
+    span = period.max() - period.min() + periods + 1
+    position = series * span + (period - period.min())
+    start = np.searchsorted(position, position - (periods - 1), side='left')
+    complete = np.arange(len(sums)) - start + 1 == periods
+
+    # windows starting at the first period of their series subtract nothing
+    first = np.searchsorted(series, series, side='left')
+    before = np.maximum(start - 1, 0)
+    columns = {}
+
+    for col in sum_cols:
+        values = col_values(sums, col)
+        missing = np.isnan(values)
+
+        # cumulative sums restart at each series, so rounding doesn't grow with the size of the table
+        total = pd.Series(np.where(missing, 0, values)).groupby(series).cumsum().to_numpy()
+        nulls = pd.Series(missing.astype(np.int64)).groupby(series).cumsum().to_numpy()
+
+        window = total - np.where(start > first, total[before], 0)
+        window = np.where(nulls - np.where(start > first, nulls[before], 0) > 0, np.nan, window)
+
+        if pd.api.types.is_integer_dtype(sums[col]):
+            window = window.astype(sums[col].dtype)
+
+        columns[col] = window
+
+    return sums[keys + [period_col]].assign(**columns)[complete].reset_index(drop=True)
+
+
+
+def check_rolling(df, sum_cols, period_col, periods, group_cols, strata_cols):
+    """Validates the data and windows of rolling periods.
+
+    Args:
+        As in `ph_rolling_periods`.
+    """
+
+    if sum_cols is None:
+        raise TypeError("'sum_cols' must be given")
+
+    check_arguments(df, [period_col] + sum_cols + (group_cols or []) + (strata_cols or []))
+
+    if not isinstance(periods, int) or periods < 1:
+        raise ValueError("'periods' must be a positive integer")
+
+    if not is_numeric_dtype(df[period_col]) or df[period_col].isna().any() or \
+            (df[period_col] != np.round(df[period_col])).any():
+        raise ValueError(f"'{period_col}' must contain whole numbers for every row")
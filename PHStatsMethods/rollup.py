@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+from .validation import format_args, check_arguments
+from .utils import group_sums
+from .grouping import Grouping
+from .instrumentation import instrumented, stage
+
+
+@instrumented
+def ph_rollup(df, lookup, func, *args, sum_cols, levels = None, group_cols = None, strata_cols = None,
+              level_col = 'level', area_col = 'area', **kwargs):
+    """Calculates a statistic for every level of a geographic hierarchy (e.g. LSOA, MSOA, LTLA,
+    UTLA, region and England) from data at its lowest level, in one call of the statistic.
+
+    The additive inputs (e.g. numerators and denominators) are summed up the hierarchy once, with
+    each level summed from the sums of the level below rather than from the data, and the sums
+    of every level are then passed together to the statistic, grouped by level and area.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the data at the lowest level of the hierarchy.
+    lookup
+        DataFrame mapping each area to the area containing it at each level above, with one
+        column per level (e.g. 'lsoa', 'msoa', 'ltla', 'utla', 'region', 'country').
+    func
+        Statistic to calculate, e.g. `ph_rate`, `ph_proportion`, `ph_dsr`, `ph_ISRate` or `ph_ISRatio`,
+        whose value only depends on the sums of sum_cols within each group and stratum.
+    *args
+        Arguments to call the statistic with after the data, e.g. the numerator and denominator columns.
+    sum_cols : list
+        Column name(s) of the additive inputs to sum up the hierarchy (e.g. numerators and denominators).
+    levels : list
+        Column names of the levels in lookup to calculate the statistic for, from the lowest level
+        (which must be a column of df) upwards. Defaults to None, where every column of lookup is used.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by within each area (e.g. year or sex).
+        Defaults to None.
+    strata_cols : str | list
+        A string or list of column name(s) kept apart when summing, for statistics standardised
+        across strata (e.g. the age band, and the reference events and populations of each age band,
+        for `ph_dsr`, `ph_ISRate` and `ph_ISRatio`). Defaults to None.
+    level_col, area_col : str
+        Names of the columns holding the level and area of each row of the result.
+        Defaults to 'level' and 'area'.
+    **kwargs
+        Keyword arguments to call the statistic with, other than group_cols.
+
+    Returns
+    -------
+    Pandas DataFrame
+        The result of the statistic for every area of every level, grouped by level_col, area_col
+        and group_cols, with the levels in order from the lowest.
+
+    Notes
+    -----
+    Nulls in sum_cols are kept as nulls in the sums of every area containing them.
+
+    Examples
+    --------
+      >>> lookup = pd.DataFrame({'lsoa': ['L1', 'L2', 'L3'], 'ltla': ['A', 'A', 'B'], 'region': ['R', 'R', 'R']})
+      >>> ph_rollup(df, lookup, ph_rate, 'deaths', 'pop', sum_cols = ['deaths', 'pop'], group_cols = 'year')
+      >>> ph_rollup(df_ages, lookup, ph_dsr, 'deaths', 'pop', 'ageband', sum_cols = ['deaths', 'pop'],
+                    strata_cols = 'ageband')
+
+    """
+
+    null, group_cols = format_args(None, group_cols)
+    null, strata_cols = format_args(None, strata_cols)
+    null, sum_cols = format_args(None, sum_cols)
+
+    levels = check_rollup(df, lookup, sum_cols, levels, group_cols, strata_cols, level_col, area_col)
+    keys = ([] if group_cols is None else group_cols) + ([] if strata_cols is None else strata_cols)
+
+    with stage('rollup', rows = len(df)) as rollup:
+        frames = []
+        sums = df[[levels[0]] + keys + sum_cols]
+
+        for i, level in enumerate(levels):
+            if i > 0:
+                # each area of the level below is mapped to the area containing it
+                parents = lookup[[levels[i - 1], level]].drop_duplicates().set_index(levels[i - 1])[level]
+                sums = sums.assign(**{levels[i - 1]: sums[levels[i - 1]].map(parents)}).rename(columns = {levels[i - 1]: level})
+
+            grouping = Grouping(sums, [level] + keys)
+            sums = group_sums(sums, [level] + keys, sum_cols, grouping = grouping)
+            frames.append(sums.rename(columns = {level: area_col}).assign(**{level_col: level}))
+
+        stacked = pd.concat(frames, ignore_index = True)
+        stacked[level_col] = pd.Categorical(stacked[level_col], categories = levels, ordered = True)
+        stacked = stacked[[level_col, area_col] + keys + sum_cols]
+
+        rollup.groups, rollup.frame = len(stacked), stacked
+
+    return func(stacked, *args, group_cols = [level_col, area_col] + ([] if group_cols is None else group_cols), **kwargs)
+
+
+
+def check_rollup(df, lookup, sum_cols, levels, group_cols, strata_cols, level_col, area_col):
+    """Validates the data, lookup and levels of a rollup.
+
+    Args:
+        As in `ph_rollup`.
+
+    Returns:
+        List of the levels.
+    """
+
+    if not isinstance(lookup, pd.DataFrame):
+        raise ValueError("'lookup' argument must be a Pandas DataFrame")
+
+    if sum_cols is None:
+        raise TypeError("'sum_cols' must be given")
+
+    levels = list(lookup.columns) if levels is None else levels
+
+    if not isinstance(levels, list) or len(levels) == 0:
+        raise TypeError("Pass 'levels' as a list")
+
+    check_arguments(lookup, levels)
+    check_arguments(df, [levels[0]] + sum_cols + (group_cols or []) + (strata_cols or []))
+
+    for col in [level_col, area_col]:
+        if col in sum_cols + (group_cols or []) + (strata_cols or []):
+            raise ValueError(f"'{col}' is used for the level and area of each row, so can't be a column of the data")
+
+    if df[levels[0]].isna().any() or not df[levels[0]].isin(lookup[levels[0]]).all():
+        raise ValueError(f"Every area in the '{levels[0]}' column must be in the lookup")
+
+    for child, parent in zip(levels[:-1], levels[1:]):
+        pairs = lookup[[child, parent]].drop_duplicates()
+
+        if pairs[parent].isna().any() or pairs[child].duplicated().any():
+            raise ValueError(f"Each area in '{child}' must be in exactly one area in '{parent}'")
+
+    return levels
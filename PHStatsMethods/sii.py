@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+import warnings
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from concurrent.futures import ProcessPoolExecutor
+
+from . import core
+from .validation import metadata_columns, assign_columns, ci_col, col_values, format_args, check_arguments
+from .grouping import Grouping
+from .instrumentation import instrumented, stage
+
+
+# Largest number of values drawn at once (groups x repetitions x quantiles) by each simulation chunk.
+# Chunks are split the same way whatever the number of workers, so results only depend on the seed.
+SIMULATION_CHUNK = 2**22
+
+VALUE_TYPES = {0: None, 1: 'log', 2: 'logit'}
+
+
+@instrumented
+def ph_sii(df, quantile_col, pop_col, value_col, group_cols = None, value_type = 0, se_col = None,
+           lower_cl_col = None, upper_cl_col = None, count_col = None, confidence = 0.95, multiplier = 1,
+           repetitions = 100000, rii = False, intercept = False, transform = False, seed = None,
+           workers = None, metadata = True):
+    """Calculates the Slope Index of Inequality (SII), and optionally the Relative Index of Inequality (RII),
+    with confidence limits from Monte Carlo simulation.
+
+    The SII is the slope of the population weighted regression of the value of each quantile (e.g.
+    deprivation decile) on the midpoint of its cumulative share of the population, ranked from
+    quantile 1. It is the modelled difference in value between the top (rank 1) and bottom (rank 0)
+    of the population. The regressions of every group are fitted together.
+
+    Parameters
+    ----------
+    df
+        DataFrame containing the value of each quantile in each group, with one row per quantile.
+    quantile_col : str
+        Name of column containing the quantile of each row, ranked from 1 (e.g. the most deprived).
+    pop_col : str
+        Name of column containing the population of each quantile.
+    value_col : str
+        Name of column containing the value of each quantile (e.g. life expectancy, or a rate or
+        proportion). Proportions must be between 0 and 1.
+    group_cols : str | list
+        A string or list of column name(s) to group the data by, with one SII per group.
+        Defaults to None.
+    value_type : int
+        0 for indicators which aren't rates or proportions (e.g. life expectancy), 1 for rates or
+        2 for proportions. Defaults to 0.
+    se_col : str
+        Name of column containing the standard error of each value. Defaults to None, where it is
+        calculated from the 95% confidence limits.
+    lower_cl_col, upper_cl_col : str
+        Names of columns containing the lower and upper 95% confidence limits of each value, used
+        where se_col isn't given or values are transformed. Defaults to None.
+    count_col : str
+        Name of column containing the count of each proportion, used to calculate 95% confidence
+        limits with the Wilson Score method where no standard errors or confidence limits are
+        given. Defaults to None.
+    confidence : float
+        Confidence interval(s) to use, either as a float, list of float values or None.
+        Confidence intervals must be between 0.9 and 1. Defaults to 0.95 (2 std from mean).
+    multiplier : int | float
+        Multiplier used to express the SII (e.g. 100 to express a proportion as a percentage).
+        A negative multiplier reverses the direction of the SII and RII. Defaults to 1.
+    repetitions : int
+        Number of simulations used to calculate the confidence limits. Defaults to 100000.
+    rii : bool
+        Whether to return the RII, the ratio of the modelled values at the top and bottom of the population.
+    intercept : bool
+        Whether to return the intercept, the modelled value at the bottom of the population.
+    transform : bool
+        Whether to fit the regression to the log of rates (value_type 1) or the logit of proportions
+        (value_type 2), so that modelled values stay positive (and below 1 for proportions).
+        Requires confidence limits (or counts for proportions).
+    seed : int
+        Seed of the simulations, so the confidence limits can be reproduced. The confidence limits are
+        the same whatever the number of workers. Defaults to None (not reproducible).
+    workers : int
+        Number of worker processes to run the simulations in. Defaults to None (no parallelism).
+    metadata : bool
+        Whether to include information on the statistic and confidence interval methods.
+
+    Returns
+    -------
+    Pandas DataFrame
+        DataFrame of the SII (and RII and intercept) of each group with confidence intervals.
+
+    Notes
+    -----
+    The values of each quantile are simulated from normal distributions with their standard errors
+    (on the log or logit scale if transformed), the regression is refitted to each simulation, and
+    the confidence limits are the percentiles of the simulated SIIs (1). Where values are
+    transformed, the SII is the difference and the RII the ratio of the back-transformed fitted
+    values at the top and bottom of the population.
+
+    Groups with missing populations, values or standard errors are returned with null values and a warning.
+
+    References
+    ----------
+    (1) Low A, Low A. Measuring the gap: quantifying and comparing local health inequalities.
+        Journal of Public Health; 2004; 26: 388-395.
+
+    Examples
+    --------
+      >>> ph_sii(df, 'decile', 'population', 'life_expectancy', ['area', 'sex'],
+                 lower_cl_col = 'lower', upper_cl_col = 'upper', rii = True, seed = 42)
+
+    """
+
+    confidence, group_cols = format_args(confidence, group_cols)
+
+    check_sii(df, quantile_col, pop_col, value_col, group_cols, value_type, se_col, lower_cl_col, upper_cl_col,
+              count_col, multiplier, repetitions, rii, intercept, transform, metadata)
+
+    with stage('validate', rows = len(df)):
+        # group codes, dropping rows without a group as in pandas.groupby
+        if group_cols is not None:
+            grouping = Grouping(df, group_cols)
+            codes, keys = grouping.codes, grouping.keys
+        else:
+            codes, keys = np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=range(1))
+
+        keep = codes >= 0
+        codes, quantiles = codes[keep], col_values(df, quantile_col)[keep]
+        ngroups = len(keys)
+
+        # position of each quantile within its group, in order
+        order = np.lexsort((quantiles, codes))
+        codes, quantiles = codes[order], quantiles[order]
+        starts = np.searchsorted(codes, np.arange(ngroups))
+        position = np.arange(len(codes)) - starts[codes]
+
+        if np.isnan(quantiles).any() or (np.diff(quantiles)[np.diff(codes) == 0] == 0).any():
+            raise ValueError('There must be one row with a quantile for each quantile in each group')
+
+        transform = VALUE_TYPES[value_type] if transform else None
+        values, se = sii_inputs(df[keep].iloc[order], pop_col, value_col, value_type, se_col, lower_cl_col,
+                                upper_cl_col, count_col, transform)
+
+        # populations, values and standard errors of each group (rows) and quantile (columns)
+        shape = (ngroups, position.max() + 1 if len(position) else 0)
+        dense = {}
+        for name, col in [('pops', col_values(df[keep], pop_col)[order]), ('values', values), ('se', se)]:
+            dense[name] = np.zeros(shape)
+            dense[name][codes, position] = col
+
+        missing = np.zeros(ngroups, dtype=bool)
+        for col in dense.values():
+            missing |= ~np.isfinite(col).all(axis=1)
+        missing |= np.bincount(codes, minlength=ngroups) < 2
+
+        for col in dense.values():
+            col[missing] = 0
+        dense['pops'][missing, 0] = 1
+
+    if missing.any():
+        warnings.warn('The SII was not calculated for one or more groups with missing populations, values or '
+                      'standard errors, or fewer than 2 quantiles', UserWarning)
+
+    with stage('sii', rows = len(codes), groups = ngroups), np.errstate(divide='ignore', invalid='ignore'):
+        intercept_weights, slope_weights = core.sii_weights(dense['pops'])
+
+        fitted_bottom = core.inverse_transform((intercept_weights * dense['values']).sum(axis=1), transform)
+        fitted_top = core.inverse_transform(((intercept_weights + slope_weights) * dense['values']).sum(axis=1),
+                                            transform)
+
+        levels = confidence if confidence is not None else []
+        sims = simulate(dense['values'], dense['se'], intercept_weights, slope_weights, repetitions, seed,
+                        transform, workers) if levels else None
+
+    with stage('results', groups = ngroups) as results:
+        columns = sii_columns(fitted_bottom, fitted_top, sims, levels, multiplier, rii, intercept)
+
+        for col in columns.values():
+            col[missing] = np.nan
+
+        if metadata:
+            columns.update(metadata_columns('SII', confidence, f'Monte Carlo simulation ({repetitions} repetitions)'))
+
+        df = results.frame = assign_columns(keys, columns)
+
+    return df
+
+
+
+def check_sii(df, quantile_col, pop_col, value_col, group_cols, value_type, se_col, lower_cl_col, upper_cl_col,
+              count_col, multiplier, repetitions, rii, intercept, transform, metadata):
+    """Validates the arguments and data of `ph_sii`.
+
+    Args:
+        As in `ph_sii`.
+    """
+
+    cols = [quantile_col, pop_col, value_col] + [col for col in [se_col, lower_cl_col, upper_cl_col, count_col]
+                                                  if col is not None]
+    check_arguments(df, cols if group_cols is None else cols + group_cols, metadata)
+
+    for col in cols:
+        if not is_numeric_dtype(df[col]):
+            raise TypeError(f"'{col}' column must be a numeric data type")
+
+    for col in [pop_col, se_col, count_col]:
+        if col is not None and (df[col] < 0).any():
+            raise ValueError('No negative numbers can be used to calculate these statistics')
+
+    if value_type not in VALUE_TYPES:
+        raise ValueError("'value_type' must be 0, 1 (rates) or 2 (proportions)")
+
+    if value_type == 2:
+        for col in [value_col, lower_cl_col, upper_cl_col]:
+            if col is not None and ((df[col] < 0) | (df[col] > 1)).any():
+                raise ValueError('Proportions and their confidence limits must be between 0 and 1')
+
+    if (lower_cl_col is None) != (upper_cl_col is None):
+        raise ValueError("Both 'lower_cl_col' and 'upper_cl_col' must be given")
+
+    if count_col is not None and value_type != 2:
+        raise ValueError("'count_col' can only be given for proportions (value_type 2)")
+
+    if se_col is None and lower_cl_col is None and count_col is None:
+        raise ValueError("'se_col', or 'lower_cl_col' and 'upper_cl_col', must be given (or 'count_col' for proportions)")
+
+    if not isinstance(transform, bool) or not isinstance(rii, bool) or not isinstance(intercept, bool):
+        raise TypeError("'transform', 'rii' and 'intercept' must be either True or False")
+
+    if transform:
+        if value_type == 0:
+            raise ValueError("'transform' can only be used for rates (value_type 1) and proportions (value_type 2)")
+
+        if lower_cl_col is None and count_col is None:
+            raise ValueError("Confidence limits (or counts for proportions) must be given to transform values")
+
+    if not isinstance(multiplier, (int, float)) or multiplier == 0:
+        raise ValueError("'multiplier' must be a non-zero number")
+
+    if not isinstance(repetitions, int) or repetitions < 1000:
+        raise ValueError("'repetitions' must be an integer of at least 1000")
+
+
+
+def sii_inputs(df, pop_col, value_col, value_type, se_col, lower_cl_col, upper_cl_col, count_col, transform):
+    """Values and their standard errors, on the log or logit scale if transformed.
+
+    Args:
+        df: Pandas DataFrame.
+        Other arguments as in `ph_sii`, with transform as 'log', 'logit' or None.
+
+    Returns:
+        NumPy arrays of values and standard errors.
+    """
+
+    values = col_values(df, value_col)
+    z = core.norm_ppf(0.975)
+
+    if se_col is not None and transform is None:
+        return values, col_values(df, se_col)
+
+    if lower_cl_col is not None:
+        lower, upper = col_values(df, lower_cl_col), col_values(df, upper_cl_col)
+    else:
+        lower, upper = core.wilson_bounds(col_values(df, count_col), col_values(df, pop_col), 0.95)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if transform == 'log':
+            values, lower, upper = np.log(values), np.log(lower), np.log(upper)
+        elif transform == 'logit':
+            values, lower, upper = [np.log(x / (1 - x)) for x in [values, lower, upper]]
+
+    return values, (upper - lower) / (2 * z)
+
+
+
+def simulate(values, se, intercept_weights, slope_weights, repetitions, seed, transform = None, workers = None):
+    """Simulated SIIs and RIIs of each group, in chunks of repetitions which are each seeded from
+    the seed, so the simulations are the same whatever the number of workers.
+
+    Args:
+        values, se, intercept_weights, slope_weights, transform: as in `core.sii_simulation`.
+        repetitions (int), seed (int), workers (int): as in `ph_sii`.
+
+    Returns:
+        Simulated SIIs and RIIs, each as a (groups x repetitions) array.
+    """
+
+    if workers is not None and (not isinstance(workers, int) or workers <= 0):
+        raise ValueError("'workers' must be a positive integer")
+
+    chunk = max(SIMULATION_CHUNK // max(values.size, 1), 1)
+    sizes = [min(chunk, repetitions - start) for start in range(0, repetitions, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(values, se, intercept_weights, slope_weights, size, child, transform) for size, child in zip(sizes, seeds)]
+
+    if workers is not None and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(min(workers, len(sizes))) as pool:
+            parts = list(pool.map(core.sii_simulation, *zip(*args)))
+    else:
+        parts = [core.sii_simulation(*arg) for arg in args]
+
+    return np.concatenate([p[0] for p in parts], axis=1), np.concatenate([p[1] for p in parts], axis=1)
+
+
+
+def sii_columns(bottom, top, sims, confidence, multiplier, rii, intercept):
+    """SII, RII and intercept columns of each group, with confidence intervals from the simulations.
+
+    Args:
+        bottom, top: NumPy arrays of the fitted values at the bottom and top of the population.
+        sims (tuple): Simulated SIIs and RIIs from `simulate`, or None.
+        confidence (list): Confidence interval(s) to use.
+        multiplier (float), rii (bool), intercept (bool): as in `ph_sii`.
+
+    Returns:
+        dict of column names and arrays.
+    """
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns = {'sii': (top - bottom) * multiplier}
+
+        for c in confidence:
+            lower, upper = np.quantile(sims[0], [(1 - c) / 2, 1 - (1 - c) / 2], axis=1) * multiplier
+            columns[f'sii_{ci_col(c, "lower")}'] = np.minimum(lower, upper)
+            columns[f'sii_{ci_col(c, "upper")}'] = np.maximum(lower, upper)
+
+        if rii:
+            # a negative multiplier reverses the direction of the ratio
+            power = 1 if multiplier > 0 else -1
+            columns['rii'] = (top / bottom) ** power
+
+            for c in confidence:
+                lower, upper = np.quantile(sims[1], [(1 - c) / 2, 1 - (1 - c) / 2], axis=1) ** power
+                columns[f'rii_{ci_col(c, "lower")}'] = np.minimum(lower, upper)
+                columns[f'rii_{ci_col(c, "upper")}'] = np.maximum(lower, upper)
+
+        if intercept:
+            columns['intercept'] = bottom * abs(multiplier)
+
+    return columns
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import pandas as pd
+
+from .validation import check_arguments
+from .utils import map_euro_standard_pops
+from .rates import RateState
+from .proportions import ProportionState
+from .DSR import DSRState
+from .ISRate import ISRateState
+from .ISRatio import ISRatioState
+from .instrumentation import instrumented, stage
+
+
+# states of the statistics whose sums can be calculated in the database, by statistic
+STATES = {'ph_rate': RateState, 'ph_proportion': ProportionState, 'ph_dsr': DSRState,
+          'ph_ISRate': ISRateState, 'ph_ISRatio': ISRatioState}
+
+
+@instrumented
+def ph_from_sql(connection, table, func, *args, where = None, params = None, **kwargs):
+    """Calculates a statistic from a table in a database, summing the data within groups in the
+    database so only one row per group is returned to Python.
+
+    The sums the statistic is calculated from (e.g. the numerators and denominators, the weighted
+    rate terms of DSRs or the expected events of indirectly standardised rates) are compiled into
+    a single GROUP BY query, along with the checks made on the data, and run on the connection.
+    The confidence intervals and metadata are then calculated from the sums exactly as for the
+    statistic calculated on the data in Python.
+
+    Parameters
+    ----------
+    connection
+        DB-API connection to the database, e.g. from `sqlite3.connect` or `duckdb.connect`.
+    table : str
+        Table (or view) containing the data, as written in the query's FROM clause (e.g. 'deaths',
+        'main.deaths', or a subquery in brackets).
+    func
+        Statistic to calculate: `ph_rate`, `ph_proportion`, `ph_dsr`, `ph_ISRate` or `ph_ISRatio`.
+    *args
+        Arguments to call the statistic with after the data, e.g. the numerator and denominator columns.
+    where : str
+        SQL condition selecting the rows of the table to use (e.g. 'year >= ?'). Defaults to None.
+    params : list
+        Values of the placeholders in where, in the parameter style of the connection.
+    **kwargs
+        Keyword arguments to call the statistic with (e.g. group_cols and confidence).
+
+    Returns
+    -------
+    Pandas DataFrame
+        The result of the statistic, as returned by func.
+
+    Notes
+    -----
+    Reference data given as DataFrames (ref_df and obs_df) can't be joined in the database, so
+    must be joined to the table (or a view) first. Ungrouped rates and proportions are calculated
+    for each row, so every selected row is returned.
+
+    Examples
+    --------
+      >>> connection = sqlite3.connect('deaths.db')
+      >>> ph_from_sql(connection, 'deaths', ph_rate, 'deaths', 'pop', group_cols = ['year', 'area'])
+      >>> ph_from_sql(connection, 'deaths', ph_dsr, 'deaths', 'pop', 'ageband', group_cols = 'area',
+                      where = 'year = ?', params = [2023])
+
+    """
+
+    if func.__name__ not in STATES:
+        raise ValueError(f"'{func.__name__}' can't be calculated in a database; use one of {', '.join(STATES)}")
+
+    arguments = inspect.signature(func).bind(None, *args, **kwargs)
+    arguments.apply_defaults()
+    arguments = arguments.arguments
+
+    if arguments.get('kwargs'):
+        raise ValueError('Reference data given as DataFrames can\'t be joined in the database, so join it to the table first')
+
+    state_cls = STATES[func.__name__]
+    state = state_cls(**{key: arguments[key] for key in inspect.signature(state_cls).parameters if key in arguments})
+    params = [] if params is None else list(params)
+
+    columns = table_columns(connection, table)
+    check_arguments(pd.DataFrame(columns = columns), state_columns(state) + ([] if state.group_cols is None else state.group_cols),
+                    state.metadata)
+
+    with stage('sql', rows = None) as sql:
+        if state.per_row:
+            # every row is its own group, so the rows are validated and added as they are
+            query = f'SELECT {", ".join(quote(col) for col in state_columns(state))} FROM {table}' + \
+                (f' WHERE {where}' if where is not None else '')
+            state.update(fetch(connection, query, params))
+        else:
+            query, checks = aggregate_query(connection, state, table, where, params)
+            state.partials = [check_sums(fetch(connection, query, params), checks)]
+            state.n_rows = int(state.partials[0]['ph_pkg_rows'].sum())
+
+        sql.groups, sql.frame = len(state.sums), state.sums
+
+    return state.finalize(arguments['confidence'], arguments['incremental'])
+
+
+
+def quote(name):
+    """Quotes a column name as an SQL identifier."""
+
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+
+def literal(value):
+    """Writes a number or string as an SQL literal."""
+
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+
+def fetch(connection, query, params = None):
+    """Runs a query on a DB-API connection, returning the rows as a Pandas DataFrame."""
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(query, [] if params is None else params)
+        columns = [description[0] for description in cursor.description]
+
+        return pd.DataFrame.from_records(cursor.fetchall(), columns = columns)
+    finally:
+        cursor.close()
+
+
+
+def table_columns(connection, table):
+    """Column names of a table, without reading its rows."""
+
+    return list(fetch(connection, f'SELECT * FROM {table} WHERE 1 = 0').columns)
+
+
+
+def state_columns(state):
+    """Columns of the data a state sums, including the age bands and reference populations used."""
+
+    if isinstance(state, DSRState):
+        return [state.num_col, state.denom_col, state.age_col]
+
+    if isinstance(state, ISRateState):
+        return [state.num_col, state.denom_col, state.ref_num_col, state.ref_denom_col]
+
+    return [state.num_col, state.denom_col]
+
+
+
+def sql_terms(connection, state, table, where, params):
+    """SQL expressions of the columns a state sums, calculated from each row as in the `prepare`
+    method of the state, and the checks made on each row with their error messages.
+
+    Args:
+        connection: DB-API connection.
+        state: GroupSums state of the statistic.
+        table (str), where (str), params (list): as in `ph_from_sql`.
+
+    Returns:
+        Dict of SQL expressions by column name, and a dict of error messages by SQL condition
+        which is true for rows failing the check.
+    """
+
+    num, denom = quote(state.num_col), quote(state.denom_col)
+    checks = {}
+
+    if isinstance(state, ISRateState):
+        ref_num, ref_denom = quote(state.ref_num_col), quote(state.ref_denom_col)
+
+        # in the order `isr_terms` validates the reference columns, observed events and populations
+        checks[f'{ref_num} < 0 OR {ref_denom} < 0'] = 'No negative numbers can be used to calculate these statistics'
+        checks[f'{ref_denom} <= 0'] = 'Denominators must be greater than zero'
+        checks[f'{num} < 0 OR {denom} < 0'] = 'No negative numbers can be used to calculate these statistics'
+
+        return {state.num_col: num, state.ref_num_col: ref_num, state.ref_denom_col: ref_denom,
+                'exp_x': f'CAST(COALESCE({ref_num}, 0) AS DOUBLE) / {ref_denom} * COALESCE({denom}, 0)'}, checks
+
+    checks[f'{num} < 0 OR {denom} < 0'] = 'No negative numbers can be used to calculate these statistics'
+    checks[f'{denom} <= 0'] = 'Denominators must be greater than zero'
+
+    if isinstance(state, ProportionState):
+        checks[f'{num} > {denom}'] = 'Numerators must be less than or equal to the denominator for a proportion statistic'
+
+    if not isinstance(state, DSRState):
+        return {state.num_col: num, state.denom_col: denom}, checks
+
+    ref = quote(state.ref_denom_col)
+
+    if state.euro_standard_pops:
+        # the European Standard Population of each age band in the selected rows, matched as for chunked data
+        age = quote(state.age_col)
+        ages = fetch(connection, f'SELECT DISTINCT {age} FROM {table}' + (f' WHERE {where}' if where is not None else ''),
+                     params).dropna()
+        ages = map_euro_standard_pops(ages, state.age_col)
+
+        ref = f'CASE {age} ' + ' '.join(f'WHEN {literal(band)} THEN {literal(pop)}'
+                                        for band, pop in zip(ages[state.age_col], ages['euro_standard_pops'])) + ' END'
+
+    return {state.num_col: num, state.denom_col: denom, state.ref_denom_col: ref,
+            'wt_rate': f'CAST(COALESCE({num}, 0) AS DOUBLE) * {ref} / {denom}',
+            'sq_rate': f'CAST(COALESCE({num}, 0) AS DOUBLE) * ((CAST({ref} AS DOUBLE) / {denom}) * (CAST({ref} AS DOUBLE) / {denom}))'}, checks
+
+
+
+def aggregate_query(connection, state, table, where = None, params = None):
+    """Compiles the sums of a state within groups into a GROUP BY query.
+
+    Columns in the `skipna_cols` of the state are summed with nulls as zero, and the sums of other
+    columns are null where any row of the group is null, as in `group_sums`. Rows with a null group
+    key are left out, as in `pandas.groupby`.
+
+    Args:
+        connection: DB-API connection.
+        state: GroupSums state of the statistic.
+        table (str), where (str), params (list): as in `ph_from_sql`.
+
+    Returns:
+        The query (str), and a dict of error messages by the name of the column counting the rows
+        failing each check.
+    """
+
+    terms, conditions = sql_terms(connection, state, table, where, params)
+    keys = [] if state.group_cols is None else [quote(col) for col in state.group_cols]
+
+    select = list(keys) if keys else ['0 AS "ph_pkg_group"']
+
+    for col in state.sum_cols[:-1]:
+        if col in state.skipna_cols:
+            select.append(f'COALESCE(SUM({terms[col]}), 0) AS {quote(col)}')
+        else:
+            select.append(f'CASE WHEN COUNT({terms[col]}) = COUNT(*) THEN SUM({terms[col]}) END AS {quote(col)}')
+
+    select.append('COUNT(*) AS "ph_pkg_rows"')
+    checks = {}
+
+    for i, (condition, message) in enumerate(conditions.items()):
+        select.append(f'SUM(CASE WHEN {condition} THEN 1 ELSE 0 END) AS "ph_pkg_check_{i}"')
+        checks[f'ph_pkg_check_{i}'] = message
+
+    filters = ([f'({where})'] if where is not None else []) + [f'{key} IS NOT NULL' for key in keys]
+    query = f'SELECT {", ".join(select)} FROM {table}'
+
+    if filters:
+        query += ' WHERE ' + ' AND '.join(filters)
+
+    if keys:
+        query += f' GROUP BY {", ".join(keys)} ORDER BY {", ".join(keys)}'
+
+    return query, checks
+
+
+
+def check_sums(df, checks):
+    """Raises the error of any check failed by a row of the data, returning the sums without the checks.
+
+    Args:
+        df: Pandas DataFrame returned by the query of `aggregate_query`.
+        checks (dict): Error messages by the name of the column counting the rows failing each check.
+    """
+
+    if len(df) == 0:
+        raise ValueError('No rows of the table were selected')
+
+    for col, message in checks.items():
+        if df[col].fillna(0).sum() > 0:
+            raise ValueError(message)
+
+    return df.drop(columns = list(checks))
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+import abc
+import io
+import json
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from .utils import group_sums
+from .validation import group_args
+
+
+def is_chunked(df):
+    """Whether data has been given as an iterable of chunks rather than a single DataFrame.
+
+    Args:
+        df: Pandas DataFrame, or iterable of DataFrame chunks (e.g. `pd.read_csv(chunksize=...)`).
+
+    Returns:
+        bool
+    """
+
+    if isinstance(df, (pd.DataFrame, str, bytes, dict)):
+        return False
+
+    return hasattr(df, '__iter__') or hasattr(df, 'to_batches')
+
+
+
+def iter_frames(chunks):
+    """Yields each chunk as a Pandas DataFrame, converting Arrow record batches and tables.
+
+    Args:
+        chunks: iterable of Pandas DataFrames or objects with a `to_pandas` method
+            (e.g. pyarrow RecordBatch), or a pyarrow Table.
+    """
+
+    # pyarrow Tables and Datasets stream their record batches
+    if hasattr(chunks, 'to_batches'):
+        chunks = chunks.to_batches()
+
+    for chunk in chunks:
+        if hasattr(chunk, 'to_pandas') and not isinstance(chunk, pd.DataFrame):
+            chunk = chunk.to_pandas()
+
+        if not isinstance(chunk, pd.DataFrame):
+            raise ValueError("'df' argument must be a Pandas DataFrame or an iterable of DataFrame chunks")
+
+        yield chunk
+
+
+
+def check_group_rows(df, rows_per_group, message):
+    """Checks every group in summed chunks was made up of the same, expected number of rows.
+
+    Args:
+        df: Pandas DataFrame of summed chunks including the 'ph_pkg_rows' column.
+        rows_per_group (int): Number of rows expected per group.
+        message (str): Error message if groups have the same but unexpected number of rows.
+    """
+
+    if df['ph_pkg_rows'].nunique() > 1:
+        raise ValueError('There must be the same number of rows per group')
+
+    if (df['ph_pkg_rows'] != rows_per_group).any():
+        raise ValueError(message)
+
+
+
+def encode_column(series):
+    """Converts a column to a NumPy array which can be saved without pickling."""
+
+    if is_numeric_dtype(series):
+        values = series.to_numpy()
+        return values if values.dtype != object else series.to_numpy(dtype=float, na_value=np.nan)
+
+    return series.astype(str).to_numpy(dtype=str)
+
+
+
+def pack_frames(meta, frames):
+    """Serialises DataFrames and a dictionary of JSON metadata to compressed NumPy arrays, without pickling.
+
+    Args:
+        meta (dict): JSON serialisable metadata.
+        frames (dict): Pandas DataFrames by name.
+
+    Returns:
+        bytes
+    """
+
+    meta = {**meta, 'columns': {name: list(frame.columns) for name, frame in frames.items()}}
+    arrays = {f'{name}_{i}': encode_column(frame[col])
+              for name, frame in frames.items() for i, col in enumerate(frame.columns)}
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+
+    return buffer.getvalue()
+
+
+
+def same_params(params, other):
+    """Whether two states were created with the same arguments, ignoring the number of workers.
+    Reference DataFrames are compared as they are serialised, so restored states still match."""
+
+    params, other = [{key: value for key, value in p.items() if key != 'workers'} for p in (params, other)]
+
+    if params.keys() != other.keys():
+        return False
+
+    for key, value in params.items():
+        if isinstance(value, pd.DataFrame) or isinstance(other[key], pd.DataFrame):
+            frames = [pd.DataFrame({col: encode_column(frame[col]) for col in frame.columns})
+                      if isinstance(frame, pd.DataFrame) else frame for frame in (value, other[key])]
+            if not all(isinstance(frame, pd.DataFrame) for frame in frames) or not frames[0].equals(frames[1]):
+                return False
+        elif value != other[key]:
+            return False
+
+    return True
+
+
+
+def unpack_frames(data):
+    """Restores the metadata and DataFrames serialised with `pack_frames`.
+
+    Args:
+        data (bytes): Serialised frames.
+
+    Returns:
+        The metadata (dict) and the DataFrames by name (dict).
+    """
+
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        meta = json.loads(arrays['meta'].tobytes())
+        frames = {name: pd.DataFrame({col: arrays[f'{name}_{i}'] for i, col in enumerate(cols)})
+                  for name, cols in meta.pop('columns').items()}
+
+    return meta, frames
+
+
+
+class GroupSums(abc.ABC):
+    """Columns summed within groups, which can be updated with more data and merged with the sums
+    of other data. Only the sums are held in memory, so data larger than the memory available can
+    be summed one chunk at a time as long as the number of groups is not too large.
+
+    Statistics subclass this, adding their own `prepare` and `finalize` methods and the `params`
+    (their arguments) used to serialise them.
+
+    Args:
+        group_cols (list): List of column name(s) to group the data by, or None.
+        sum_cols (list): List of column name(s) to sum within each group.
+        skipna_cols (list): Column name(s) in sum_cols where nulls are treated as zero.
+        single_grp (bool): As in `group_args`, whether ungrouped data forms a single group (True)
+            or each row is its own group (False).
+        workers (int): Number of worker processes used to sum each update.
+        reduce_every (int): Number of partial sums held before they are combined.
+    """
+
+    def __init__(self, group_cols, sum_cols, skipna_cols = None, single_grp = True, workers = None, reduce_every = 16):
+        self.group_cols = group_cols
+        self.keys = ['ph_pkg_group'] if group_cols is None else group_cols
+        self.sum_cols = sum_cols + ['ph_pkg_rows']
+        self.skipna_cols = ([] if skipna_cols is None else skipna_cols) + ['ph_pkg_rows']
+        self.single_grp = single_grp
+        self.workers = workers
+        self.reduce_every = reduce_every
+        
+        # every row is its own group, so there is nothing to combine between updates
+        self.per_row = group_cols is None and not single_grp
+        self.n_rows = 0
+        self.partials = []
+        self.params = {}
+
+    def prepare(self, df):
+        """Validates data and adds any derived columns to sum; overridden by each statistic."""
+        return df
+
+    @abc.abstractmethod
+    def finalize(self, confidence = 0.95, incremental = None):
+        """Calculates the statistic from the sums; implemented by each statistic."""
+
+    def partial(self, df):
+        """Sums prepared data within groups."""
+        return group_sums(df, self.keys, self.sum_cols, self.skipna_cols, self.workers)
+
+    def combine(self, partials):
+        """Combines partial sums into one row per group."""
+        return group_sums(pd.concat(partials, ignore_index=True), self.keys, self.sum_cols, self.skipna_cols)
+
+    def add(self, partial):
+        self.partials.append(partial)
+
+        if len(self.partials) >= self.reduce_every and not self.per_row:
+            self.partials = [self.combine(self.partials)]
+
+    def update(self, df):
+        """Validates data and adds its sums to the state.
+
+        Args:
+            df: Pandas DataFrame (or pyarrow record batch) of data to add.
+
+        Returns:
+            The updated state.
+        """
+        
+        df = next(iter_frames([df]))
+        df = self.prepare(df)
+        df, keys = group_args(df, self.group_cols, self.single_grp)
+
+        if self.per_row:
+            df['ph_pkg_group'] = df['ph_pkg_group'] + self.n_rows
+
+        self.n_rows += len(df)
+        df['ph_pkg_rows'] = 1
+        self.add(self.partial(df))
+
+        return self
+
+    def merge(self, other):
+        """Adds the sums of another state of the same statistic, created with the same arguments
+        (other than the number of workers), to this state.
+
+        Args:
+            other: State to merge, which is left unchanged.
+
+        Returns:
+            The updated state.
+        """
+        
+        if type(other) is not type(self):
+            raise TypeError(f'Only a {type(self).__name__} can be merged into a {type(self).__name__}')
+
+        if not same_params(self.params, other.params):
+            raise ValueError('Only states created with the same arguments can be merged')
+
+        for partial in other.partials:
+            partial = partial.copy()
+
+            if self.per_row:
+                partial['ph_pkg_group'] = partial['ph_pkg_group'] + self.n_rows
+
+            self.add(partial)
+
+        self.n_rows += other.n_rows
+
+        return self
+
+    @property
+    def sums(self):
+        """Pandas DataFrame of the sums within each group, including 'ph_pkg_rows' (number of rows in each group)."""
+        
+        if len(self.partials) == 0:
+            raise ValueError('No data has been added')
+
+        if self.per_row:
+            self.partials = [pd.concat(self.partials, ignore_index=True)]
+        elif len(self.partials) > 1:
+            self.partials = [self.combine(self.partials)]
+
+        return self.partials[0]
+
+    def to_bytes(self):
+        """Serialises the state to compact bytes: its arguments and sums are stored as compressed
+        NumPy arrays (without pickling), so states can be sent between machines and merged.
+        Columns which are not numeric are restored as strings.
+
+        Returns:
+            bytes
+        """
+
+        frames = {'sums': self.sums}
+        params = {}
+
+        # reference data given as keyword arguments is stored alongside the sums
+        for key, value in self.params.items():
+            if isinstance(value, pd.DataFrame):
+                frames[key] = value
+            else:
+                params[key] = value
+
+        return pack_frames({'state': type(self).__name__, 'params': params, 'n_rows': self.n_rows}, frames)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Restores a state serialised with `to_bytes`.
+
+        Args:
+            data (bytes): Serialised state.
+
+        Returns:
+            The restored state.
+        """
+
+        meta, frames = unpack_frames(data)
+
+        if meta.get('state') != cls.__name__:
+            raise ValueError(f"Serialised state is a {meta.get('state')}, not a {cls.__name__}")
+
+        state = cls(**meta['params'], **{key: frame for key, frame in frames.items() if key != 'sums'})
+        state.partials = [frames['sums']]
+        state.n_rows = meta['n_rows']
+
+        return state
+
+
+
+def sum_chunks(chunks, state):
+    """Updates a GroupSums state with each chunk of data.
+
+    Args:
+        chunks: iterable of DataFrame chunks.
+        state: GroupSums state of the statistic.
+
+    Returns:
+        The updated state.
+    """
+
+    for chunk in iter_frames(chunks):
+        state.update(chunk)
+
+    if len(state.partials) == 0:
+        raise ValueError('No data was given in the chunks')
+
+    return state
@@ -27,6 +27,11 @@ class Test_DSR:
         df = ph_dsr(self.data, 'count', 'pop', 'ageband', group_cols='area').drop(['Confidence', 'Statistic'], axis=1)
         assert_frame_equal(df, self.results.iloc[4:7, self.cols_95].reset_index(drop=True))
     
+    def test_data_unchanged(self):
+        data = self.data.copy()
+        ph_dsr(data, 'count', 'pop', 'ageband', group_cols='area')
+        assert_frame_equal(data, self.data)
+    
     def test_2cis(self):
         df = ph_dsr(self.data, 'count', 'pop', 'ageband', group_cols='area', confidence = [0.95, 0.998]).drop(['Confidence', 'Statistic'], axis=1)
         assert_frame_equal(df, self.results.iloc[4:7, :].reset_index(drop=True))
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..batch import Batch
+from ..cache import ResultCache
+from ..instrumentation import instrument
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..means import ph_mean
+from ..quantiles import ph_quantile
+from ..DSR import ph_dsr
+from ..ISRatio import ph_ISRatio
+from ..funnels import calculate_funnel_limits
+
+
+class Test_batch:
+
+    path = Path(__file__).parent / 'test_data'
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+
+    def add_calls(self, batch, rate_data, dsr_data):
+        batch.add('rate', ph_rate, rate_data, 'Numerator', 'Denominator', 'Area')
+        batch.add('proportion', ph_proportion, self.prop_data, 'Numerator', 'Denominator', 'Area', multiplier = 100)
+        batch.add('mean', ph_mean, rate_data, 'Numerator', 'Area')
+        batch.add('quantile', ph_quantile, rate_data, 'Numerator', nquantiles = 3)
+        batch.add('funnel', calculate_funnel_limits, rate_data.dropna(), 'Numerator', 'proportion', 100,
+                  denom_col = 'Denominator')
+        batch.add('dsr', ph_dsr, dsr_data, 'count', 'pop', 'ageband', group_cols = 'area')
+        batch.add('isratio', ph_ISRatio, dsr_data, 'count', 'pop', 'count', 'pop')
+
+        return batch
+
+    def test_results(self):
+        # the calls share the same DataFrames, which aren't changed
+        rate_data, dsr_data = self.rate_data.copy(), self.dsr_data.copy()
+        batch = self.add_calls(Batch(), rate_data, dsr_data)
+        results = batch.run(threads = 4)
+
+        assert list(results) == list(batch.calls)
+        assert_frame_equal(rate_data, self.rate_data)
+        assert_frame_equal(dsr_data, self.dsr_data)
+
+        for name, (func, args, kwargs) in batch.calls.items():
+            assert_frame_equal(results[name], func(*args, **kwargs))
+
+    def test_shared_frame(self):
+        df = pd.DataFrame({'area': np.arange(2000) % 50, 'num': np.arange(2000) % 7 + 1.0, 'den': 1000.0})
+        batch = Batch()
+
+        for i in range(16):
+            batch.add(i, ph_rate, df, 'num', 'den', None if i % 2 else 'area', confidence = [0.95, 0.998])
+
+        results = batch.run(threads = 8)
+
+        assert list(df.columns) == ['area', 'num', 'den']
+        for i in range(2):
+            assert all(results[i].equals(results[j]) for j in range(i, 16, 2))
+
+    def test_instrument(self):
+        batch = self.add_calls(Batch(), self.rate_data, self.dsr_data)
+
+        # the stages of calls in the batch's threads are reported to listeners attached around the run
+        with instrument() as summary:
+            batch.run(threads = 4)
+
+        totals = [e.function for e in summary.events if e.stage == 'total']
+        assert sorted(totals) == sorted(func.__name__ for func, args, kwargs in batch.calls.values())
+
+    def test_cache(self):
+        cache = ResultCache()
+        batch = Batch().add('a', ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area') \
+                       .add('b', ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.998)
+        batch.run(cache = cache)
+        results = batch.run(cache = cache)
+
+        assert cache.hits == 2
+        assert_frame_equal(results['b'], ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.998))
+
+    def test_errors(self):
+        batch = Batch().add('rate', ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area') \
+                       .add('bad', ph_rate, self.rate_data, 'Numerator', 'Missing')
+
+        with pytest.raises(ValueError, match = "'Missing' is not a column header"):
+            batch.run()
+
+        results = batch.run(errors = 'return')
+        assert isinstance(results['bad'], ValueError) and isinstance(results['rate'], pd.DataFrame)
+
+        with pytest.raises(ValueError, match = "'rate' has already been added to the batch"):
+            batch.add('rate', ph_rate, self.rate_data, 'Numerator', 'Denominator')
+
+        with pytest.raises(ValueError, match = "'threads' must be a positive integer"):
+            batch.run(threads = 0)
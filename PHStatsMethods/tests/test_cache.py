@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import importlib.util
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from pandas.testing import assert_frame_equal
+
+from ..cache import ResultCache, DiskCache, fingerprint
+from ..incremental import Incremental
+from ..rates import ph_rate
+from ..quantiles import ph_quantile
+from ..funnels import calculate_funnel_limits
+
+
+class Test_cache:
+
+    path = Path(__file__).parent / 'test_data'
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+
+    def test_hits(self):
+        cache = ResultCache()
+        first = cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area')
+        second = cache(ph_rate, self.rate_data, num_col = 'Numerator', denom_col = 'Denominator', group_cols = 'Area')
+
+        assert_frame_equal(first, ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area'))
+        assert_frame_equal(first, second)
+        assert (cache.hits, cache.misses, cache.hit_rate) == (1, 1, 0.5)
+
+        # results are copies, so changing them doesn't change the cache
+        second['Value'] = 0
+        assert_frame_equal(cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area'), first)
+
+    def test_keys(self):
+        df = self.rate_data.assign(other = 1)
+        key = fingerprint(ph_rate, (df, 'Numerator', 'Denominator', 'Area'), {})
+
+        # unused columns, the index and workers don't change the result of an aggregate
+        assert key == fingerprint(ph_rate, (df.drop(columns = 'other').set_axis(df.index + 5),
+                                            'Numerator', 'Denominator', 'Area'), {'workers': 2})
+        assert key != fingerprint(ph_rate, (df, 'Numerator', 'Denominator', 'Area'), {'confidence': 0.998})
+        assert key != fingerprint(ph_rate, (df.assign(Numerator = df['Numerator'] + 1),
+                                            'Numerator', 'Denominator', 'Area'), {})
+
+        # but they're part of the result of a quantile
+        key = fingerprint(ph_quantile, (df, 'Numerator', 'Area'), {})
+        assert key != fingerprint(ph_quantile, (df.assign(other = 2), 'Numerator', 'Area'), {})
+
+    def test_eviction(self):
+        rates = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area')
+        cache = ResultCache(max_bytes = int(rates.memory_usage(deep = True).sum() * 2.5))
+        rate = cache.wrap(ph_rate)
+
+        for confidence in [0.95, 0.998, 0.95, 0.99]:
+            rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = confidence)
+
+        assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (1, 3, 1, 2)
+        assert cache.nbytes <= cache.max_bytes
+
+        # 0.998 was least recently used, so evicted
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.95)
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.998)
+        assert cache.misses == 4
+
+    def test_invalidate(self):
+        cache = ResultCache()
+        cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area')
+        cache(calculate_funnel_limits, self.rate_data.dropna(), 'Numerator', 'proportion', 100,
+              denom_col = 'Denominator')
+
+        assert cache.invalidate(ph_rate) == 1 and len(cache) == 1
+        assert cache.invalidate() == 1 and len(cache) == 0 and cache.nbytes == 0
+
+    def test_uncacheable(self):
+        cache = ResultCache()
+        cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = Incremental())
+
+        assert len(cache) == 0 and cache.hit_rate is None
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match = "'max_bytes' must be a positive integer"):
+            ResultCache(max_bytes = 0)
+
+
+
+def cached_rates(directory, confidences):
+    """Calculates rates through a DiskCache in a worker process."""
+
+    path = Path(__file__).parent / 'test_data'
+    df = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    rate = DiskCache(directory).wrap(ph_rate)
+
+    return [rate(df, 'Numerator', 'Denominator', 'Area', confidence = c) for c in confidences]
+
+
+
+@pytest.mark.skipif(importlib.util.find_spec('pyarrow') is None, reason = 'pyarrow is not installed')
+class Test_disk_cache:
+
+    path = Path(__file__).parent / 'test_data'
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+
+    def test_persists(self, tmp_path):
+        expected = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = [0.95, 0.998])
+        first = DiskCache(tmp_path)
+        assert_frame_equal(first(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area',
+                                 confidence = [0.95, 0.998]), expected)
+
+        # a later run (or another process) reads the stored result
+        second = DiskCache(tmp_path)
+        assert_frame_equal(second(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area',
+                                  confidence = [0.95, 0.998]), expected)
+        assert (first.misses, second.hits, len(second)) == (1, 1, 1)
+
+        # results from another version of the package aren't reused
+        second.version = 'other'
+        second(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = [0.95, 0.998])
+        assert second.misses == 1 and len(second) == 2
+
+    def test_types(self, tmp_path):
+        df = pd.DataFrame({'area': ['a', 'b', None, 'c'] * 5, 'value': np.arange(20.0),
+                           'code': pd.array([1, None, 3, 4] * 5, dtype = 'Int64'),
+                           'kind': pd.Categorical(['x', 'y'] * 10, categories = ['x', 'y', 'z'])}, index = np.arange(20) + 100)
+        cache = DiskCache(tmp_path)
+        expected = ph_quantile(df, 'value', nquantiles = 4)
+
+        cache(ph_quantile, df, 'value', nquantiles = 4)
+        assert_frame_equal(cache(ph_quantile, df, 'value', nquantiles = 4), expected)
+        assert cache.hits == 1
+
+        # object columns of mixed types aren't stored
+        cache(ph_quantile, df.assign(area = [1, 'b'] * 10), 'value', nquantiles = 4)
+        assert len(cache) == 1
+
+    def test_mapped(self, tmp_path):
+        pa = pytest.importorskip('pyarrow')
+        cache = DiskCache(tmp_path)
+        expected = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area')
+
+        cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area')
+        df = cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area')
+        path = tmp_path / next(name for name in os.listdir(tmp_path) if not name.startswith('.')) / 'result.arrow'
+
+        # numeric columns share the mapped file, and changes to the result aren't written to the cache
+        base = df['Value'].to_numpy()
+        while isinstance(base, np.ndarray):
+            base = base.base
+
+        assert isinstance(base.obj if isinstance(base, memoryview) else base, mmap.mmap)
+        df.loc[0, 'Value'] = -1.0
+        assert pa.ipc.open_file(pa.memory_map(str(path))).read_all().column('Value')[0].as_py() == expected['Value'][0]
+        assert_frame_equal(cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area'), expected)
+
+    def test_eviction(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        rate = cache.wrap(ph_rate)
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.95)
+        size = cache.nbytes
+
+        cache.max_bytes = int(size * 2.5)
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.998)
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.95)
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.99)
+
+        # 0.998 was least recently read, so evicted
+        assert (cache.evictions, len(cache)) == (1, 2) and cache.nbytes <= cache.max_bytes
+        rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.95)
+        assert cache.hits == 2
+
+    def test_scans(self, tmp_path, monkeypatch):
+        cache = DiskCache(tmp_path)
+        scans = []
+        entries = cache.entries
+        monkeypatch.setattr(cache, 'entries', lambda: scans.append(1) or entries())
+
+        # the directory is only scanned on the first add, and again once the results added pass max_bytes
+        for c in [0.95, 0.99, 0.998]:
+            cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = c)
+        assert len(scans) == 1
+
+        cache.max_bytes = cache.counted_bytes + 1
+        cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = 0.9)
+        assert len(scans) == 2 and cache.evictions == 1 and cache.counted_bytes <= cache.max_bytes
+
+    def test_invalidate(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache(ph_rate, self.rate_data, 'Numerator', 'Denominator', 'Area')
+        cache(ph_quantile, self.rate_data, 'Numerator', nquantiles = 2)
+
+        assert cache.invalidate(ph_quantile) == 1 and len(cache) == 1
+        assert cache.invalidate() == 1 and len(cache) == 0
+
+    def test_processes(self, tmp_path):
+        confidences = [0.95, 0.99, 0.998]
+
+        with ProcessPoolExecutor(2) as pool:
+            results = list(pool.map(cached_rates, [str(tmp_path)] * 2, [confidences, confidences[::-1]]))
+
+        assert len(DiskCache(tmp_path)) == 3
+        assert not [name for name in os.listdir(tmp_path) if name.startswith('.')]
+
+        for result, c in zip(results[0], confidences):
+            assert_frame_equal(result, ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = c))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from ..comparisons import assign_benchmark_significance
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+
+
+def with_england(df):
+    """The data with the sum of every area added as the area 'England'."""
+
+    england = df.groupby(['year', 'ageband'])[['count', 'pop']].sum().reset_index().assign(area = 'England')
+
+    return pd.concat([df, england], ignore_index = True)
+
+
+class Test_benchmark_significance:
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    data = with_england(pd.read_excel(path, sheet_name = 'testdata_multigroup'))
+
+    def expected(self, df, comparator, c = 0.95):
+        """Comparison of each row with its comparator's value, one row at a time."""
+
+        labels = []
+
+        for lower, upper in zip(df[f'lower_{c * 100:g}_ci'.replace('.', '_')], df[f'upper_{c * 100:g}_ci'.replace('.', '_')]):
+            labels.append('Higher' if lower > comparator else 'Lower' if upper < comparator else 'Similar')
+
+        return labels
+
+    def test_rate(self):
+        df = ph_rate(self.data, 'count', 'pop', ['year', 'area'], confidence = [0.95, 0.998])
+        result = assign_benchmark_significance(df, {area: 'England' for area in df['area']}, 'rate', area_col = 'area',
+                                               group_cols = 'year', confidence = [0.95, 0.998])
+
+        for year, group in result.groupby('year'):
+            england = group.loc[group['area'] == 'England', 'Value'].iloc[0]
+
+            assert (group['comparator_value'] == england).all()
+            assert list(group['significance_95']) == self.expected(group, england)
+            assert list(group['significance_99_8']) == self.expected(group, england, 0.998)
+
+        assert isinstance(result['significance_95'].dtype, pd.CategoricalDtype)
+        assert list(result['significance_95'].cat.categories) == ['Lower', 'Similar', 'Higher']
+
+    def test_dsr(self):
+        df = ph_dsr(self.data, 'count', 'pop', 'ageband', ['year', 'area'])
+        df = df.assign(region = np.where(df['area'] == 'England', None, 'England'))
+        result = assign_benchmark_significance(df, 'region', 'dsr', area_col = 'area', group_cols = 'year',
+                                               polarity = 'low_is_good')
+
+        england = result['area'] == 'England'
+        assert result.loc[england, ['comparator_value', 'significance_95']].isna().all().all()
+        assert set(result.loc[~england, 'significance_95'].dropna()) <= {'Better', 'Similar', 'Worse'}
+        assert (result['significance_95'].isna() == (result['Value'].isna() | england)).all()
+
+    def test_proportion(self):
+        data = self.data.assign(pop = self.data['pop'] * 10)
+        df = ph_proportion(data, 'count', 'pop', ['year', 'area'], confidence = [0.95, 0.998], multiplier = 100)
+
+        result = assign_benchmark_significance(df, 0.5, 'proportion', confidence = [0.95, 0.998],
+                                               polarity = 'high_is_good')
+        assert list(result['significance_95']) == [{'Higher': 'Better', 'Lower': 'Worse'}.get(label, label)
+                                                   for label in self.expected(df, 0.5)]
+
+    def test_nulls(self):
+        df = ph_rate(self.data, 'count', 'pop', ['year', 'area'], metadata = False)
+        df.loc[(df['area'] == 'testdata_small') & (df['year'] == 2015), 'Value'] = np.nan
+        result = assign_benchmark_significance(df, {'testdata_big': 'testdata_small', 'testdata_tiny': 'Wales'}, 'rate',
+                                               area_col = 'area', group_cols = 'year')
+
+        # rows with no value, or without a comparator in the data, aren't classified
+        classified = result['significance_95'].notna()
+        assert list(result.loc[classified, ['area', 'year']].itertuples(index = False, name = None)) == [('testdata_big', 2016)]
+        assert result['comparator_value'].notna().sum() == 1
+
+    def test_errors(self):
+        df = ph_rate(self.data, 'count', 'pop', ['year', 'area'], metadata = False)
+
+        with pytest.raises(ValueError, match = "'statistic' must be either 'proportion', 'rate' or 'dsr'"):
+            assign_benchmark_significance(df, 10, 'ratio')
+
+        with pytest.raises(ValueError, match = "'lower_99_8_ci' is not a column header"):
+            assign_benchmark_significance(df, 10, 'rate', confidence = 0.998)
+
+        with pytest.raises(TypeError, match = "'area_col' must be given"):
+            assign_benchmark_significance(df, {'testdata_big': 'England'}, 'rate')
+
+        with pytest.raises(ValueError, match = "There must be one row for each area in 'area' within each group"):
+            assign_benchmark_significance(df, {'testdata_big': 'England'}, 'rate', area_col = 'area')
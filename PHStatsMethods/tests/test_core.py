@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from .. import core
+from ..confidence_intervals import wilson_lower, wilson_upper, byars_lower, byars_upper, dobson_lower, dobson_upper
+from ..utils_funnel import sigma_adjustment, funnel_ratio_significance
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..ISRatio import ph_ISRatio
+from ..means import ph_mean
+
+
+class Test_core:
+
+    codes = np.array([1, 0, 1, 0, 1, -1])
+    num = np.array([12.0, 30.0, 5.0, np.nan, 40.0, 7.0])
+    den = np.array([100.0, 200.0, 150.0, 120.0, 300.0, 90.0])
+    df = pd.DataFrame({'area': ['b', 'a', 'b', 'a', 'b', None], 'num': num, 'den': den})
+
+    def test_group_sum(self):
+        np.testing.assert_array_equal(core.group_sum(self.num, self.codes), [np.nan, 57.0])
+        np.testing.assert_array_equal(core.group_sum(self.num, self.codes, skipna = True), [30.0, 57.0])
+        np.testing.assert_array_equal(core.group_sum(self.den), [960.0])
+
+    def test_bounds(self):
+        lower, upper = core.wilson_bounds(self.num[:3], self.den[:3], 0.95)
+        np.testing.assert_allclose(lower, [wilson_lower(n, d, 0.95) for n, d in zip(self.num[:3], self.den[:3])])
+        np.testing.assert_allclose(upper, [wilson_upper(n, d, 0.95) for n, d in zip(self.num[:3], self.den[:3])])
+
+        lower, upper = core.byars_bounds([5, 40], 0.998)
+        np.testing.assert_allclose(lower, [byars_lower(5, 0.998), byars_lower(40, 0.998)])
+        np.testing.assert_allclose(upper, [byars_upper(5, 0.998), byars_upper(40, 0.998)])
+
+        lower, upper = core.dobson_bounds([200.0, 150.0], [8, 25], [3.0, 4.0], 100000, 0.95)
+        assert np.isnan(lower[0]) and np.isnan(upper[0])
+        assert lower[1] == pytest.approx(dobson_lower(150.0, 25, 4.0, 0.95, 100000))
+        assert upper[1] == pytest.approx(dobson_upper(150.0, 25, 4.0, 0.95, 100000))
+
+    def test_byars_error(self):
+        with pytest.raises(ValueError, match="'Value' must be a positive number"):
+            core.byars_bounds([3, 0])
+
+    def test_proportion(self):
+        result = core.proportion(self.num, self.den, self.codes, confidence = [0.95, 0.998], multiplier = 100)
+        df = ph_proportion(self.df, 'num', 'den', 'area', confidence = [0.95, 0.998], multiplier = 100)
+
+        np.testing.assert_allclose(result['value'], df['Value'])
+        np.testing.assert_allclose(result['lower'], df[['lower_95_ci', 'lower_99_8_ci']].T)
+        np.testing.assert_allclose(result['upper'], df[['upper_95_ci', 'upper_99_8_ci']].T)
+
+    def test_rate_ungrouped(self):
+        result = core.rate(self.num[:3], self.den[:3], confidence = None)
+        df = ph_rate(self.df.iloc[:3], 'num', 'den', confidence = None)
+
+        np.testing.assert_allclose(result['value'], df['Value'])
+        assert result['lower'].shape == (0, 3)
+
+    def test_dsr(self):
+        num = np.array([10.0, 20.0, 30.0, 5.0, np.nan, 2.0])
+        df = pd.DataFrame({'area': ['a', 'a', 'a', 'b', 'b', 'b'], 'num': num, 'den': [100.0, 200.0, 300.0] * 2,
+                           'esp': [1000.0, 2000.0, 3000.0] * 2})
+        result = core.dsr(num, df['den'], df['esp'], np.array([0, 0, 0, 1, 1, 1]))
+        expected = ph_dsr(df, 'num', 'den', group_cols = 'area', ref_denom_col = 'esp', euro_standard_pops = False)
+
+        np.testing.assert_allclose(result['value'], expected['Value'])
+        np.testing.assert_allclose(result['lower'][0], expected['lower_95_ci'])
+
+    def test_isratio(self):
+        df = pd.DataFrame({'area': ['a', 'a', 'b', 'b'], 'num': [10, 20, 3, 4], 'den': [100, 200, 100, 200],
+                           'ref_num': [50, 60] * 2, 'ref_den': [1000, 2000] * 2})
+        result = core.isratio(df['num'], df['den'], df['ref_num'], df['ref_den'], np.array([0, 0, 1, 1]))
+        expected = ph_ISRatio(df, 'num', 'den', 'ref_num', 'ref_den', 'area')
+
+        np.testing.assert_allclose(result['value'], expected['Value'])
+        np.testing.assert_allclose(result['upper'][0], expected['upper_95_ci'])
+
+    def test_mean(self):
+        values = np.array([1.0, 4.0, 2.0, 8.0, 3.0, 5.0])
+        result = core.mean(values, np.array([0, 1, 0, 1, 0, 2]))
+        expected = ph_mean(pd.DataFrame({'area': ['a', 'b', 'a', 'b', 'a', 'c'], 'v': values}), 'v', 'area')
+
+        np.testing.assert_allclose(result['stdev'], expected['stdev'])
+        np.testing.assert_allclose(result['lower'][0], expected['lower_95_ci'])
+
+    def test_quantile(self):
+        rng = np.random.default_rng(3)
+        values = rng.integers(0, 15, 200).astype(float)
+        values[::17] = np.nan
+        codes = rng.integers(0, 4, 200)
+        result = core.quantile(values, codes, 5, invert = False)
+
+        rank = pd.Series(values).groupby(codes).rank(method = 'min')
+        np.testing.assert_array_equal(result['rank'], rank)
+        assert np.nanmin(result['quantile']) == 1 and np.nanmax(result['quantile']) == 5
+
+    def test_funnels(self):
+        population = np.array([50.0, 500.0, 5000.0])
+        np.testing.assert_allclose(core.funnel_proportion_limit(population, 0.2, 0.975, 'low', 100),
+                                   [sigma_adjustment(0.975, x, 0.2, 'low', 100) for x in population])
+
+        obs, expected = np.array([0.0, 4.0, 25.0]), np.array([2.0, 3.0, 20.0])
+        for side in ['low', 'high']:
+            np.testing.assert_allclose(core.funnel_ratio_limit(obs, expected, 0.95, side),
+                                       [funnel_ratio_significance(o, e, 0.95, side) for o, e in zip(obs, expected)])
+
+    def test_unique_inputs(self, monkeypatch):
+        rng = np.random.default_rng(5)
+        num = rng.poisson(3, 5000).astype(float) + 1
+        num[::97] = np.nan
+        den = rng.choice([100.0, 250.0], 5000)
+
+        unique, inverse = core.unique_inputs([num, den])
+        assert len(unique[0]) < 100
+        np.testing.assert_array_equal(unique[0][inverse], num)
+        np.testing.assert_array_equal(unique[1][inverse], den)
+
+        # too many unique values, or too few elements, to be worth compressing
+        assert core.unique_inputs([rng.random(5000)])[1] is None
+        assert core.unique_inputs([num[:10]])[1] is None
+
+        result = core.rate(num, den, confidence = [0.95, 0.998])
+        monkeypatch.setattr(core, 'UNIQUE_MAX_RATIO', 0)
+        expected = core.rate(num, den, confidence = [0.95, 0.998])
+
+        np.testing.assert_array_equal(result['lower'], expected['lower'])
+        np.testing.assert_array_equal(result['upper'], expected['upper'])
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..datasets import ph_from_dataset, dataset_columns, open_dataset
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..ISRatio import ph_ISRatio
+from ..quantiles import ph_quantile
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+class Test_from_dataset:
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    data = pd.read_excel(path, sheet_name = 'testdata_multigroup')
+    isr_data = pd.read_excel(path, sheet_name = 'testdata_multiarea_isr')
+
+    @pytest.fixture
+    def dataset(self, tmp_path):
+        """The test data written as a Parquet dataset partitioned by year."""
+
+        pq.write_to_dataset(pa.Table.from_pandas(self.data, preserve_index = False), tmp_path / 'data',
+                            partition_cols = ['year'])
+        return tmp_path / 'data'
+
+    def test_rate(self, dataset):
+        df = ph_from_dataset(dataset, ph_rate, 'count', 'pop', group_cols = ['year', 'area'], batch_size = 10,
+                             filters = [('year', '=', 2016)], confidence = [0.95, 0.998])
+        expected = ph_rate(self.data[self.data['year'] == 2016], 'count', 'pop', ['year', 'area'],
+                           confidence = [0.95, 0.998])
+
+        assert_frame_equal(df, expected, check_dtype = False)
+
+    def test_dsr(self, dataset):
+        df = ph_from_dataset(dataset, ph_dsr, 'count', 'pop', 'ageband', group_cols = ['year', 'area'])
+        expected = ph_dsr(self.data, 'count', 'pop', 'ageband', ['year', 'area'])
+
+        np.testing.assert_allclose(df['Value'], expected['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(df['upper_95_ci'], expected['upper_95_ci'], rtol = 1e-12)
+
+    def test_table(self, tmp_path):
+        pq.write_to_dataset(pa.Table.from_pandas(self.isr_data, preserve_index = False), tmp_path / 'isr',
+                            partition_cols = ['area'])
+        df = ph_from_dataset(tmp_path / 'isr', ph_ISRatio, 'count', 'pop', 'refcount', 'refpop', group_cols = 'area')
+
+        assert_frame_equal(df, ph_ISRatio(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area'),
+                           check_dtype = False)
+
+    def test_pandas(self, dataset):
+        df = ph_from_dataset(dataset, ph_quantile, 'count', group_cols = 'year')
+        expected = ph_quantile(self.data[['count', 'year']], 'count', group_cols = 'year')
+
+        # statistics which don't take Arrow data are given the filtered columns as a Pandas DataFrame
+        np.testing.assert_array_equal(df.sort_values(['year', 'count'])['quantile'],
+                                      expected.sort_values(['year', 'count'])['quantile'])
+
+    def test_output(self, dataset, tmp_path):
+        df = ph_from_dataset(dataset, ph_rate, 'count', 'pop', group_cols = ['year', 'area'],
+                             output = tmp_path / 'results', partition_cols = ['year'])
+        written = pq.read_table(tmp_path / 'results').to_pandas()
+
+        assert sorted((tmp_path / 'results').iterdir()) == [tmp_path / 'results/year=2015', tmp_path / 'results/year=2016']
+        np.testing.assert_allclose(written.sort_values(['area', 'year'])['Value'], df.sort_values(['area', 'year'])['Value'])
+
+    def test_columns(self, dataset):
+        columns = dataset_columns(open_dataset(dataset), ('count', 'pop'), {'group_cols': ['year'], 'confidence': 0.95})
+
+        # only the columns the statistic needs are read, in the order of the dataset
+        assert columns == ['count', 'pop', 'year']
+
+        with pytest.raises(ValueError, match = 'None of the arguments of the statistic name a column of the dataset'):
+            ph_from_dataset(dataset, ph_rate, 'deaths', 'population')
+
+        with pytest.raises(ValueError, match = "'batch_size' must be a positive integer"):
+            ph_from_dataset(dataset, ph_rate, 'count', 'pop', batch_size = 0)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..deprivation import ph_proportion_by_quantile
+from ..proportions import ph_proportion
+
+
+class Test_proportion_by_quantile:
+
+    path = Path(__file__).parent / 'test_data/NCMP_testdata.csv'
+    data = pd.read_csv(path, dtype = {'SchoolYear': str})
+    group_cols = ['Period', 'SchoolYear', 'AreaCode']
+
+    # each decile split between 5 small areas, with deprivation scores falling from decile 1 to 10
+    areas = data.loc[data.index.repeat(5)].reset_index(drop = True)
+    for col in ['Measured', 'Count']:
+        split = np.round(data[col].to_numpy()[:, None] * [0.1, 0.15, 0.2, 0.25, 0.3])
+        split[:, -1] = data[col] - split[:, :-1].sum(axis = 1)
+        areas[col] = split.reshape(-1)
+    areas['score'] = 100 - areas['Decile'] * 5 - np.tile(np.arange(5), len(data))
+    areas = areas.drop(columns = 'Decile')
+
+    def test_ncmp(self):
+        df = ph_proportion_by_quantile(self.data, 'Count', 'Measured', 'Decile', self.group_cols, multiplier = 100)
+
+        assert list(df.columns) == self.group_cols + ['Decile', 'Count', 'Measured', 'Value', 'lower_95_ci',
+                                                      'upper_95_ci', 'Statistic', 'Confidence', 'Method']
+        np.testing.assert_allclose(df['Value'], self.data['Rate'], rtol = 1e-8)
+        np.testing.assert_allclose(df['lower_95_ci'], self.data['LCL'], rtol = 1e-8)
+        np.testing.assert_allclose(df['upper_95_ci'], self.data['UCL'], rtol = 1e-8)
+
+    def test_scores(self):
+        df = ph_proportion_by_quantile(self.areas, 'Count', 'Measured', 'Decile', self.group_cols, score_col = 'score',
+                                       quantile_group_cols = self.group_cols, multiplier = 100, metadata = False)
+
+        np.testing.assert_array_equal(df['Decile'], self.data['Decile'])
+        np.testing.assert_allclose(df['Value'], self.data['Rate'], rtol = 1e-8)
+        np.testing.assert_allclose(df['lower_95_ci'], self.data['LCL'], rtol = 1e-8)
+        np.testing.assert_allclose(df['upper_95_ci'], self.data['UCL'], rtol = 1e-8)
+
+    def test_proportion(self):
+        df = ph_proportion_by_quantile(self.data, 'Count', 'Measured', 'Decile', 'Period', confidence = [0.95, 0.998])
+        expected = ph_proportion(self.data, 'Count', 'Measured', ['Period', 'Decile'], confidence = [0.95, 0.998])
+
+        assert_frame_equal(df, expected)
+
+    def test_unchanged(self):
+        areas = self.areas.copy()
+        ph_proportion_by_quantile(areas, 'Count', 'Measured', 'Decile', self.group_cols, score_col = 'score',
+                                  quantile_group_cols = self.group_cols)
+
+        assert_frame_equal(areas, self.areas)
+
+    def test_missing_scores(self):
+        areas = self.areas.copy()
+        areas.loc[:4, 'score'] = np.nan
+
+        with pytest.warns(UserWarning, match = 'too few small areas'):
+            df = ph_proportion_by_quantile(areas, 'Count', 'Measured', 'Decile', self.group_cols, score_col = 'score',
+                                           quantile_group_cols = self.group_cols)
+
+        assert len(df) == len(self.data)
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match = "'Decile' is already a column"):
+            ph_proportion_by_quantile(self.data, 'Count', 'Measured', 'Decile', self.group_cols, score_col = 'Rate')
+
+        with pytest.raises(ValueError, match = "'Decile' must not be one of the group_cols"):
+            ph_proportion_by_quantile(self.data, 'Count', 'Measured', 'Decile', ['Period', 'Decile'])
+
+        with pytest.raises(ValueError, match = "'nquantiles' must be an integer of at least 2"):
+            ph_proportion_by_quantile(self.areas, 'Count', 'Measured', 'Decile', score_col = 'score', nquantiles = 1)
+
+        with pytest.raises(ValueError, match = 'Numerators must be less than or equal to the denominator'):
+            ph_proportion_by_quantile(self.data.assign(Count = self.data['Measured'] + 1), 'Count', 'Measured',
+                                      'Decile', self.group_cols)
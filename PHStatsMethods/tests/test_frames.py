@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..frames import frame_kind, to_pandas
+from ..rates import ph_rate
+from ..proportions import ph_proportion
+from ..DSR import ph_dsr
+from ..ISRatio import ph_ISRatio
+from ..instrumentation import instrument, MemoryProfile
+
+pa = pytest.importorskip('pyarrow')
+
+
+class Test_native_frames:
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    data = pd.read_excel(path, sheet_name = 'testdata_multigroup')
+    isr_data = pd.read_excel(path, sheet_name = 'testdata_multiarea_isr')
+
+    def test_frame_kind(self):
+        table = pa.Table.from_pandas(self.data, preserve_index = False)
+
+        assert frame_kind(table) == 'arrow'
+        assert frame_kind(self.data) is None
+        assert frame_kind([table]) is None
+
+    def test_to_pandas(self):
+        table = pa.table({'area': ['A', 'B', None, 'A'], 'count': [1, 2, 3, 4], 'pop': [10.0, None, 30.0, 40.0]})
+        df = to_pandas(table, ['area'])
+
+        # group keys are dictionary-encoded, and numeric columns without nulls share the Arrow buffer
+        assert isinstance(df['area'].dtype, pd.CategoricalDtype)
+        assert list(df['area'].cat.codes) == [0, 1, -1, 0]
+        assert np.shares_memory(df['count'].to_numpy(), table.column('count').chunk(0).to_numpy())
+        assert np.isnan(df['pop'][1])
+
+    def test_zero_copy(self):
+        n = 500000
+        rng = np.random.default_rng(1)
+        table = pa.table({'area': np.array(['A', 'B', 'C'])[rng.integers(0, 3, n)], 'count': rng.integers(0, 100, n),
+                          'pop': rng.integers(100, 1000, n), 'note': ['a column the statistic does not use'] * n})
+
+        with instrument(MemoryProfile()) as profile:
+            df = ph_rate(table, 'count', 'pop', 'area')
+
+        # neither converting nor validating the data copies its numeric columns or converts unused columns
+        peaks = {event.stage: event.peak_bytes for event in profile.events}
+        assert peaks['from_frame'] < table.column('count').nbytes + table.column('pop').nbytes
+        assert peaks['validate'] < n * 2
+
+        # groups are in the sorted order of their keys, as for a Pandas DataFrame
+        counts = pd.Series(table.column('count').to_numpy()).groupby(table.column('area').to_numpy()).sum()
+        assert df.column('area').to_pylist() == ['A', 'B', 'C']
+        assert df.column('count').to_pylist() == list(counts)
+
+    def test_arrow_rate(self):
+        table = pa.Table.from_pandas(self.data, preserve_index = False)
+        df = ph_rate(table, 'count', 'pop', ['area', 'year'], confidence = [0.95, 0.998])
+
+        assert isinstance(df, pa.Table)
+        assert df.schema.field('area').type == table.schema.field('area').type
+        assert_frame_equal(df.to_pandas(), ph_rate(self.data, 'count', 'pop', ['area', 'year'], confidence = [0.95, 0.998]),
+                           check_dtype = False)
+
+    def test_string_keys(self):
+        data = self.data.assign(year = self.data['year'].astype(str))
+        table = pa.Table.from_pandas(data, preserve_index = False)
+
+        # keys are only grouped by the combinations in the data, without warnings from Pandas
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', FutureWarning)
+            df = ph_rate(table, 'count', 'pop', ['area', 'year'])
+
+        assert_frame_equal(df.to_pandas(), ph_rate(data, 'count', 'pop', ['area', 'year']), check_dtype = False)
+
+    def test_arrow_chunks(self):
+        table = pa.concat_tables([pa.Table.from_pandas(self.data.iloc[:50], preserve_index = False),
+                                  pa.Table.from_pandas(self.data.iloc[50:], preserve_index = False)])
+        df = ph_proportion(table, 'count', 'pop', 'area', multiplier = 100)
+
+        assert_frame_equal(df.to_pandas(), ph_proportion(self.data, 'count', 'pop', 'area', multiplier = 100),
+                           check_dtype = False)
+
+    def test_arrow_isratio(self):
+        table = pa.Table.from_pandas(self.isr_data, preserve_index = False)
+        df = ph_ISRatio(table, 'count', 'pop', 'refcount', 'refpop', 'area')
+
+        assert_frame_equal(df.to_pandas(), ph_ISRatio(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area'),
+                           check_dtype = False)
+
+    def test_polars_dsr(self):
+        pl = pytest.importorskip('polars')
+        df = ph_dsr(pl.from_pandas(self.data), 'count', 'pop', 'ageband', ['area', 'year'])
+
+        assert isinstance(df, pl.DataFrame)
+        assert df.schema['area'] == pl.String
+        assert_frame_equal(df.to_pandas(), ph_dsr(self.data, 'count', 'pop', 'ageband', ['area', 'year']),
+                           check_dtype = False)
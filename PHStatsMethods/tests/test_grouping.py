@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..grouping import Grouping
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..ISRate import ph_ISRate
+from ..ISRatio import ph_ISRatio
+from ..means import ph_mean
+from ..quantiles import ph_quantile
+from ..utils import group_sums
+
+
+class Test_Grouping:
+
+    df = pd.DataFrame({'area': ['b', 'a', 'c', 'a', 'b', None],
+                       'num': [1.0, np.nan, 3.0, 4.0, 5.0, 6.0],
+                       'den': [10, 20, 30, 40, 50, 60]})
+
+    def test_codes(self):
+        grouping = Grouping(self.df, 'area')
+        np.testing.assert_array_equal(grouping.codes, [1, 0, 2, 0, 1, -1])
+        np.testing.assert_array_equal(grouping.counts, [2, 2, 1])
+        assert grouping.keys['area'].tolist() == ['a', 'b', 'c']
+
+    def test_sums(self):
+        df = group_sums(self.df, ['area'], ['num', 'den'], skipna_cols = ['den'], grouping = Grouping(self.df, 'area'))
+        assert_frame_equal(df, group_sums(self.df, ['area'], ['num', 'den'], skipna_cols = ['den']))
+
+    def test_sums_nulls(self):
+        df = group_sums(self.df, ['area'], ['num', 'den'], skipna_cols = ['den'])
+        expected = pd.DataFrame({'area': ['a', 'b', 'c'], 'num': [np.nan, 6.0, 3.0], 'den': [60, 60, 30]})
+        assert_frame_equal(df, expected.astype({'area': df['area'].dtype}))
+
+    def test_categories(self):
+        df = self.df.assign(area = pd.Categorical(self.df['area'], categories = ['c', 'b', 'a', 'd']),
+                            year = pd.Categorical([2020] * 6, categories = [2019, 2020]))
+        grouping = Grouping(df, ['area', 'year'])
+
+        # only the combinations of categories in the data are groups, in the order of the categories
+        assert grouping.keys['area'].tolist() == ['c', 'b', 'a']
+        np.testing.assert_array_equal(grouping.counts, [1, 2, 2])
+        assert_frame_equal(group_sums(df, ['area', 'year'], ['num', 'den'], grouping = grouping),
+                           group_sums(df, ['area', 'year'], ['num', 'den']))
+
+    def test_group_cols_error(self):
+        with pytest.raises(TypeError, match = 'group_cols cannot be None for a Grouping'):
+            Grouping(self.df, None)
+
+    def test_mismatch_errors(self):
+        grouping = Grouping(self.df, 'area')
+
+        with pytest.raises(ValueError, match = "'grouping' was prepared with different group_cols"):
+            ph_rate(self.df, 'num', 'den', grouping = grouping)
+
+        with pytest.raises(ValueError, match = "'grouping' was prepared for data with a different number of rows"):
+            ph_rate(self.df.iloc[1:], 'num', 'den', 'area', grouping = grouping)
+
+        with pytest.raises(TypeError, match = "'grouping' must be a Grouping object"):
+            ph_rate(self.df, 'num', 'den', 'area', grouping = ['area'])
+
+
+class Test_grouped_statistics:
+
+    path = Path(__file__).parent / 'test_data'
+
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+    isr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_isr')
+    isr_refdata = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'refdata')
+    mean_data = pd.read_excel(path / 'testdata_Mean.xlsx', sheet_name = 'testdata_Mean')
+    quantile_data = pd.read_excel(path / 'testdata_Quantiles.xlsx', sheet_name = 'testdata_Quantiles')
+
+    def test_proportion_rate(self):
+        grouping = Grouping(self.rate_data, 'Area')
+        assert_frame_equal(ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', grouping = grouping),
+                           ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area'))
+
+        grouping = Grouping(self.prop_data, 'Area')
+        assert_frame_equal(ph_proportion(self.prop_data, 'Numerator', 'Denominator', 'Area', grouping = grouping),
+                           ph_proportion(self.prop_data, 'Numerator', 'Denominator', 'Area'))
+
+    def test_dsr(self):
+        grouping = Grouping(self.dsr_data, 'area')
+        assert_frame_equal(ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area', grouping = grouping),
+                           ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area'))
+
+    def test_isr(self):
+        grouping = Grouping(self.isr_data, 'area')
+        data = self.isr_data.drop(columns = ['refcount', 'refpop'])
+        kwargs = {'ref_df': self.isr_refdata, 'ref_join_left': 'ageband', 'ref_join_right': 'Age Band'}
+
+        assert_frame_equal(ph_ISRate(data, 'count', 'pop', 'refcount', 'refpop', 'area', grouping = grouping, **kwargs),
+                           ph_ISRate(data, 'count', 'pop', 'refcount', 'refpop', 'area', **kwargs))
+        assert_frame_equal(ph_ISRatio(data, 'count', 'pop', 'refcount', 'refpop', 'area', grouping = grouping, **kwargs),
+                           ph_ISRatio(data, 'count', 'pop', 'refcount', 'refpop', 'area', **kwargs))
+
+    def test_mean(self):
+        grouping = Grouping(self.mean_data, 'area')
+        assert_frame_equal(ph_mean(self.mean_data, 'values', 'area', grouping = grouping),
+                           ph_mean(self.mean_data, 'values', 'area'))
+
+    def test_quantile(self):
+        grouping = Grouping(self.quantile_data, 'ParentCode')
+        assert_frame_equal(ph_quantile(self.quantile_data, 'Value', 'ParentCode', grouping = grouping),
+                           ph_quantile(self.quantile_data, 'Value', 'ParentCode'))
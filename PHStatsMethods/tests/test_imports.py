@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import subprocess
+import pytest
+
+import PHStatsMethods
+
+
+def loaded_modules(code):
+    """Runs code in a fresh interpreter and returns which of pandas and scipy it imported."""
+
+    check = code + "\nimport sys; print(' '.join(m for m in ['pandas', 'scipy'] if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', check], capture_output = True, text = True, check = True)
+
+    return result.stdout.split()
+
+
+class Test_lazy_imports:
+
+    def test_package_import(self):
+        assert loaded_modules('import PHStatsMethods') == []
+
+    def test_scipy_deferred(self):
+        assert loaded_modules('from PHStatsMethods import ph_rate, ph_proportion') == ['pandas']
+        assert 'scipy' in loaded_modules('from PHStatsMethods import byars_lower; byars_lower(20)')
+
+    def test_public_names(self):
+        for name in PHStatsMethods.__all__:
+            assert callable(getattr(PHStatsMethods, name))
+
+        assert set(PHStatsMethods.__all__) <= set(dir(PHStatsMethods))
+
+    def test_unknown_name(self):
+        with pytest.raises(AttributeError, match = "has no attribute 'ph_unknown'"):
+            PHStatsMethods.ph_unknown
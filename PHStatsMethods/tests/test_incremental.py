@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..incremental import Incremental
+from ..instrumentation import instrument
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..ISRate import ph_ISRate
+from ..ISRatio import ph_ISRatio
+from ..means import ph_mean
+
+
+class Test_incremental:
+
+    path = Path(__file__).parent / 'test_data'
+
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+    isr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_isr')
+    mean_data = pd.read_excel(path / 'testdata_Mean.xlsx', sheet_name = 'testdata_Mean')
+
+    def revise(self, df, col, area_col, area):
+        df = df.copy()
+        df.loc[df[area_col] == area, col] = df.loc[df[area_col] == area, col] + 1
+        return df
+
+    def test_first_run(self):
+        refresh = Incremental()
+        df = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        assert_frame_equal(df, ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area'))
+        assert refresh.recalculated == len(df) and refresh.reused == 0
+
+    def test_rate_changed_group(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        revised = self.revise(self.rate_data, 'Numerator', 'Area', 'Area02')
+        df = ph_rate(revised, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(revised, 'Numerator', 'Denominator', 'Area'))
+        assert refresh.recalculated == 1 and refresh.reused == len(df) - 1
+
+    def test_unchanged(self):
+        refresh = Incremental()
+        first = ph_proportion(self.prop_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        df = ph_proportion(self.prop_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        assert_frame_equal(df, first)
+        assert refresh.recalculated == 0
+
+    def test_added_and_removed_groups(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        revised = self.rate_data[self.rate_data['Area'] != 'Area01'].copy()
+        revised.loc[revised['Area'] == 'Area02', 'Area'] = 'Area99'
+        df = ph_rate(revised, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(revised, 'Numerator', 'Denominator', 'Area'))
+        assert refresh.recalculated == 1
+
+    def test_changed_arguments(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        df = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = [0.95, 0.998], incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', confidence = [0.95, 0.998]))
+        assert refresh.reused == 0
+
+    def test_changed_rows(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        # only the rows of the changed group are validated and summed
+        revised = self.revise(self.rate_data, 'Numerator', 'Area', 'Area02')
+        with instrument() as summary:
+            ph_rate(revised, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        rows = {e.stage: e.rows for e in summary.events}
+        assert rows['validate'] == rows['group_sums'] == (revised['Area'] == 'Area02').sum()
+
+    def test_ungrouped(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', incremental = refresh)
+
+        revised = self.rate_data.copy()
+        revised.loc[3, 'Numerator'] = revised.loc[3, 'Numerator'] + 1
+        df = ph_rate(revised, 'Numerator', 'Denominator', incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(revised, 'Numerator', 'Denominator'))
+        assert refresh.recalculated == 1
+
+    def test_null_keys(self):
+        data = self.rate_data.copy()
+        data.loc[:2, 'Area'] = None
+
+        refresh = Incremental()
+        ph_rate(data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        revised = self.revise(data, 'Numerator', 'Area', 'Area02')
+        df = ph_rate(revised, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(revised, 'Numerator', 'Denominator', 'Area'))
+        assert refresh.recalculated == 1
+
+    def test_changed_reference(self):
+        kwargs = {'ref_join_left': 'ageband', 'ref_join_right': 'ageband'}
+        data = self.isr_data.drop(columns = ['refcount', 'refpop'])
+        ref_df = self.isr_data.loc[self.isr_data['area'] == self.isr_data['area'].iloc[0], ['ageband', 'refcount', 'refpop']]
+
+        refresh = Incremental()
+        ph_ISRate(data, 'count', 'pop', 'refcount', 'refpop', 'area', ref_df = ref_df, incremental = refresh, **kwargs)
+        revised = ref_df.assign(refcount = ref_df['refcount'] + 1)
+        df = ph_ISRate(data, 'count', 'pop', 'refcount', 'refpop', 'area', ref_df = revised, incremental = refresh, **kwargs)
+
+        assert_frame_equal(df, ph_ISRate(data, 'count', 'pop', 'refcount', 'refpop', 'area', ref_df = revised, **kwargs))
+        assert refresh.reused == 0
+
+    def test_dsr(self):
+        refresh = Incremental()
+        ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area', incremental = refresh)
+
+        revised = self.revise(self.dsr_data, 'count', 'area', 'testdata_small')
+        df = ph_dsr(revised, 'count', 'pop', 'ageband', 'area', incremental = refresh)
+
+        assert_frame_equal(df, ph_dsr(revised, 'count', 'pop', 'ageband', 'area'))
+        assert refresh.recalculated == 1
+
+    def test_isratio(self):
+        refresh = Incremental()
+        ph_ISRatio(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area', incremental = refresh)
+
+        revised = self.revise(self.isr_data, 'count', 'area', 'testdata_small')
+        df = ph_ISRatio(revised, 'count', 'pop', 'refcount', 'refpop', 'area', incremental = refresh)
+
+        assert_frame_equal(df, ph_ISRatio(revised, 'count', 'pop', 'refcount', 'refpop', 'area'))
+        assert refresh.recalculated == 1
+
+    def test_mean(self):
+        refresh = Incremental()
+        ph_mean(self.mean_data, 'values', 'area', incremental = refresh)
+
+        revised = self.revise(self.mean_data, 'values', 'area', 'Area2')
+        df = ph_mean(revised, 'values', 'area', incremental = refresh)
+
+        assert_frame_equal(df, ph_mean(revised, 'values', 'area'))
+        assert refresh.recalculated == 1
+
+    def test_serialised(self):
+        refresh = Incremental()
+        ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+        refresh = Incremental.from_bytes(refresh.to_bytes())
+
+        revised = self.revise(self.rate_data, 'Numerator', 'Area', 'Area02')
+        df = ph_rate(revised, 'Numerator', 'Denominator', 'Area', incremental = refresh)
+
+        assert_frame_equal(df, ph_rate(revised, 'Numerator', 'Denominator', 'Area'), check_dtype = False)
+        assert refresh.recalculated == 1
+
+    def test_type_error(self):
+        with pytest.raises(TypeError, match = "'incremental' must be an Incremental object"):
+            ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', incremental = {})
+
+    def test_empty_error(self):
+        with pytest.raises(ValueError, match = 'No results have been calculated'):
+            Incremental().to_bytes()
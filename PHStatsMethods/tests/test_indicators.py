@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..indicators import ph_indicators
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..utils import euro_standard_pop
+
+
+class Test_indicators:
+
+    path = Path(__file__).parent / 'test_data'
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+
+    columns = {'Area': 'area', 'Numerator': 'count', 'Denominator': 'pop'}
+    data = pd.concat([rate_data.rename(columns = columns).assign(indicator = 'admissions'),
+                      prop_data.rename(columns = columns).assign(indicator = 'obesity'),
+                      dsr_data.assign(indicator = 'mortality'),
+                      dsr_data.assign(indicator = 'mortality_esp', esp = np.tile(euro_standard_pop()['euro_standard_pops'], 3))],
+                     ignore_index = True)
+
+    specs = {'admissions': {'statistic': 'rate', 'multiplier': 100, 'confidence': [0.95, 0.998]},
+             'obesity': {'statistic': 'proportion', 'multiplier': 100},
+             'mortality': {'statistic': 'dsr', 'confidence': 0.998},
+             'mortality_esp': {'statistic': 'dsr', 'reference': 'esp'}}
+
+    def result(self, df, indicator):
+        return df[df['indicator'] == indicator].drop(columns = 'indicator').reset_index(drop = True)
+
+    def test_statistics(self):
+        df = ph_indicators(self.data, 'indicator', self.specs, 'count', 'pop', 'area', age_col = 'ageband')
+
+        assert list(df.columns) == ['indicator', 'area', 'count', 'pop', 'Value', 'lower_95_ci', 'upper_95_ci',
+                                    'lower_99_8_ci', 'upper_99_8_ci', 'Statistic', 'Confidence', 'Method']
+
+        rates = ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', multiplier = 100, confidence = [0.95, 0.998])
+        assert_frame_equal(self.result(df, 'admissions'), rates.rename(columns = self.columns),
+                           check_dtype = False)
+
+        props = ph_proportion(self.prop_data, 'Numerator', 'Denominator', 'Area', multiplier = 100)
+        result = self.result(df, 'obesity')
+        assert result[['lower_99_8_ci', 'upper_99_8_ci']].isna().all().all()
+        assert_frame_equal(result.drop(columns = ['lower_99_8_ci', 'upper_99_8_ci']),
+                           props.rename(columns = self.columns), check_dtype = False)
+
+        dsrs = ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area', confidence = 0.998)
+        result = self.result(df, 'mortality')
+        np.testing.assert_allclose(result['Value'], dsrs['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(result['lower_99_8_ci'], dsrs['lower_99_8_ci'], rtol = 1e-12)
+        assert (result['Statistic'] == 'DSR per 100000').all() and (result['Confidence'] == '99.8%').all()
+
+        # standard populations from a column give the same DSRs as the European Standard Population
+        esp = self.result(df, 'mortality_esp')
+        np.testing.assert_allclose(esp['Value'], result['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(esp['lower_95_ci'], ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area')['lower_95_ci'],
+                                   rtol = 1e-12)
+        assert esp['lower_99_8_ci'].isna().all()
+
+    def test_unchanged(self):
+        data = self.data.copy()
+        ph_indicators(data, 'indicator', self.specs, 'count', 'pop', 'area', age_col = 'ageband')
+
+        assert_frame_equal(data, self.data)
+
+    def test_ungrouped(self):
+        # each indicator is one group
+        data = self.prop_data.dropna().assign(indicator = 'obesity')
+        df = ph_indicators(data, 'indicator', self.specs, 'Numerator', 'Denominator', metadata = False)
+        props = ph_proportion(data, 'Numerator', 'Denominator', 'indicator', multiplier = 100, metadata = False)
+
+        assert_frame_equal(df, props, check_dtype = False)
+
+    def test_esp_groups(self):
+        args = ('indicator', self.specs, 'count', 'pop', 'area')
+        data = self.dsr_data.assign(indicator = 'mortality')
+
+        # groups standardised to the European Standard Population are checked as in ph_dsr
+        with pytest.raises(ValueError, match = 'There must be 19 rows of data per group'):
+            ph_indicators(data[data['ageband'] != '5-9'], *args, age_col = 'ageband')
+
+        with pytest.raises(ValueError, match = 'There are duplicate minimum ages'):
+            ph_indicators(data.assign(ageband = data['ageband'].replace('5-9', '0-4')), *args, age_col = 'ageband')
+
+        # rows without a group aren't checked against any group
+        df = ph_indicators(pd.concat([self.data, data.iloc[:1].assign(area = None)], ignore_index = True), *args,
+                           age_col = 'ageband')
+        assert_frame_equal(df, ph_indicators(self.data, *args, age_col = 'ageband'))
+
+    def test_errors(self):
+        args = ('indicator', self.specs, 'count', 'pop', 'area')
+
+        with pytest.raises(ValueError, match = 'No spec was given for indicator\\(s\\): other'):
+            ph_indicators(pd.concat([self.data, self.data.iloc[:1].assign(indicator = 'other')]), *args, age_col = 'ageband')
+
+        with pytest.raises(ValueError, match = "'age_col' must be given for DSRs"):
+            ph_indicators(self.data, *args)
+
+        with pytest.raises(ValueError, match = 'Numerators must be less than or equal to the denominator'):
+            ph_indicators(self.data.assign(count = self.data['pop'] + 1), *args, age_col = 'ageband')
+
+        with pytest.raises(ValueError, match = 'There must be the same number of rows per group'):
+            ph_indicators(self.data.drop(index = 40), *args, age_col = 'ageband')
+
+        with pytest.raises(ValueError, match = "The statistic of indicator 'obesity' must be one of"):
+            ph_indicators(self.data, 'indicator', {**self.specs, 'obesity': {'statistic': 'mean'}}, 'count', 'pop')
+
+        with pytest.raises(ValueError, match = "'Multiplier' must be a positive integer"):
+            ph_indicators(self.data, 'indicator', {**self.specs, 'obesity': {'statistic': 'proportion', 'multiplier': 0}},
+                          'count', 'pop')
+
+        with pytest.raises(ValueError, match = "A reference can only be given for DSRs"):
+            ph_indicators(self.data, 'indicator', {**self.specs, 'obesity': {'statistic': 'rate', 'reference': 'esp'}},
+                          'count', 'pop')
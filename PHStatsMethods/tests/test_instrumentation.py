@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from ..instrumentation import instrument, stage, add_listener, remove_listener, StageSummary, MemoryProfile, _null_stage
+from ..rates import ph_rate
+from ..means import ph_mean
+from ..funnels import assign_funnel_significance
+
+
+class Test_instrumentation:
+
+    df = pd.DataFrame({'area': ['a', 'a', 'b', 'b', 'c'],
+                       'num': [10, 20, 30, 40, 50],
+                       'den': [1000, 2000, 3000, 4000, 5000]})
+
+    def test_stages(self):
+        with instrument() as summary:
+            df = ph_rate(self.df, 'num', 'den', 'area')
+
+        stages = [(e.function, e.stage) for e in summary.events]
+        assert stages == [('ph_rate', 'validate'), ('ph_rate', 'group_sums'), ('ph_rate', 'metadata'),
+                          ('ph_rate', 'results'), ('ph_rate', 'total')]
+
+        total = summary.events[-1]
+        assert (total.rows, total.groups) == (5, 3)
+        assert summary.events[1].groups == 3
+        assert total.wall >= summary.events[1].wall >= 0
+
+        assert_frame_equal(df, ph_rate(self.df, 'num', 'den', 'area'))
+
+    def test_summary(self):
+        with instrument() as summary:
+            ph_mean(self.df, 'num', 'area')
+            ph_mean(self.df, 'num', 'area')
+            assign_funnel_significance(self.df, 'num', 'ratio', denom_col = 'den')
+
+        df = summary.summary()
+        assert df.loc[df['stage'] == 'total', 'function'].tolist() == ['ph_mean', 'assign_funnel_significance']
+        assert df.loc[(df['function'] == 'ph_mean') & (df['stage'] == 'total'), 'calls'].item() == 2
+        assert 'share' in summary.report()
+
+    def test_listener(self):
+        events = []
+        add_listener(events.append)
+
+        try:
+            ph_rate(df = self.df, num_col = 'num', denom_col = 'den')
+        finally:
+            remove_listener(events.append)
+
+        assert events[-1].function == 'ph_rate'
+        assert stage('validate') is _null_stage
+
+    def test_context(self):
+        with instrument() as summary:
+            thread = threading.Thread(target = ph_rate, args = (self.df, 'num', 'den', 'area'))
+            thread.start()
+            thread.join()
+
+            # statistics called in another thread aren't reported to listeners attached in this one
+            assert summary.events == []
+
+            ph_rate(self.df, 'num', 'den', 'area')
+
+        assert summary.events[-1].function == 'ph_rate'
+        assert all(e.cpu <= e.wall + 1e-3 for e in summary.events)
+
+    def test_listener_error(self):
+        with pytest.raises(TypeError, match = "'listener' must be callable"):
+            add_listener('not a function')
+
+    def test_no_listener(self):
+        summary = StageSummary()
+        ph_rate(self.df, 'num', 'den', 'area')
+        assert summary.events == []
+        assert stage('validate') is _null_stage
+
+    def test_memory_profile(self):
+        df = pd.DataFrame({'area': np.repeat(np.arange(100), 100).astype(str), 'num': 5.0, 'den': 1000.0})
+
+        with instrument(MemoryProfile()) as profile:
+            ph_rate(df, 'num', 'den', 'area')
+            assert tracemalloc.is_tracing()
+
+        assert not tracemalloc.is_tracing()
+
+        events = {e.stage: e for e in profile.events}
+        assert events['validate'].frame_bytes == df.memory_usage(deep = True).sum()
+        assert events['total'].peak_bytes >= events['validate'].peak_bytes > 0
+        assert events['metadata'].frame_bytes is None
+
+        summary = profile.summary()
+        assert {'peak_mib', 'retained_mib', 'frame_mib'} <= set(summary.columns)
+
+    def test_timing_only(self):
+        with instrument() as summary:
+            ph_rate(self.df, 'num', 'den', 'area')
+
+        assert summary.events[-1].peak_bytes is None
+
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import math
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from scipy.stats import norm
+
+from ..life_expectancy import ph_life_expectancy
+
+
+def life_table(ages, deaths, pops, confidence = 0.95):
+    """Life expectancy and confidence limits at each age, built one age band at a time."""
+
+    n = len(ages)
+    alive, years, q = [100000.0], [], []
+
+    for i in range(n):
+        rate = deaths[i] / pops[i]
+
+        if i == n - 1:
+            q.append(1.0)
+            years.append(alive[i] / rate)
+        else:
+            width = ages[i + 1] - ages[i]
+            a = 0.1 if ages[i] == 0 and width == 1 else 0.5
+            q.append(width * rate / (1 + width * (1 - a) * rate))
+            alive.append(alive[i] * (1 - q[i]))
+            years.append(width * (alive[i + 1] + a * alive[i] * q[i]))
+
+    value = [sum(years[i:]) / alive[i] for i in range(n)]
+
+    weighted = []
+    for i in range(n):
+        if i == n - 1:
+            rate = deaths[i] / pops[i]
+            weighted.append(alive[i] ** 2 / (deaths[i] * rate ** 2))
+        else:
+            width = ages[i + 1] - ages[i]
+            a = 0.1 if ages[i] == 0 and width == 1 else 0.5
+            var_q = 0 if deaths[i] == 0 else q[i] ** 2 * (1 - q[i]) / deaths[i]
+            weighted.append(alive[i] ** 2 * ((1 - a) * width + value[i + 1]) ** 2 * var_q)
+
+    z = norm.ppf(confidence + (1 - confidence) / 2)
+    se = [math.sqrt(sum(weighted[i:]) / alive[i] ** 2) for i in range(n)]
+
+    return value, [v - z * s for v, s in zip(value, se)], [v + z * s for v, s in zip(value, se)]
+
+
+class Test_life_expectancy:
+
+    ages = [0, 1] + list(range(5, 95, 5))
+    pops = [7060, 35059, 46974, 48489, 43219, 38561, 46009, 57208, 61435, 55601,
+            50209, 56416, 46411, 39820, 37978, 37039, 23372, 11543, 5355, 2318]
+    deaths = [17, 9, 4, 7, 19, 17, 35, 46, 82, 134, 206, 304, 411, 624, 931, 1158, 1473, 1397, 1083, 763]
+
+    rng = np.random.default_rng(7)
+    data = pd.DataFrame({'area': np.repeat(['a', 'b', 'c'], 20), 'sex': np.repeat([1, 2, 1], 20),
+                         'age': ages * 3, 'pops': pops * 3,
+                         'deaths': deaths + list(rng.poisson(deaths)) + [0] * 5 + deaths[5:]})
+
+    def test_reference(self):
+        df = ph_life_expectancy(self.data, 'deaths', 'pops', 'age', ['area', 'sex'], confidence = 0.998)
+
+        for i, area in enumerate(['a', 'b', 'c']):
+            group = self.data[self.data['area'] == area]
+            value, lower, upper = life_table(self.ages, list(group['deaths']), self.pops, 0.998)
+            result = df[df['area'] == area]
+
+            np.testing.assert_allclose(result['Value'], value, rtol = 1e-12)
+            np.testing.assert_allclose(result['lower_99_8_ci'], lower, rtol = 1e-12)
+            np.testing.assert_allclose(result['upper_99_8_ci'], upper, rtol = 1e-12)
+
+    def test_le_age(self):
+        df = ph_life_expectancy(self.data, 'deaths', 'pops', 'age', 'area', le_age = [0, 65], confidence = [0.95, 0.998])
+        full = ph_life_expectancy(self.data, 'deaths', 'pops', 'age', 'area', confidence = [0.95, 0.998])
+
+        assert list(df.columns) == ['area', 'age', 'Value', 'lower_95_ci', 'upper_95_ci', 'lower_99_8_ci',
+                                    'upper_99_8_ci', 'Statistic', 'Confidence', 'Method']
+        assert_frame_equal(df, full[full['age'].isin([0, 65])].reset_index(drop = True))
+
+    def test_labels(self):
+        labels = ['0', '1-4'] + [f'{a}-{a + 4}' for a in range(5, 90, 5)] + ['90+']
+        df = ph_life_expectancy(self.data.assign(age = labels * 3), 'deaths', 'pops', 'age', 'area', metadata = False)
+        expected = ph_life_expectancy(self.data, 'deaths', 'pops', 'age', 'area', metadata = False)
+
+        assert list(df['age'][:3]) == ['0', '1-4', '5-9']
+        assert_frame_equal(df.drop(columns = 'age'), expected.drop(columns = 'age'))
+
+    def test_ungrouped(self):
+        df = ph_life_expectancy(self.data.iloc[:20], 'deaths', 'pops', 'age', le_age = 0, metadata = False)
+        value, lower, upper = life_table(self.ages, self.deaths, self.pops)
+
+        assert list(df.columns) == ['age', 'Value', 'lower_95_ci', 'upper_95_ci']
+        assert df['Value'][0] == pytest.approx(value[0])
+
+    def test_unreliable(self):
+        data = self.data.copy()
+        data.loc[data['area'] == 'b', 'pops'] = 200
+        data.loc[59, 'deaths'] = 0
+
+        with pytest.warns(UserWarning, match = 'Life expectancy was not calculated'):
+            df = ph_life_expectancy(data, 'deaths', 'pops', 'age', 'area', le_age = 0)
+
+        assert df['Value'].isna().tolist() == [False, True, True]
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match = 'There must be one row for each age band in each group'):
+            ph_life_expectancy(self.data.iloc[1:], 'deaths', 'pops', 'age', 'area')
+
+        with pytest.raises(ValueError, match = 'The first age band must start at 0'):
+            ph_life_expectancy(self.data.assign(age = self.data['age'] + 1), 'deaths', 'pops', 'age', 'area')
+
+        with pytest.raises(ValueError, match = "'le_age' must be 'all' or the start age"):
+            ph_life_expectancy(self.data, 'deaths', 'pops', 'age', 'area', le_age = 3)
+
+        with pytest.raises(ValueError, match = "'ageband' is not a column header"):
+            ph_life_expectancy(self.data, 'deaths', 'pops', 'ageband', 'area')
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..parallel import parallel_group_sums, partial_group_sums, shared_arrays, attach_array
+from ..utils import group_sums
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+
+
+class Test_parallel_group_sums:
+
+    df = pd.DataFrame({'area': ['a', 'b', 'c', 'a', 'b', 'c', 'd', 'd'],
+                       'year': [2020, 2020, 2020, 2021, 2021, 2021, 2020, np.nan],
+                       'num': [1.0, np.nan, 3.0, 4.0, 5.0, 6.0, np.nan, 8.0],
+                       'den': [10, 20, 30, 40, 50, 60, 70, 80]})
+
+    def test_shared_arrays(self):
+        arr = np.arange(5, dtype=float)
+        with shared_arrays({'x': arr}) as specs:
+            shm, view = attach_array(specs['x'])
+            np.testing.assert_array_equal(view, arr)
+            del view
+            shm.close()
+
+    def test_partial_sums(self):
+        codes = np.array([0, 1, -1, 1])
+
+        with shared_arrays({'codes': codes}) as specs:
+            sums, nulls = partial_group_sums(specs, 0, 4, 2)
+            assert sums.shape == nulls.shape == (0, 2)
+
+        # the shared blocks are still closed, without hiding the error, when a column can't be summed
+        with shared_arrays({'codes': codes, 'col0': np.array(['a', 'b', 'c', 'd'])}) as specs:
+            with pytest.raises(ValueError, match = 'could not convert string to float'):
+                partial_group_sums(specs, 0, 4, 2)
+
+    @pytest.mark.parametrize('group_cols', [['area'], ['area', 'year']])
+    def test_matches_serial(self, group_cols):
+        df = parallel_group_sums(self.df, group_cols, ['num', 'den'], workers = 2)
+        assert_frame_equal(df, group_sums(self.df, group_cols, ['num', 'den']))
+
+    def test_skipna(self):
+        df = group_sums(self.df, ['area'], ['num', 'den'], skipna_cols = ['num'], workers = 3)
+        assert_frame_equal(df, group_sums(self.df, ['area'], ['num', 'den'], skipna_cols = ['num']))
+
+    @pytest.mark.parametrize('workers', [0, 1.5])
+    def test_workers_error(self, workers):
+        with pytest.raises(ValueError, match="'workers' must be a positive integer"):
+            group_sums(self.df, ['area'], ['num'], workers = workers)
+
+
+class Test_parallel_statistics:
+
+    path = Path(__file__).parent / 'test_data'
+
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name='testdata_multiarea')
+
+    def test_rate(self):
+        assert_frame_equal(ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area', workers = 2),
+                           ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area'))
+
+    def test_dsr(self):
+        assert_frame_equal(ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', group_cols = 'area', workers = 2),
+                           ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', group_cols = 'area'))
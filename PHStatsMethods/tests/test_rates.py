@@ -46,5 +46,9 @@ class Test_rates:
     def test_group(self):
         df = ph_rate(self.data, 'Numerator', 'Denominator', group_cols = 'Area').drop(['Confidence','Method'], axis=1)
         assert_frame_equal(df, self.data_group.drop(['Method','Confidence'], axis=1))
-    
 
+    def test_dtypes(self):
+        # the numerator and denominator are summed together, so an integer denominator is summed as a float
+        data = self.data.iloc[:8, :3].astype({'Numerator': float, 'Denominator': int})
+        df = ph_rate(data, 'Numerator', 'Denominator', 'Area')
+        assert (df['Numerator'].dtype, df['Denominator'].dtype) == ('float64', 'float64')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..rolling import ph_rolling_periods
+from ..rates import ph_rate
+from ..proportions import ph_proportion
+from ..DSR import ph_dsr
+from ..ISRate import ph_ISRate
+
+
+def yearly_data():
+    """The test data, without nulls, repeated for each year from 2010 to 2017 with counts varying between years."""
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    base = pd.read_excel(path, sheet_name = 'testdata_multiarea_isr')
+    base = base.assign(pop = base['pop'].fillna(1000), refcount = base.groupby('ageband')['refcount'].transform('max'))
+    rng = np.random.default_rng(3)
+
+    return pd.concat([base.assign(year = year, count = rng.poisson(base['count'].fillna(0) + 1))
+                      for year in range(2010, 2018)], ignore_index = True)
+
+
+class Test_rolling_periods:
+
+    data = yearly_data()
+
+    def per_window(self, func, df, *args, periods = 3, strata_cols = None, **kwargs):
+        """The statistic calculated separately for each window, on copies of the data filtered and summed."""
+
+        results = []
+
+        for end in range(2010 + periods - 1, 2018):
+            window = df[df['year'].between(end - periods + 1, end)]
+            window = window.groupby(['area'] + (strata_cols or []))[['count', 'pop']].sum().reset_index()
+            results.append(func(window.assign(year = end), *args, group_cols = ['area', 'year'], **kwargs))
+
+        return pd.concat(results).sort_values(['area', 'year']).reset_index(drop = True)
+
+    @pytest.mark.parametrize('periods', [1, 3, 5])
+    def test_rate(self, periods):
+        df = ph_rolling_periods(self.data, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'year',
+                                periods = periods, group_cols = 'area', confidence = [0.95, 0.998])
+        expected = self.per_window(ph_rate, self.data, 'count', 'pop', periods = periods, confidence = [0.95, 0.998])
+
+        assert len(df) == 3 * (8 - periods + 1)
+        assert_frame_equal(df, expected, check_dtype = False)
+
+    def test_dsr(self):
+        df = ph_rolling_periods(self.data, ph_dsr, 'count', 'pop', 'ageband', sum_cols = ['count', 'pop'],
+                                period_col = 'year', periods = 5, group_cols = 'area', strata_cols = 'ageband')
+        expected = self.per_window(ph_dsr, self.data, 'count', 'pop', 'ageband', periods = 5, strata_cols = ['ageband'])
+
+        np.testing.assert_allclose(df['Value'], expected['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(df['lower_95_ci'], expected['lower_95_ci'], rtol = 1e-12)
+
+    def test_israte(self):
+        strata = ['ageband', 'refcount', 'refpop']
+        df = ph_rolling_periods(self.data, ph_ISRate, 'count', 'pop', 'refcount', 'refpop', sum_cols = ['count', 'pop'],
+                                period_col = 'year', group_cols = 'area', strata_cols = strata)
+        expected = self.per_window(ph_ISRate, self.data, 'count', 'pop', 'refcount', 'refpop', strata_cols = strata)
+
+        np.testing.assert_allclose(df['Value'], expected['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(df['upper_95_ci'], expected['upper_95_ci'], rtol = 1e-12)
+
+    def test_missing_periods(self):
+        data = self.data[~((self.data['area'] == self.data['area'][0]) & (self.data['year'] == 2013))]
+        df = ph_rolling_periods(data, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'year',
+                                group_cols = 'area', metadata = False)
+
+        # windows including 2013 aren't calculated for the first area
+        first = df[df['area'] == self.data['area'][0]]
+        assert list(first['year']) == [2012, 2016, 2017]
+        assert len(df) == len(first) + 2 * 6
+
+    def test_nulls(self):
+        data = self.data.astype({'count': float})
+        data.loc[(data['area'] == data['area'][0]) & (data['year'] == 2011), 'count'] = np.nan
+        df = ph_rolling_periods(data, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'year',
+                                group_cols = 'area', metadata = False)
+
+        first = df[df['area'] == data['area'][0]]
+        assert list(first['Value'].isna()) == [True, True, False, False, False, False]
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match = "'periods' must be a positive integer"):
+            ph_rolling_periods(self.data, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'year',
+                               periods = 0)
+
+        with pytest.raises(ValueError, match = "'year' must contain whole numbers for every row"):
+            ph_rolling_periods(self.data.assign(year = self.data['year'] + 0.5), ph_rate, 'count', 'pop',
+                               sum_cols = ['count', 'pop'], period_col = 'year')
+
+        with pytest.raises(ValueError, match = "'period' is not a column header"):
+            ph_rolling_periods(self.data, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'period')
+
+    def test_fractional(self):
+        rng = np.random.default_rng(7)
+        data = pd.DataFrame({'area': np.repeat(np.arange(6000), 10), 'year': np.tile(np.arange(2010, 2020), 6000),
+                             'pop': np.round(rng.uniform(0, 1000, 60000), 1)})
+        data['count'] = data['pop']
+
+        # windows where the numerator equals the denominator sum to the same value, whatever the size of the table
+        df = ph_rolling_periods(data, ph_proportion, 'count', 'pop', sum_cols = ['count', 'pop'], period_col = 'year',
+                                group_cols = 'area', metadata = False)
+        direct = sum(data.groupby('area')['pop'].shift(lag) for lag in range(3)).dropna()
+
+        assert (df['count'] == df['pop']).all()
+        np.testing.assert_allclose(df['pop'], direct, rtol = 1e-12)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..rollup import ph_rollup
+from ..rates import ph_rate
+from ..proportions import ph_proportion
+from ..DSR import ph_dsr
+from ..ISRatio import ph_ISRatio
+
+
+class Test_rollup:
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    data = pd.read_excel(path, sheet_name = 'testdata_multigroup')
+    isr_data = pd.read_excel(path, sheet_name = 'testdata_multiarea_isr')
+
+    areas = sorted(data['area'].unique())
+    lookup = pd.DataFrame({'area': areas, 'region': ['North'] + ['South'] * (len(areas) - 1), 'country': 'England'})
+
+    def per_level(self, func, df, *args, group_cols = None, strata_cols = None, **kwargs):
+        """The statistic calculated separately for each level, on copies of the data summed to that level."""
+
+        results = []
+
+        for level in ['area', 'region', 'country']:
+            summed = df if level == 'area' else df.merge(self.lookup[['area', level]], on = 'area').drop(columns = 'area')
+            keys = [level] + (group_cols or []) + (strata_cols or [])
+            summed = summed.groupby(keys)[['count', 'pop']].sum().reset_index()
+            result = func(summed, *args, group_cols = [level] + (group_cols or []), **kwargs)
+            results.append(result.rename(columns = {level: 'area'}).assign(level = level))
+
+        df = pd.concat(results, ignore_index = True)
+        df['level'] = pd.Categorical(df['level'], categories = ['area', 'region', 'country'], ordered = True)
+
+        return df[['level'] + [col for col in df.columns if col != 'level']]
+
+    def test_rate(self):
+        df = ph_rollup(self.data, self.lookup, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], group_cols = 'year',
+                       confidence = [0.95, 0.998])
+        expected = self.per_level(ph_rate, self.data, 'count', 'pop', group_cols = ['year'], confidence = [0.95, 0.998])
+
+        assert list(df['level'].unique()) == ['area', 'region', 'country']
+        assert_frame_equal(df, expected, check_dtype = False)
+
+    def test_proportion(self):
+        df = ph_rollup(self.data.assign(pop = self.data['pop'] * 10), self.lookup, ph_proportion, 'count', 'pop',
+                       sum_cols = ['count', 'pop'], multiplier = 100)
+        expected = self.per_level(ph_proportion, self.data.assign(pop = self.data['pop'] * 10), 'count', 'pop',
+                                  multiplier = 100)
+
+        assert_frame_equal(df, expected, check_dtype = False)
+
+    def test_dsr(self):
+        df = ph_rollup(self.data, self.lookup, ph_dsr, 'count', 'pop', 'ageband', sum_cols = ['count', 'pop'],
+                       group_cols = 'year', strata_cols = 'ageband')
+        expected = self.per_level(ph_dsr, self.data, 'count', 'pop', 'ageband', group_cols = ['year'],
+                                  strata_cols = ['ageband'])
+
+        assert len(df) == 2 * (len(self.areas) + 3)
+        np.testing.assert_allclose(df['Value'], expected['Value'], rtol = 1e-12)
+        np.testing.assert_allclose(df['upper_95_ci'], expected['upper_95_ci'], rtol = 1e-12)
+
+    def test_isratio(self):
+        lookup = self.lookup.assign(area = sorted(self.isr_data['area'].unique()))
+        df = ph_rollup(self.isr_data, lookup, ph_ISRatio, 'count', 'pop', 'refcount', 'refpop',
+                       sum_cols = ['count', 'pop'], strata_cols = ['ageband', 'refcount', 'refpop'])
+
+        country = ph_ISRatio(self.isr_data.assign(country = 'England'), 'count', 'pop', 'refcount', 'refpop', 'country')
+        areas = ph_ISRatio(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area')
+
+        np.testing.assert_allclose(df['Value'].iloc[:3], areas['Value'], rtol = 1e-12)
+        assert df['Value'].iloc[-1] == pytest.approx(country['Value'][0], rel = 1e-12)
+
+    def test_levels(self):
+        df = ph_rollup(self.data, self.lookup, ph_rate, 'count', 'pop', sum_cols = ['count', 'pop'], group_cols = 'year',
+                       levels = ['area', 'country'], level_col = 'geography', area_col = 'code', metadata = False)
+
+        assert list(df.columns[:3]) == ['geography', 'code', 'year']
+        assert list(df['geography'].unique()) == ['area', 'country']
+
+    def test_errors(self):
+        sum_cols = ['count', 'pop']
+
+        with pytest.raises(ValueError, match = "Every area in the 'area' column must be in the lookup"):
+            ph_rollup(self.data, self.lookup.iloc[1:], ph_rate, 'count', 'pop', sum_cols = sum_cols)
+
+        with pytest.raises(ValueError, match = "Each area in 'region' must be in exactly one area in 'country'"):
+            ph_rollup(self.data, self.lookup.assign(country = ['England'] * (len(self.areas) - 1) + ['Wales']),
+                      ph_rate, 'count', 'pop', sum_cols = sum_cols)
+
+        with pytest.raises(ValueError, match = "'ageband' is not a column header"):
+            ph_rollup(self.data.drop(columns = 'ageband'), self.lookup, ph_rate, 'count', 'pop',
+                      sum_cols = sum_cols, strata_cols = 'ageband')
+
+        with pytest.raises(ValueError, match = "'level' is used for the level and area of each row"):
+            ph_rollup(self.data.rename(columns = {'year': 'level'}), self.lookup, ph_rate, 'count', 'pop',
+                      sum_cols = sum_cols, group_cols = 'level')
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..sii import ph_sii
+from .. import sii
+
+
+path = Path(__file__).parent / 'test_data/testdata_SII.xlsx'
+df = pd.read_excel(path, sheet_name = 'testdata_SII')
+group_cols = ['Area', 'Grouping1', 'Grouping2']
+
+
+def sii_data(description):
+    return df[df['TestDescription'] == description].reset_index(drop = True)
+
+
+def expected(data, rii = True):
+    cols = ['sii', 'sii_lowercl_1', 'sii_uppercl_1'] + (['rii', 'rii_lowercl_1', 'rii_uppercl_1'] if rii else [])
+    return data.groupby(group_cols)[cols + ['Intercept']].first().reset_index()
+
+
+class Test_sii:
+
+    # test description, ph_sii arguments
+    tests = [('default (e.g. life expectancy) - default parameters', {}),
+             ('default - testing 99% confidence', {'confidence': 0.99}),
+             ('default - testing 10,000 repetitions', {'repetitions': 10000}),
+             ('rate (e.g. infant mortality) - default parameters', {'value_type': 1}),
+             ('proportion (e.g. child obesity) - default parameters', {'value_type': 2}),
+             ('proportion - testing multiplier (x 100)', {'value_type': 2, 'multiplier': 100}),
+             ('proportion - testing multiplier (x -100)', {'value_type': 2, 'multiplier': -100}),
+             ('rate (e.g. infant mortality) - log transform with intercept', {'value_type': 1, 'transform': True}),
+             ('rate (e.g. infant mortality) - log transform with negative multiplier',
+              {'value_type': 1, 'transform': True, 'multiplier': -1}),
+             ('rate (e.g. infant mortality) - log transform with 98% CI',
+              {'value_type': 1, 'transform': True, 'confidence': 0.98}),
+             ('proportion (e.g. child obesity) - logit transform with intercept', {'value_type': 2, 'transform': True}),
+             ('proportion (e.g. child obesity) - logit transform with negative multiplier',
+              {'value_type': 2, 'transform': True, 'multiplier': -1}),
+             ('proportion (e.g. child obesity) - logit transform with 98% cis',
+              {'value_type': 2, 'transform': True, 'confidence': 0.98})]
+
+    @pytest.mark.parametrize('description, kwargs', tests)
+    def test_expected(self, description, kwargs):
+        data = sii_data(description)
+        result = ph_sii(data, 'Quantile', 'Population', 'Value', group_cols, lower_cl_col = 'LowerCL',
+                        upper_cl_col = 'UpperCL', rii = True, intercept = True, seed = 42, **kwargs)
+        exp = expected(data)
+        ci = 'lower_' + str(round(kwargs.get('confidence', 0.95) * 100)) + '_ci'
+
+        np.testing.assert_allclose(result['sii'], exp['sii'], rtol = 1e-10)
+        np.testing.assert_allclose(result['rii'], exp['rii'], rtol = 1e-10)
+
+        if exp['Intercept'].notna().all():
+            np.testing.assert_allclose(result['intercept'], exp['Intercept'], rtol = 1e-10)
+
+        # Monte Carlo confidence limits agree to within simulation error
+        scale = np.abs(exp['sii_uppercl_1'] - exp['sii_lowercl_1'])
+        assert (np.abs(result[f'sii_{ci}'] - exp['sii_lowercl_1']) < 0.05 * scale).all()
+        assert (np.abs(result[f'sii_{ci.replace("lower", "upper")}'] - exp['sii_uppercl_1']) < 0.05 * scale).all()
+
+        scale = np.abs(exp['rii_uppercl_1'] - exp['rii_lowercl_1'])
+        assert (np.abs(result[f'rii_{ci}'] - exp['rii_lowercl_1']) < 0.05 * scale).all()
+        assert (np.abs(result[f'rii_{ci.replace("lower", "upper")}'] - exp['rii_uppercl_1']) < 0.05 * scale).all()
+
+    def test_se(self):
+        data = sii_data('default (e.g. life expectancy) - default parameters')
+        result = ph_sii(data, 'Quantile', 'Population', 'Value', group_cols, se_col = 'StandardError', seed = 42)
+        exp = expected(data)
+
+        scale = exp['sii_uppercl_1'] - exp['sii_lowercl_1']
+        assert (np.abs(result['sii_lower_95_ci'] - exp['sii_lowercl_1']) < 0.05 * scale).all()
+        assert list(result.columns) == group_cols + ['sii', 'sii_lower_95_ci', 'sii_upper_95_ci',
+                                                     'Statistic', 'Confidence', 'Method']
+
+    def test_counts(self):
+        data = sii_data('proportion (e.g. child obesity) - default parameters')
+        result = ph_sii(data, 'Quantile', 'Population', 'Value', group_cols, value_type = 2, count_col = 'Count',
+                        seed = 42, metadata = False)
+        exp = expected(data)
+
+        np.testing.assert_allclose(result['sii'], exp['sii'], rtol = 1e-10)
+        scale = exp['sii_uppercl_1'] - exp['sii_lowercl_1']
+        assert (np.abs(result['sii_lower_95_ci'] - exp['sii_lowercl_1']) < 0.05 * scale).all()
+
+    def test_quintiles(self):
+        data = sii_data('default - testing quintiles')
+        result = ph_sii(data, 'Quantile', 'Population', 'Value', group_cols, lower_cl_col = 'LowerCL',
+                        upper_cl_col = 'UpperCL', rii = True, confidence = None, metadata = False)
+
+        assert list(result.columns) == group_cols + ['sii', 'rii']
+        np.testing.assert_allclose(result['sii'], expected(data)['sii'], rtol = 1e-10)
+
+    def test_seed(self, monkeypatch):
+        data = sii_data('default (e.g. life expectancy) - default parameters')
+        args = (data, 'Quantile', 'Population', 'Value', group_cols)
+        kwargs = {'lower_cl_col': 'LowerCL', 'upper_cl_col': 'UpperCL', 'rii': True, 'repetitions': 10000}
+
+        # small chunks, so the simulations are split between workers
+        monkeypatch.setattr(sii, 'SIMULATION_CHUNK', 100000)
+        first = ph_sii(*args, seed = 7, **kwargs)
+
+        assert_frame_equal(first, ph_sii(*args, seed = 7, **kwargs))
+        assert_frame_equal(first, ph_sii(*args, seed = 7, workers = 2, **kwargs))
+        assert not first.equals(ph_sii(*args, seed = 8, **kwargs))
+
+    def test_missing(self):
+        data = sii_data('warning handling - missing populations, counts or values')
+
+        with pytest.warns(UserWarning, match = 'The SII was not calculated'):
+            result = ph_sii(data, 'Quantile', 'Population', 'Value', group_cols, lower_cl_col = 'LowerCL',
+                            upper_cl_col = 'UpperCL', repetitions = 1000, seed = 1)
+
+        assert result[['sii', 'sii_lower_95_ci', 'sii_upper_95_ci']].isna().all().all()
+
+    def test_errors(self):
+        data = sii_data('default (e.g. life expectancy) - default parameters')
+        args = ('Quantile', 'Population', 'Value', group_cols)
+        cls = {'lower_cl_col': 'LowerCL', 'upper_cl_col': 'UpperCL'}
+
+        with pytest.raises(ValueError, match = 'No negative numbers'):
+            ph_sii(sii_data('error handling - negative populations'), *args, **cls)
+
+        with pytest.raises(ValueError, match = 'No negative numbers'):
+            ph_sii(data.assign(StandardError = -data['StandardError']), *args, se_col = 'StandardError')
+
+        with pytest.raises(ValueError, match = 'Proportions and their confidence limits must be between 0 and 1'):
+            ph_sii(data.assign(UpperCL = 1.5), *args, value_type = 2, **cls)
+
+        with pytest.raises(ValueError, match = "'se_col', or 'lower_cl_col' and 'upper_cl_col', must be given"):
+            ph_sii(data, *args)
+
+        with pytest.raises(ValueError, match = "'transform' can only be used for rates"):
+            ph_sii(data, *args, transform = True, **cls)
+
+        with pytest.raises(ValueError, match = 'There must be one row with a quantile for each quantile'):
+            ph_sii(pd.concat([data, data.iloc[:1]]), *args, **cls)
+
+        with pytest.raises(ValueError, match = "'repetitions' must be an integer of at least 1000"):
+            ph_sii(data, *args, repetitions = 10, **cls)
+
+        with pytest.raises(ValueError, match = "'Values' is not a column header"):
+            ph_sii(data, 'Quantile', 'Population', 'Values', group_cols, **cls)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sqlite3
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..sql import ph_from_sql, aggregate_query
+from ..rates import ph_rate, RateState
+from ..proportions import ph_proportion
+from ..DSR import ph_dsr
+from ..ISRate import ph_ISRate
+from ..ISRatio import ph_ISRatio
+from ..means import ph_mean
+
+
+class Test_from_sql:
+
+    path = Path(__file__).parent / 'test_data/testdata_DSR_ISR.xlsx'
+    data = pd.read_excel(path, sheet_name = 'testdata_multigroup')
+    isr_data = pd.read_excel(path, sheet_name = 'testdata_multiarea_isr')
+
+    @pytest.fixture
+    def connection(self):
+        """An in-memory SQLite database holding the test data."""
+
+        connection = sqlite3.connect(':memory:')
+        self.data.to_sql('data', connection, index = False)
+        self.isr_data.to_sql('isr', connection, index = False)
+
+        yield connection
+        connection.close()
+
+    def test_rate(self, connection):
+        df = ph_from_sql(connection, 'data', ph_rate, 'count', 'pop', group_cols = ['area', 'year'], confidence = [0.95, 0.998])
+        expected = ph_rate(self.data, 'count', 'pop', ['area', 'year'], confidence = [0.95, 0.998])
+
+        assert_frame_equal(df, expected, check_dtype = False)
+
+    def test_proportion_rows(self, connection):
+        df = ph_from_sql(connection, 'data', ph_proportion, 'count', 'pop', where = 'year = ? AND "count" > ?',
+                         params = [2016, 0], multiplier = 100)
+        data = self.data[(self.data['year'] == 2016) & (self.data['count'] > 0)]
+
+        # ungrouped proportions are calculated for each selected row
+        assert len(df) == len(data)
+        assert_frame_equal(df, ph_proportion(data, 'count', 'pop', multiplier = 100), check_dtype = False)
+
+    def test_dsr(self, connection):
+        df = ph_from_sql(connection, 'data', ph_dsr, 'count', 'pop', 'ageband', group_cols = ['area', 'year'])
+        expected = ph_dsr(self.data, 'count', 'pop', 'ageband', ['area', 'year'])
+
+        assert_frame_equal(df, expected, check_dtype = False, rtol = 1e-12)
+
+    def test_dsr_ungrouped(self, connection):
+        df = ph_from_sql(connection, 'data', ph_dsr, 'count', 'pop', 'ageband', where = "area = 'testdata_big' AND year = 2015")
+        expected = ph_dsr(self.data[(self.data['area'] == 'testdata_big') & (self.data['year'] == 2015)], 'count', 'pop', 'ageband')
+
+        assert_frame_equal(df, expected, check_dtype = False, rtol = 1e-12)
+
+    @pytest.mark.parametrize('func', [ph_ISRate, ph_ISRatio])
+    def test_isr(self, connection, func):
+        df = ph_from_sql(connection, 'isr', func, 'count', 'pop', 'refcount', 'refpop', group_cols = 'area')
+        expected = func(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area')
+
+        assert_frame_equal(df, expected, check_dtype = False, rtol = 1e-12)
+
+    @pytest.mark.parametrize('func', [ph_ISRate, ph_ISRatio])
+    @pytest.mark.parametrize('col, value', [('count', -1), ('pop', -1), ('refcount', -1), ('refpop', 0)])
+    def test_isr_errors(self, connection, func, col, value):
+        connection.execute(f'UPDATE isr SET "{col}" = {value} WHERE rowid = 1')
+        data = pd.read_sql('SELECT * FROM isr', connection)
+
+        # the checks made in the query raise the same error as the statistic calculated in Python
+        with pytest.raises(ValueError) as expected:
+            func(data, 'count', 'pop', 'refcount', 'refpop', 'area')
+
+        with pytest.raises(ValueError, match = str(expected.value)):
+            ph_from_sql(connection, 'isr', func, 'count', 'pop', 'refcount', 'refpop', group_cols = 'area')
+
+    def test_query(self, connection):
+        query, checks = aggregate_query(connection, RateState('count', 'pop', 'area'), 'data', 'year = ?')
+
+        # only the sums and checks of each group are returned
+        assert query.startswith('SELECT "area", CASE WHEN COUNT("count") = COUNT(*) THEN SUM("count") END AS "count"')
+        assert query.endswith('FROM data WHERE (year = ?) AND "area" IS NOT NULL GROUP BY "area" ORDER BY "area"')
+        assert list(checks.values()) == ['No negative numbers can be used to calculate these statistics',
+                                         'Denominators must be greater than zero']
+
+    def test_nulls(self, connection):
+        connection.execute('UPDATE data SET "count" = NULL WHERE area = \'testdata_tiny\' AND ageband = \'0-4\'')
+        data = self.data.assign(count = np.where((self.data['area'] == 'testdata_tiny') & (self.data['ageband'] == '0-4'),
+                                                 np.nan, self.data['count']))
+
+        assert_frame_equal(ph_from_sql(connection, 'data', ph_rate, 'count', 'pop', group_cols = ['area', 'year']),
+                           ph_rate(data, 'count', 'pop', ['area', 'year']), check_dtype = False)
+        assert_frame_equal(ph_from_sql(connection, 'data', ph_dsr, 'count', 'pop', 'ageband', group_cols = ['area', 'year']),
+                           ph_dsr(data, 'count', 'pop', 'ageband', ['area', 'year']), check_dtype = False, rtol = 1e-12)
+
+    def test_duckdb(self):
+        duckdb = pytest.importorskip('duckdb')
+        connection = duckdb.connect()
+        connection.register('data_view', self.data)
+        connection.execute('CREATE TABLE data AS SELECT * FROM data_view')
+
+        df = ph_from_sql(connection, 'data', ph_dsr, 'count', 'pop', 'ageband', group_cols = ['area', 'year'],
+                         where = 'year >= ?', params = [2015])
+
+        assert_frame_equal(df, ph_dsr(self.data, 'count', 'pop', 'ageband', ['area', 'year']), check_dtype = False,
+                           rtol = 1e-12)
+
+    def test_errors(self, connection):
+        with pytest.raises(ValueError, match = 'Numerators must be less than or equal to the denominator'):
+            ph_from_sql(connection, '(SELECT area, "count" + 1 AS "count", "count" AS pop FROM data)', ph_proportion,
+                        'count', 'pop', group_cols = 'area', where = 'pop > 0')
+
+        with pytest.raises(ValueError, match = 'Denominators must be greater than zero'):
+            ph_from_sql(connection, '(SELECT area, "count", 0 AS pop FROM data)', ph_rate, 'count', 'pop', group_cols = 'area')
+
+        with pytest.raises(ValueError, match = "'deaths' is not a column header"):
+            ph_from_sql(connection, 'data', ph_rate, 'deaths', 'pop', group_cols = 'area')
+
+        with pytest.raises(ValueError, match = "'ph_mean' can't be calculated in a database"):
+            ph_from_sql(connection, 'data', ph_mean, 'count', 'area')
+
+        with pytest.raises(ValueError, match = 'No rows of the table were selected'):
+            ph_from_sql(connection, 'data', ph_rate, 'count', 'pop', group_cols = 'area', where = 'year = 2000')
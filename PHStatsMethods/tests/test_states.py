@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..proportions import ph_proportion, ProportionState
+from ..rates import ph_rate, RateState
+from ..DSR import ph_dsr, DSRState
+from ..ISRate import ph_ISRate, ISRateState
+from ..ISRatio import ph_ISRatio, ISRatioState
+from ..means import ph_mean, MeanState
+from ..streaming import GroupSums
+
+
+def shard(state, df, n = 3):
+    """Updates copies of a state with shards of the data, serialises them and merges them back together."""
+    states = [copy.deepcopy(state).update(df.iloc[idx])
+              for idx in np.array_split(np.arange(len(df)), n)]
+
+    merged = states[0]
+    for other in states[1:]:
+        merged.merge(type(state).from_bytes(other.to_bytes()))
+
+    return merged
+
+
+class Test_states:
+
+    path = Path(__file__).parent / 'test_data'
+
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+    isr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_isr')
+    isr_lookup = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_lookup')
+    isr_refdata = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'refdata')
+    mean_data = pd.read_excel(path / 'testdata_Mean.xlsx', sheet_name = 'testdata_Mean')
+
+    @pytest.mark.parametrize('group_cols', [None, 'Area'])
+    def test_proportion(self, group_cols):
+        state = shard(ProportionState('Numerator', 'Denominator', group_cols, multiplier = 100), self.prop_data)
+        assert_frame_equal(state.finalize(confidence = [0.95, 0.998]),
+                           ph_proportion(self.prop_data, 'Numerator', 'Denominator', group_cols,
+                                         confidence = [0.95, 0.998], multiplier = 100))
+
+    @pytest.mark.parametrize('group_cols', [None, 'Area'])
+    def test_rate(self, group_cols):
+        state = shard(RateState('Numerator', 'Denominator', group_cols), self.rate_data)
+        assert_frame_equal(state.finalize(), ph_rate(self.rate_data, 'Numerator', 'Denominator', group_cols))
+
+    def test_dsr(self):
+        state = shard(DSRState('count', 'pop', 'ageband', 'area'), self.dsr_data)
+        assert_frame_equal(state.finalize(confidence = [0.95, 0.998]),
+                           ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', 'area', confidence = [0.95, 0.998]))
+
+    def test_israte(self):
+        kwargs = {'obs_df': self.isr_lookup, 'obs_join_left': 'area', 'obs_join_right': 'area',
+                  'ref_df': self.isr_refdata, 'ref_join_left': 'ageband', 'ref_join_right': 'Age Band'}
+        data = self.isr_data.drop(columns = ['refcount', 'refpop'])
+        state = shard(ISRateState('total_count', 'pop', 'refcount', 'refpop', 'area', **kwargs), data)
+        assert_frame_equal(state.finalize(), ph_ISRate(data, 'total_count', 'pop', 'refcount', 'refpop', 'area', **kwargs))
+
+    def test_isratio(self):
+        state = shard(ISRatioState('count', 'pop', 'refcount', 'refpop', 'area', refvalue = 100), self.isr_data)
+        assert_frame_equal(state.finalize(), ph_ISRatio(self.isr_data, 'count', 'pop', 'refcount', 'refpop', 'area', refvalue = 100))
+
+    def test_mean(self):
+        state = shard(MeanState('values', 'area'), self.mean_data, n = 4)
+        assert_frame_equal(state.finalize(), ph_mean(self.mean_data, 'values', 'area'))
+
+    def test_merge_type_error(self):
+        with pytest.raises(TypeError, match = 'Only a RateState can be merged into a RateState'):
+            RateState('Numerator', 'Denominator').merge(ProportionState('Numerator', 'Denominator'))
+
+    def test_from_bytes_error(self):
+        data = RateState('Numerator', 'Denominator').update(self.rate_data).to_bytes()
+        with pytest.raises(ValueError, match = 'Serialised state is a RateState, not a ProportionState'):
+            ProportionState.from_bytes(data)
+
+    def test_empty_error(self):
+        with pytest.raises(ValueError, match = 'No data has been added'):
+            RateState('Numerator', 'Denominator').finalize()
+
+    def test_abstract(self):
+        with pytest.raises(TypeError):
+            GroupSums(None, ['Numerator'])
+
+    @pytest.mark.parametrize('kwargs', [{'group_cols': 'Area'}, {'multiplier': 1000}, {'metadata': False}])
+    def test_merge_params_error(self, kwargs):
+        with pytest.raises(ValueError, match = 'Only states created with the same arguments can be merged'):
+            RateState('Numerator', 'Denominator').merge(RateState('Numerator', 'Denominator', **kwargs))
+
+    def test_merge_ref_df_error(self):
+        kwargs = {'ref_join_left': 'ageband', 'ref_join_right': 'Age Band'}
+        state = ISRateState('count', 'pop', 'refcount', 'refpop', 'area', ref_df = self.isr_refdata, **kwargs)
+        other = ISRateState('count', 'pop', 'refcount', 'refpop', 'area', ref_df = self.isr_refdata.assign(refcount = 1), **kwargs)
+        with pytest.raises(ValueError, match = 'Only states created with the same arguments can be merged'):
+            state.merge(other)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.testing import assert_frame_equal
+
+from ..proportions import ph_proportion
+from ..rates import ph_rate
+from ..DSR import ph_dsr
+from ..ISRate import ph_ISRate
+from ..streaming import is_chunked
+
+
+def chunks(df, n = 4):
+    """Splits data into n chunks, so most groups are split across chunks."""
+    return (df.iloc[idx] for idx in np.array_split(np.arange(len(df)), n))
+
+
+class Test_is_chunked:
+
+    def test_frame(self):
+        assert not is_chunked(pd.DataFrame({'a': [1]}))
+
+    def test_chunks(self):
+        assert is_chunked([pd.DataFrame({'a': [1]})])
+        assert is_chunked(chunks(pd.DataFrame({'a': [1]})))
+
+    def test_not_frames(self):
+        with pytest.raises(ValueError, match="'df' argument must be a Pandas DataFrame or an iterable of DataFrame chunks"):
+            ph_rate([('area1', 30, 40)], 'num', 'den')
+
+
+class Test_chunked_statistics:
+
+    path = Path(__file__).parent / 'test_data'
+
+    prop_data = pd.read_excel(path / 'testdata_Proportion.xlsx', sheet_name = 'testdata_Prop').iloc[:, :3]
+    rate_data = pd.read_excel(path / 'testdata_Rate.xlsx', sheet_name = 'testdata_Rate').iloc[:, :3]
+    dsr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea')
+    ref_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_1976')
+    isr_data = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_isr')
+    isr_lookup = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'testdata_multiarea_lookup')
+    isr_refdata = pd.read_excel(path / 'testdata_DSR_ISR.xlsx', sheet_name = 'refdata')
+
+    @pytest.mark.parametrize('group_cols', [None, 'Area'])
+    def test_proportion(self, group_cols):
+        df = ph_proportion(chunks(self.prop_data), 'Numerator', 'Denominator', group_cols, confidence = [0.95, 0.998])
+        assert_frame_equal(df, ph_proportion(self.prop_data, 'Numerator', 'Denominator', group_cols, confidence = [0.95, 0.998]))
+
+    @pytest.mark.parametrize('group_cols', [None, 'Area'])
+    def test_rate(self, group_cols):
+        df = ph_rate(chunks(self.rate_data), 'Numerator', 'Denominator', group_cols)
+        assert_frame_equal(df, ph_rate(self.rate_data, 'Numerator', 'Denominator', group_cols))
+
+    def test_csv_chunks(self, tmp_path):
+        self.rate_data.to_csv(tmp_path / 'rates.csv', index = False)
+        df = ph_rate(pd.read_csv(tmp_path / 'rates.csv', chunksize = 5), 'Numerator', 'Denominator', 'Area')
+        assert_frame_equal(df, ph_rate(self.rate_data, 'Numerator', 'Denominator', 'Area'), check_dtype = False)
+
+    def test_dsr_esp(self):
+        df = ph_dsr(chunks(self.dsr_data, 5), 'count', 'pop', 'ageband', group_cols = 'area', confidence = [0.95, 0.998])
+        assert_frame_equal(df, ph_dsr(self.dsr_data, 'count', 'pop', 'ageband', group_cols = 'area', confidence = [0.95, 0.998]))
+
+    def test_dsr_ref_df(self):
+        kwargs = {'euro_standard_pops': False, 'ref_df': self.ref_data[['Age Band', 'esp1976']],
+                  'ref_join_left': 'Age Band', 'ref_join_right': 'Age Band'}
+        df = ph_dsr(chunks(self.ref_data.drop(columns='esp1976')), 'count', 'pop', 'esp1976', **kwargs)
+        assert_frame_equal(df, ph_dsr(self.ref_data.drop(columns='esp1976'), 'count', 'pop', 'esp1976', **kwargs))
+
+    def test_dsr_rows_error(self):
+        with pytest.raises(ValueError, match = 'There must be the same number of rows per group'):
+            ph_dsr(chunks(self.dsr_data.iloc[1:]), 'count', 'pop', 'ageband', group_cols = 'area')
+        
+        with pytest.raises(ValueError, match = 'There must be 19 rows of data per group'):
+            ph_dsr(chunks(self.dsr_data[self.dsr_data['ageband'] != '0-4']), 'count', 'pop', 'ageband', group_cols = 'area')
+
+    def test_dsr_age_error(self):
+        data = self.dsr_data.replace({'ageband': {'0-4': '1-4'}})
+        with pytest.raises(ValueError, match = 'Age bands must start at the lower age'):
+            ph_dsr(chunks(data), 'count', 'pop', 'ageband', group_cols = 'area')
+        
+        data = self.dsr_data.replace({'ageband': {'0-4': '<5'}})
+        with pytest.raises(ValueError, match = 'There are duplicate minimum ages'):
+            ph_dsr(chunks(data), 'count', 'pop', 'ageband', group_cols = 'area')
+
+    def test_israte(self):
+        df = ph_ISRate(chunks(self.isr_data), 'count', 'pop', 'refcount', 'refpop', group_cols = 'area')
+        assert_frame_equal(df, ph_ISRate(self.isr_data, 'count', 'pop', 'refcount', 'refpop', group_cols = 'area'))
+
+    def test_israte_obs_ref(self):
+        kwargs = {'obs_df': self.isr_lookup, 'obs_join_left': 'area', 'obs_join_right': 'area',
+                  'ref_df': self.isr_refdata, 'ref_join_left': 'ageband', 'ref_join_right': 'Age Band'}
+        data = self.isr_data.drop(columns = ['refcount', 'refpop'])
+        df = ph_ISRate(chunks(data), 'total_count', 'pop', 'refcount', 'refpop', group_cols = 'area', **kwargs)
+        assert_frame_equal(df, ph_ISRate(data, 'total_count', 'pop', 'refcount', 'refpop', group_cols = 'area', **kwargs))
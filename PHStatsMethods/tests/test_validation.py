@@ -6,8 +6,11 @@ Created on Tue Apr 02 15:05:42 2024
 """
 
 import pytest
+import warnings
+import numpy as np
 import pandas as pd
-from ..validation import metadata_cols, ci_col, check_cis, format_args, check_arguments, validate_data
+from ..validation import metadata_cols, ci_col, check_cis, format_args, check_arguments, validate_data, assign_columns
+from ..rates import ph_rate
 
 class Test_metadata_cols:
 
@@ -29,6 +32,31 @@ class Test_metadata_cols:
 
 
 
+class Test_assign_columns:
+
+    df = pd.DataFrame({'area': ['a', 'b'], 'Value': [1.0, 2.0]})
+
+    def test_order(self):
+        df = assign_columns(self.df, {'lower': np.array([0.5, 1.5]), 'Value': [3.0, 4.0], 'Statistic': 'Rate'})
+        assert df.columns.tolist() == ['area', 'Value', 'lower', 'Statistic']
+        assert df['Value'].tolist() == [3.0, 4.0] and df['Statistic'].tolist() == ['Rate', 'Rate']
+        assert self.df['Value'].tolist() == [1.0, 2.0]
+
+    def test_no_fragmentation(self):
+        df = pd.DataFrame({'area': np.repeat(np.arange(50), 3), 'num': 5, 'den': 100})
+        
+        confidence = list(np.round(np.linspace(0.9, 0.999, 60), 3))
+
+        # pandas warns when columns are inserted one at a time into a DataFrame of over 100 columns
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', pd.errors.PerformanceWarning)
+            df = ph_rate(df, 'num', 'den', 'area', confidence = confidence)
+
+        assert len(df.columns) > 100
+        assert df.columns[-3:].tolist() == ['Statistic', 'Confidence', 'Method']
+
+
+
 # ci_col()
 class Test_ci_col: 
     def test_ci_col_error(self):
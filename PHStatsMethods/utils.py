@@ -3,9 +3,8 @@
 import re
 import pandas as pd
 import numpy as np
-from scipy import stats
-from scipy.special import ndtri
-from scipy.stats import chi2
+
+from .instrumentation import stage
 
 def get_calc_variables(a):
     """Creates the cumulative normal distribution and z score for a given alpha
@@ -20,12 +19,67 @@ def get_calc_variables(a):
     Float
         Cumulative normal distribution, z score
     """
+    from scipy.special import ndtri
     norm_cum_dist = ndtri((100 + (100 - (100 * (1-a)))) / 200)
     z = ndtri(1 - (1-a )/ 2)
     return norm_cum_dist, z
 
 
 
+def group_sums(df, group_cols, sum_cols, skipna_cols = None, workers = None, grouping = None):
+    """Sums columns within each group, keeping nulls unless a column is listed in skipna_cols.
+    
+    Parameters
+    ----------
+    df
+        DataFrame containing the data to sum.
+    group_cols : list
+        List of column name(s) to group the data by.
+    sum_cols : list
+        List of column name(s) to sum within each group.
+    skipna_cols : list
+        Column name(s) in sum_cols where nulls are treated as zero. Defaults to None.
+    workers : int
+        Number of worker processes to sum the data with. Defaults to None (no parallelism).
+    grouping : Grouping
+        Group codes already factorised from group_cols, so the keys aren't hashed again.
+        Defaults to None.
+
+    Returns
+    ------- 
+    Pandas DataFrame
+        DataFrame of group_cols and the summed sum_cols, one row per group.
+    """
+    
+    skipna_cols = [] if skipna_cols is None else skipna_cols
+    
+    if workers is not None:
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("'workers' must be a positive integer")
+    
+    with stage('group_sums', rows = len(df)) as sums:
+        if workers is not None and workers > 1 and grouping is None:
+            from .parallel import parallel_group_sums
+            df = parallel_group_sums(df, group_cols, sum_cols, skipna_cols, workers)
+        
+        elif grouping is not None:
+            df = grouping.sums(df, sum_cols, skipna_cols, workers)
+        
+        else:
+            grouped = df.groupby(group_cols, observed=True, sort=True)[sum_cols]
+            df = grouped.sum()
+            
+            # groups with a null are null in the columns where nulls are not skipped
+            nulls = grouped.count().lt(grouped.size(), axis=0)
+            nulls[[col for col in sum_cols if col in skipna_cols]] = False
+            df = df.mask(nulls).reset_index() if nulls.to_numpy().any() else df.reset_index()
+        
+        sums.groups, sums.frame = len(df), df
+    
+    return df
+
+
+
 def euro_standard_pop():
     """Generates a dataframe containing the European Standard Population.
     
@@ -48,49 +102,96 @@ def euro_standard_pop():
     return data
 
 
-def join_euro_standard_pops(df, age_col, group_cols = None):
+def join_euro_standard_pops(df, age_col, group_cols = None, grouping = None):
     
     if age_col not in df.columns:
         raise ValueError(f"'{age_col}' is not a column name in the data")
     
     # Check number of rows
     if group_cols is not None:
-        n_group_rows = df.groupby(group_cols).size().reset_index(name='counts')
+        counts = pd.Series(grouping.counts) if grouping is not None else df.groupby(group_cols, observed=True, sort=True).size()
     
-        if n_group_rows.counts.nunique() > 1:
+        if counts.nunique() > 1:
             raise ValueError('There must be the same number of rows per group')
             
-        if n_group_rows.counts.unique() != 19:
+        if counts.unique() != 19:
             raise ValueError('There must be 19 rows of data per group')
             
     else:
         if len(df) != 19:
             raise ValueError('Dataframe, if ungrouped, must have 19 rows for the 19 agebands')
     
+    with stage('esp_join', rows = len(df)) as join:
+        df = join.frame = esp_join(df, age_col, group_cols, grouping)
+    
+    return df
+
+
+
+def esp_join(df, age_col, group_cols = None, grouping = None):
+    """Joins the European Standard Population to each row of data by the rank of its age band within its group."""
+    
     # Get euro standard pops and rank order
     esp = euro_standard_pop()
     esp['n1'] = list(range(1, 20))
     
-    # Get first number of age and sort ascending
-    df['n1'] = df.apply(lambda x: int(re.findall(r'(\d+)', str(x[age_col]))[0]), axis=1)
+    # Get first number of age and sort ascending, without adding a column to the caller's data
+    n1 = df[age_col].map(lambda x: int(re.findall(r'(\d+)', str(x))[0]))
     
-    if df['n1'].nunique() != 19:
+    if n1.nunique() != 19:
         raise ValueError('There are duplicate minimum ages, which is not accepted as the function orders by the first number in each age band.\
                          For example, <5 and 5-10 IS NOT accepted but <=4 and 5-10 IS accepted.')
     
-    # order df values and assign over window
-    df = df.sort_values(by='n1')
+    # rank ages within groups, keeping the order of the rows
     if group_cols is not None:
-        df['n1'] = df.groupby(group_cols)['n1'].rank()
+        keys = [df[col] for col in group_cols] if grouping is None else grouping.grouper
+        n1 = n1.groupby(keys, observed=True, sort=True).rank()
     else:
-        df['n1'] = df['n1'].rank()
+        n1 = n1.rank()
     
     # join by columns
-    df = df.merge(esp, how='left', on='n1').drop('n1', axis=1)
+    df = df.assign(n1=n1).merge(esp, how='left', on='n1')
     
     # Print out age bands for user to check
-    print(df[[age_col, 'esp_age_bands']].drop_duplicates())
+    print(df.sort_values(by='n1', kind='stable')[[age_col, 'esp_age_bands']].drop_duplicates())
+    df = df.drop('n1', axis=1)
     print("Please check how the your ageband columns have joined to the 'esp_age_bands' above")
     
     return df
 
+
+
+
+def map_euro_standard_pops(df, age_col):
+    """Adds the European Standard Population to each row by matching the lower age of each age band.
+    
+    Unlike `join_euro_standard_pops`, this does not need every age band of a group to be in the data,
+    so can be used on chunks of data. Age bands must start at the lower age of a European Standard
+    Population age band (0, 5, 10, ..., 90).
+    
+    Parameters
+    ----------
+    df
+        DataFrame containing the age bands.
+    age_col : str
+        Column name of the age bands.
+
+    Returns
+    ------- 
+    Pandas DataFrame
+        df with the 'euro_standard_pops' column added.
+    """
+    
+    if age_col not in df.columns:
+        raise ValueError(f"'{age_col}' is not a column name in the data")
+    
+    esp = euro_standard_pop()
+    lower_ages = esp['esp_age_bands'].str.extract(r'(\d+)', expand=False).astype(int)
+    
+    ages = df[age_col].astype(str).str.extract(r'(\d+)', expand=False).astype(float)
+    df['euro_standard_pops'] = ages.map(dict(zip(lower_ages, esp['euro_standard_pops'])))
+    
+    if df['euro_standard_pops'].isna().any():
+        raise ValueError('Age bands must start at the lower age of a European Standard Population age band (0, 5, 10, ..., 90)')
+    
+    return df
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import scipy.stats as st
 from math import floor, ceil, sqrt
 
 def poisson_cis(z, x_a, x_b):
@@ -106,6 +105,8 @@ def funnel_ratio_significance(obs, expected, p, side):
 
     The function handles special cases for small sample sizes (less than 10) and a special condition when the observation is zero and considering the lower side. For larger sample sizes (10 or more), it uses adjusted formulas to compute the test statistic.
     """
+    import scipy.stats as st
+    
     # Calculate z once
     z = st.norm.ppf(0.5 + p / 2)
     
@@ -168,6 +169,8 @@ def sigma_adjustment(p, population, average_proportion, side, multiplier):
         
     """
     
+    import scipy.stats as st
+    
     first_part = average_proportion * (population / st.norm.ppf(p)**2 + 1)
     
     adj = sqrt((-8 * average_proportion * (population / st.norm.ppf(p)**2 + 1))**2 - 64 *
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 from decimal import Decimal
+from contextvars import ContextVar
+
+from .instrumentation import stage
+
+
+# DataFrame built for the current call of a statistic (e.g. from Arrow data), which no caller holds
+# so needn't be copied before it is validated
+_private_frame = ContextVar('ph_pkg_private_frame', default=None)
 
 
 def metadata_cols(df, statistic, confidence = None, method = None):
@@ -19,15 +28,53 @@ def metadata_cols(df, statistic, confidence = None, method = None):
 
     """
     
-    df['Statistic'] = statistic
+    for col, value in metadata_columns(statistic, confidence, method).items():
+        df[col] = value
+        
+    return df
+
+
+def metadata_columns(statistic, confidence = None, method = None):
+    """Metadata columns as in `metadata_cols`, as a dictionary of column names and values to add to a DataFrame."""
     
-    if confidence is not None:
-        df['Confidence'] = ', '.join([f'{int(c * 100)}%' if len(str(c)) < 5 else f'{c * 100}%' for c in confidence])
+    with stage('metadata'):
+        columns = {'Statistic': statistic}
+        
+        if confidence is not None:
+            columns['Confidence'] = ', '.join([f'{int(c * 100)}%' if len(str(c)) < 5 else f'{c * 100}%' for c in confidence])
+        
+        if method is not None:
+            columns['Method'] = method
+        
+    return columns
+
+
+def assign_columns(df, columns):
+    """Adds columns to a DataFrame in a single step, rather than inserting them one at a time
+    (which fragments the DataFrame's blocks). Columns which already exist are replaced in place.
     
-    if method is not None:
-        df['Method'] = method
+    Args:
+        df: Pandas DataFrame.
+        columns (dict): Column names and their values (arrays, Series or scalars), in order.
         
-    return df
+    Returns:
+        Pandas DataFrame with the columns added after the existing columns.
+    """
+    
+    existing = [col for col in columns if col in df.columns]
+    
+    if existing:
+        df = df.copy()
+        for col in existing:
+            df[col] = columns[col]
+    
+    new = {col: value.to_numpy() if isinstance(value, pd.Series) else value 
+           for col, value in columns.items() if col not in existing}
+    
+    if not new:
+        return df
+    
+    return pd.concat([df, pd.DataFrame(new, index=df.index)], axis=1)
     
 
 def ci_col(confidence_interval, ci_type = None):
@@ -58,7 +105,46 @@ def ci_col(confidence_interval, ci_type = None):
     
     return col_name
 
-def group_args(df, group_cols, single_grp): 
+def col_values(df, col):
+    """Column of a DataFrame as a float NumPy array, with nulls as NaN, to pass to the core functions."""
+
+    return df[col].to_numpy(dtype=float, na_value=np.nan)
+
+
+def common_dtype(df, cols):
+    """Casts columns summed together to their common NumPy dtype (e.g. an integer denominator to
+    float with a float numerator), as they are when summed as one DataFrame."""
+
+    dtypes = [df[col].dtype for col in cols]
+
+    if not all(isinstance(dtype, np.dtype) and dtype.kind in 'biuf' for dtype in dtypes):
+        return df
+
+    return df.astype({col: np.result_type(*dtypes) for col in cols})
+
+
+def ci_columns(result, confidence):
+    """Lower and upper confidence interval columns from the result of a core function.
+
+    Args:
+        result (dict): Result of a function in `core`, with 'lower' and 'upper' arrays of one row per confidence.
+        confidence (list): Confidence interval(s) calculated, or None.
+
+    Returns:
+        dict of column names and arrays, with lower and upper columns for each confidence interval in turn.
+    """
+
+    columns = {}
+
+    if confidence is not None:
+        for i, c in enumerate(confidence):
+            columns[ci_col(c, 'lower')] = result['lower'][i]
+            columns[ci_col(c, 'upper')] = result['upper'][i]
+
+    return columns
+
+
+def group_args(df, group_cols, single_grp):
     """
     Allows us to group data when group_cols is None in format args.
 
@@ -68,9 +154,14 @@ def group_args(df, group_cols, single_grp):
         single_grp (bool): Determines if ungrouped data should be grouped into a single group (True),
         i.e for quantiles, DSRs, etc. Or if ungrouped data should 'grouped' into multiple rows, i.e
         rates and proportions. 
+
+    Returns
+        The data (a shallow copy with the 'ph_pkg_group' column added, so the data passed isn't changed)
+        and the group columns.
     """
     if group_cols is None: 
         group_cols = ['ph_pkg_group']
+        df = df.copy(deep=False)
 
         if single_grp is True:
             df['ph_pkg_group'] = 'ph_pkg_group'
@@ -149,44 +240,48 @@ def check_arguments(df, columns, metadata = None):
 
 
 ## make sure nulls are np nan?
-def validate_data(df, num_col, group_cols = None, metadata = None, denom_col = None, ref_df = None):
-    
-    # Create copy of data to avoid changing original dataset
-    df = df.copy().reset_index(drop=True)
+def validate_data(df, num_col, group_cols = None, metadata = None, denom_col = None, ref_df = None, grouping = None):
     
-    # adding this as not obvious to pass column as a list for developers using this function
-    if group_cols is not None:
-        if not isinstance(group_cols, list):
-            raise TypeError("Pass 'group_cols' as a list")
-            
-        if ref_df is not None:
-            n_group_rows = df.groupby(group_cols).size().reset_index(name='counts')
-            
-            if n_group_rows.counts.nunique() > 1:
-                raise ValueError('There must be the same number of rows per group')
+    with stage('validate') as validate:
+        # Create copy of data to avoid changing original dataset
+        if df is not _private_frame.get():
+            df = df.copy().reset_index(drop=True)
+        validate.rows, validate.frame = len(df), df
+        
+        # adding this as not obvious to pass column as a list for developers using this function
+        if group_cols is not None:
+            if not isinstance(group_cols, list):
+                raise TypeError("Pass 'group_cols' as a list")
                 
-            if n_group_rows.counts.unique() != len(ref_df):
-                raise ValueError('ref_df length must equal same number of rows in each group within data')
+            if ref_df is not None:
+                # use the rows per group already counted if the group codes have been factorised
+                counts = pd.Series(grouping.counts) if grouping is not None else df.groupby(group_cols, observed=True, sort=True).size()
                 
-    numeric_cols = [num_col] if denom_col is None else [num_col, denom_col]
-
-    check_arguments(df, (numeric_cols if group_cols is None else numeric_cols + group_cols), metadata)
+                if counts.nunique() > 1:
+                    raise ValueError('There must be the same number of rows per group')
+                    
+                if counts.unique() != len(ref_df):
+                    raise ValueError('ref_df length must equal same number of rows in each group within data')
+                    
+        numeric_cols = [num_col] if denom_col is None else [num_col, denom_col]
+    
+        check_arguments(df, (numeric_cols if group_cols is None else numeric_cols + group_cols), metadata)
+                
+        # check numeric columns
+        for col in numeric_cols:
+            if not is_numeric_dtype(df[col]):
+                raise TypeError(f"'{col}' column must be a numeric data type")
             
-    # check numeric columns
-    for col in numeric_cols:
-        if not is_numeric_dtype(df[col]):
-            raise TypeError(f"'{col}' column must be a numeric data type")
-        
-        # No negative values
-        if (df[col] < 0).any():
-            raise ValueError('No negative numbers can be used to calculate these statistics')
-
-    # Denominator must greater than 0
-    if denom_col is not None:
-        if (df[denom_col] <= 0).any():
-            raise ValueError('Denominators must be greater than zero')
-
-    return(df)
+            # No negative values
+            if (df[col] < 0).any():
+                raise ValueError('No negative numbers can be used to calculate these statistics')
+    
+        # Denominator must greater than 0
+        if denom_col is not None:
+            if (df[denom_col] <= 0).any():
+                raise ValueError('Denominators must be greater than zero')
+    
+        return(df)
 
 
 
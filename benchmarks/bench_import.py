@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Times importing the package, and the first use of a statistic, in a fresh interpreter.
+Importing the package should not import pandas or scipy; see tests/test_imports.py.
+
+Run with asv (``asv run --bench bench_import``) or directly with
+``python -m benchmarks.bench_import``.
+"""
+
+import sys
+import subprocess
+
+
+def timeraw_import_package():
+    return "import PHStatsMethods"
+
+
+def timeraw_import_statistic():
+    return "from PHStatsMethods import ph_rate"
+
+
+def timeraw_first_ci():
+    return "from PHStatsMethods import byars_lower; byars_lower(20)"
+
+
+if __name__ == '__main__':
+    for name, code in [('package', timeraw_import_package()), ('statistic', timeraw_import_statistic()),
+                       ('first_ci', timeraw_first_ci())]:
+        timer = f"import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)"
+        seconds = float(subprocess.run([sys.executable, '-c', timer], capture_output=True, text=True, check=True).stdout)
+        print(f'{name:<12}{seconds * 1000:9.1f}ms')
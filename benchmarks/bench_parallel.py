@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Compares sharing the input columns with worker processes through shared memory
+against pickling a slice of them to each worker.
+
+Run with asv (``asv run --bench bench_parallel``) or directly with
+``python -m benchmarks.bench_parallel``.
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from PHStatsMethods.parallel import shared_group_sums
+
+
+WORKERS = min(4, os.cpu_count() or 1)
+NGROUPS = 10000
+
+
+def pickled_partial_sums(codes, values, ngroups):
+    sums = np.zeros((len(values), ngroups))
+    nulls = np.zeros((len(values), ngroups))
+
+    for i, v in enumerate(values):
+        missing = np.isnan(v)
+        sums[i] = np.bincount(codes, weights=np.where(missing, 0, v), minlength=ngroups)
+        nulls[i] = np.bincount(codes, weights=missing, minlength=ngroups)
+
+    return sums, nulls
+
+
+def pickled_group_sums(codes, values, ngroups, workers):
+    bounds = np.linspace(0, len(codes), workers + 1).astype(int)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(pickled_partial_sums, codes[start:stop], [v[start:stop] for v in values], ngroups)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        results = [f.result() for f in futures]
+
+    return sum(s for s, n in results), sum(n for s, n in results)
+
+
+def make_data(rows, ngroups = NGROUPS, seed = 1):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, ngroups, rows)
+    num = rng.poisson(5, rows).astype(float)
+    denom = rng.integers(100, 10000, rows).astype(float)
+
+    return codes, [num, denom]
+
+
+class SharedMemoryTransport:
+
+    params = ([10**6, 10**7, 10**8], ['shared_memory', 'pickle'])
+    param_names = ['rows', 'transport']
+    timeout = 1800
+
+    def setup(self, rows, transport):
+        self.codes, self.values = make_data(rows)
+
+    def time_group_sums(self, rows, transport):
+        func = shared_group_sums if transport == 'shared_memory' else pickled_group_sums
+        func(self.codes, self.values, NGROUPS, WORKERS)
+
+    def peakmem_group_sums(self, rows, transport):
+        func = shared_group_sums if transport == 'shared_memory' else pickled_group_sums
+        func(self.codes, self.values, NGROUPS, WORKERS)
+
+
+if __name__ == '__main__':
+    for rows in SharedMemoryTransport.params[0]:
+        codes, values = make_data(rows)
+
+        for name, func in [('shared_memory', shared_group_sums), ('pickle', pickled_group_sums)]:
+            start = time.perf_counter()
+            func(codes, values, NGROUPS, WORKERS)
+            print(f'{rows:>11,} rows  {name:<14}{time.perf_counter() - start:8.3f}s')
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Times and measures the peak memory of every public statistic on synthetic data shaped like
+the test data in PHStatsMethods/tests/test_data, from 1e3 to 1e7 rows and with varying
+numbers of groups.
+
+Run with asv (``asv run --bench bench_statistics``), which records the results of each
+commit as JSON in .asv/results so ``asv compare`` and ``asv continuous`` catch regressions
+before a release. It can also be run directly with ``python -m benchmarks.bench_statistics``,
+optionally limited to the largest number of rows (e.g. ``--max-rows 100000``), which prints
+the results and appends them as JSON lines to .asv/history.jsonl.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from PHStatsMethods import (ph_proportion, ph_rate, ph_dsr, ph_ISRate, ph_ISRatio, ph_mean, ph_quantile,
+                            ph_life_expectancy,
+                            calculate_funnel_limits, assign_funnel_significance, calculate_funnel_points,
+                            euro_standard_pop)
+
+
+ROWS = [10**3, 10**4, 10**5, 10**6, 10**7]
+GROUPS = [10, 1000, 100000]
+HISTORY = os.path.join('.asv', 'history.jsonl')
+
+
+def make_data(rows, ngroups, seed = 1):
+    """Numerators, denominators and values for each row, in ngroups areas."""
+
+    rng = np.random.default_rng(seed)
+    denominator = rng.integers(1000, 100000, rows)
+
+    return pd.DataFrame({'area': rng.integers(0, ngroups, rows).astype(str),
+                         'numerator': rng.binomial(denominator, 0.01),
+                         'denominator': denominator,
+                         'value': rng.normal(50, 10, rows)})
+
+
+def make_standardised_data(rows, seed = 1):
+    """Events and populations for each European Standard Population age band of rows // 19 areas,
+    with reference events and populations for each age band."""
+
+    bands = euro_standard_pop()['esp_age_bands']
+    nareas = max(rows // len(bands), 1)
+    rng = np.random.default_rng(seed)
+
+    pop = rng.integers(1000, 20000, nareas * len(bands))
+    ref_rate = np.linspace(0.0005, 0.05, len(bands))
+
+    return pd.DataFrame({'area': np.repeat(np.arange(nareas), len(bands)).astype(str),
+                         'ageband': np.tile(bands, nareas),
+                         'count': rng.binomial(pop, np.tile(ref_rate, nareas)),
+                         'pop': pop,
+                         'ref_count': np.tile(ref_rate * 1000000, nareas),
+                         'ref_pop': 1000000})
+
+
+def make_funnel_data(rows, seed = 1):
+    """One row per area, with observed and expected events and crude and directly standardised rates."""
+
+    rng = np.random.default_rng(seed)
+    denominator = rng.integers(1000, 100000, rows)
+    numerator = rng.binomial(denominator, 0.01) + 1
+
+    return pd.DataFrame({'numerator': numerator,
+                         'denominator': denominator,
+                         'expected': denominator * 0.01,
+                         'rate': numerator / denominator * 100000})
+
+
+# the statistics, called with the synthetic data returned for (rows, groups)
+STATISTICS = {
+    'proportion': lambda df: ph_proportion(df, 'numerator', 'denominator', 'area'),
+    'rate': lambda df: ph_rate(df, 'numerator', 'denominator', 'area'),
+    'mean': lambda df: ph_mean(df, 'value', 'area'),
+    'quantile': lambda df: ph_quantile(df, 'value', 'area', nquantiles = 5),
+    'dsr': lambda df: ph_dsr(df, 'count', 'pop', 'ageband', 'area'),
+    'israte': lambda df: ph_ISRate(df, 'count', 'pop', 'ref_count', 'ref_pop', 'area'),
+    'isratio': lambda df: ph_ISRatio(df, 'count', 'pop', 'ref_count', 'ref_pop', 'area'),
+    'life_expectancy': lambda df: ph_life_expectancy(df, 'count', 'pop', 'ageband', 'area'),
+    'funnel_limits': lambda df: calculate_funnel_limits(df, 'numerator', 'proportion', 100, denom_col = 'denominator'),
+    'funnel_significance': lambda df: assign_funnel_significance(df, 'numerator', 'ratio', denom_col = 'expected'),
+    'funnel_points': lambda df: calculate_funnel_points(df, 'numerator', 'rate', 'crude', denom_col = 'denominator'),
+}
+
+GROUPED = ['proportion', 'rate', 'mean', 'quantile']
+STANDARDISED = ['dsr', 'israte', 'isratio', 'life_expectancy']
+
+
+def get_data(statistic, rows, groups):
+    """The synthetic data for a statistic, or None if the number of groups doesn't apply to it."""
+
+    if statistic in GROUPED:
+        return make_data(rows, groups) if groups <= rows else None
+
+    # areas are set by the number of rows for the other statistics, so they're only run once
+    if groups != GROUPS[0]:
+        return None
+
+    return make_standardised_data(rows) if statistic in STANDARDISED else make_funnel_data(rows)
+
+
+def run(statistic, df):
+    # ph_dsr prints the age bands joined to the European Standard Population, and ph_quantile
+    # warns about groups with too few rows
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return STATISTICS[statistic](df)
+
+
+class Statistics:
+
+    params = (list(STATISTICS), ROWS, GROUPS)
+    param_names = ['statistic', 'rows', 'groups']
+    timeout = 1800
+
+    def setup(self, statistic, rows, groups):
+        self.df = get_data(statistic, rows, groups)
+
+        if self.df is None:
+            raise NotImplementedError  # asv skips the combination
+
+    def time_statistic(self, statistic, rows, groups):
+        run(statistic, self.df)
+
+    def peakmem_statistic(self, statistic, rows, groups):
+        run(statistic, self.df)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times every statistic and appends the results to ' + HISTORY)
+    parser.add_argument('--max-rows', type=int, default=max(ROWS))
+    parser.add_argument('--statistic', nargs='*', default=list(STATISTICS), choices=list(STATISTICS))
+    args = parser.parse_args()
+
+    commit, timestamp = git_commit(), datetime.now(timezone.utc).isoformat()
+    os.makedirs(os.path.dirname(HISTORY), exist_ok=True)
+
+    with open(HISTORY, 'a') as history:
+        for statistic in args.statistic:
+            for rows in [r for r in ROWS if r <= args.max_rows]:
+                for groups in GROUPS:
+                    df = get_data(statistic, rows, groups)
+                    if df is None:
+                        continue
+
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    run(statistic, df)
+                    seconds = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+
+                    print(f'{statistic:<20}{rows:>11,} rows{groups:>8,} groups{seconds:9.3f}s{peak / 2**20:9.1f}MiB')
+                    history.write(json.dumps({'commit': commit, 'timestamp': timestamp, 'statistic': statistic,
+                                              'rows': rows, 'groups': groups, 'seconds': seconds,
+                                              'peak_bytes': peak}) + '\n')
@@ -20,5 +20,7 @@ setup(
                       'pytest >= 8.0.0',
                       'scipy >= 1.8.0',
                       'openpyxl >= 3.1.0'],
+    extras_require={'arrow': ['pyarrow >= 10.0.1'],
+                    'polars': ['polars >= 0.20.0', 'pyarrow >= 10.0.1']},
 )
 